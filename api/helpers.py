@@ -1,8 +1,27 @@
+import json
+
 from flask import jsonify, request
 from marshmallow import Schema, ValidationError
 
 from config import settings
-from logic.service_utils import ServiceError
+from logic.idempotency_service import IdempotencyService
+from logic.service_utils import ServiceError, ServiceUnavailableError
+from util.admission import AdmissionController, PRIORITY_HIGH, PRIORITY_LOW
+from util.admission import queue_time
+from util import deadline
+from util.singleflight import SingleFlight
+
+idempotency_flight = SingleFlight()
+
+admission = AdmissionController(
+    max_in_flight={
+        PRIORITY_HIGH: settings.ADMISSION_MAX_IN_FLIGHT_HIGH,
+        PRIORITY_LOW: settings.ADMISSION_MAX_IN_FLIGHT_LOW
+    },
+    queue_budget={
+        PRIORITY_HIGH: settings.ADMISSION_QUEUE_BUDGET_HIGH,
+        PRIORITY_LOW: settings.ADMISSION_QUEUE_BUDGET_LOW
+    })
 
 
 class StandardRequest(Schema):
@@ -28,25 +47,114 @@ def safe_handler(call):
     return __call_handler
 
 
-def handle_request(data, handler, request_schema, response_schema):
+def error_response(errors, status_code):
+    response = jsonify({
+        'errors': errors
+    })
+    response.status_code = status_code
+    return response
+
+
+def service_error_response(service_err):
+    response = error_response([str(service_err)], service_err.status_code)
+    retry_after = getattr(service_err, 'retry_after', None)
+    if retry_after is not None:
+        response.headers['Retry-After'] = str(retry_after)
+    return response
+
+
+def request_timeout(timeout=None):
+    """
+    Returns the seconds the current request may take: the route's timeout
+    (REQUEST_TIMEOUT by default), lowered to the client's X-Request-Timeout
+    header if that is shorter.
+    """
+    timeout = settings.REQUEST_TIMEOUT if timeout is None else timeout
+    try:
+        client_timeout = float(request.headers.get('X-Request-Timeout', ''))
+    except ValueError:
+        return timeout
+    if client_timeout > 0:
+        timeout = min(timeout, client_timeout)
+    return timeout
+
+
+def handle_request(data, handler, request_schema, response_schema,
+                   idempotent=False, priority=PRIORITY_HIGH, timeout=None):
+    """
+    Validates the request data, calls the handler and serializes its
+    response.
+
+    Args:
+        idempotent(bool): Honour an Idempotency-Key header by replaying the
+            stored response for retries instead of calling the handler again.
+        priority(str): Admission control class, PRIORITY_LOW for expensive
+            routes that should be shed first under load.
+        timeout(float): Seconds the request may take including the time it
+            was queued, REQUEST_TIMEOUT if not set. Provider calls and
+            database commits made by the handler only get the time left.
+    """
+    queued_for = queue_time(request.headers.get('X-Request-Start'))
+    if not admission.try_acquire(priority, queued_for):
+        return service_error_response(ServiceUnavailableError(
+            'Service is busy. Please try again shortly.',
+            retry_after=settings.ADMISSION_RETRY_AFTER))
+    try:
+        with deadline.scope(request_timeout(timeout) - queued_for):
+            return _dispatch(data, handler, request_schema, response_schema,
+                             idempotent)
+    finally:
+        admission.release(priority)
+
+
+def _dispatch(data, handler, request_schema, response_schema, idempotent):
+    if idempotent:
+        idempotency_key = request.headers.get('Idempotency-Key')
+        if idempotency_key:
+            return _handle_idempotent_request(
+                idempotency_key, data, handler, request_schema,
+                response_schema)
+    return _handle_request(data, handler, request_schema, response_schema)
+
+
+def _handle_request(data, handler, request_schema, response_schema):
     try:
         req = request_schema().load(data)
         resp = handler(**req)
         return response_schema().dump(resp.data), 200
     except ValidationError as validation_err:
         # Handle validation errors
-        response = jsonify({
-            'errors': validation_err.normalized_messages()
-        })
-        response.status_code = 400
-        return response
+        return error_response(validation_err.normalized_messages(), 400)
     except ServiceError as service_err:
         # Handle custom errors we have explicitly thrown from our services
-        response = jsonify({
-            'errors': [str(service_err)]
-        })
-        response.status_code = service_err.status_code
-        return response
+        return service_error_response(service_err)
+
+
+def _handle_idempotent_request(key, data, handler, request_schema,
+                               response_schema):
+    if len(key) > 255:
+        return error_response(
+            {'Idempotency-Key': ['Must be at most 255 characters.']}, 400)
+
+    scope = request.path
+
+    def run():
+        stored = IdempotencyService.lookup(key, scope, data)
+        if stored is not None:
+            return stored
+        rsp = _handle_request(data, handler, request_schema, response_schema)
+        # Only successful responses are stored, failed attempts can be
+        # retried with the same key
+        if isinstance(rsp, tuple) and rsp[1] == 200:
+            IdempotencyService.store(key, scope, data, *rsp)
+        return rsp
+
+    try:
+        # Concurrent retries with the same key wait for the first attempt
+        return idempotency_flight.do(
+            (scope, key, json.dumps(data, sort_keys=True)), run)
+    except ServiceError as service_err:
+        return service_error_response(service_err)
 
 
 def internal_api(method):
@@ -1,8 +1,10 @@
 from flask import request
 from flask_restful import Resource
-from marshmallow import fields
-from logic.attestation_service import VerificationService
+from marshmallow import fields, validate
+from logic.attestation_lookup_service import AttestationLookupService
+from logic.attestation_service import CLAIM_TYPES, VerificationService
 from api.helpers import StandardRequest, StandardResponse, handle_request
+from util.admission import PRIORITY_LOW
 
 
 class PhoneVerificationCodeRequest(StandardRequest):
@@ -102,6 +104,43 @@ class VerifyAirbnbResponse(StandardResponse):
     data = fields.Str()
 
 
+class ListAttestationsRequest(StandardRequest):
+    eth_address = fields.Str(required=True)
+    method = fields.Str(missing=None, validate=validate.OneOf(CLAIM_TYPES))
+    limit = fields.Integer(missing=20, validate=validate.Range(min=1, max=100))
+    cursor = fields.Str(missing=None)
+
+
+class AttestationSchema(StandardResponse):
+    method = fields.Str()
+    claim_type = fields.Integer(data_key='claim-type')
+    data = fields.Str()
+    signature = fields.Str()
+    created_at = fields.DateTime(data_key='created-at')
+
+
+class ListAttestationsResponse(StandardResponse):
+    attestations = fields.Nested(AttestationSchema, many=True)
+    next_cursor = fields.Str(data_key='next-cursor')
+
+
+class AttestationSummaryRequest(StandardRequest):
+    eth_address = fields.Str(required=True)
+
+
+class AttestationSummaryResponse(StandardResponse):
+    methods = fields.List(fields.Str())
+    attestations = fields.Nested(AttestationSchema, many=True)
+
+
+class HasAttestationsRequest(StandardRequest):
+    eth_address = fields.Str(required=True)
+
+
+class HasAttestationsResponse(StandardResponse):
+    exists = fields.Boolean()
+
+
 class PhoneVerificationCode(Resource):
     def post(self):
         return handle_request(
@@ -117,7 +156,9 @@ class VerifyPhone(Resource):
             data=request.json,
             handler=VerificationService.verify_phone,
             request_schema=VerifyPhoneRequest,
-            response_schema=VerifyPhoneResponse)
+            response_schema=VerifyPhoneResponse,
+            idempotent=True,
+            priority=PRIORITY_LOW)
 
 
 class EmailVerificationCode(Resource):
@@ -135,7 +176,9 @@ class VerifyEmail(Resource):
             data=request.json,
             handler=VerificationService.verify_email,
             request_schema=VerifyEmailRequest,
-            response_schema=VerifyEmailResponse)
+            response_schema=VerifyEmailResponse,
+            idempotent=True,
+            priority=PRIORITY_LOW)
 
 
 class FacebookAuthUrl(Resource):
@@ -153,7 +196,9 @@ class VerifyFacebook(Resource):
             data=request.json,
             handler=VerificationService.verify_facebook,
             request_schema=VerifyFacebookRequest,
-            response_schema=VerifyFacebookResponse)
+            response_schema=VerifyFacebookResponse,
+            idempotent=True,
+            priority=PRIORITY_LOW)
 
 
 class TwitterAuthUrl(Resource):
@@ -171,7 +216,9 @@ class VerifyTwitter(Resource):
             data=request.json,
             handler=VerificationService.verify_twitter,
             request_schema=VerifyTwitterRequest,
-            response_schema=VerifyTwitterResponse)
+            response_schema=VerifyTwitterResponse,
+            idempotent=True,
+            priority=PRIORITY_LOW)
 
 
 class AirbnbVerificationCode(Resource):
@@ -189,7 +236,38 @@ class VerifyAirbnb(Resource):
             data=request.json,
             handler=VerificationService.verify_airbnb,
             request_schema=AirbnbRequest,
-            response_schema=VerifyAirbnbResponse)
+            response_schema=VerifyAirbnbResponse,
+            idempotent=True,
+            priority=PRIORITY_LOW)
+
+
+class ListAttestations(Resource):
+    def get(self, eth_address):
+        data = request.values.to_dict()
+        data['eth_address'] = eth_address
+        return handle_request(
+            data=data,
+            handler=AttestationLookupService.list_attestations,
+            request_schema=ListAttestationsRequest,
+            response_schema=ListAttestationsResponse)
+
+
+class AttestationSummary(Resource):
+    def get(self, eth_address):
+        return handle_request(
+            data={'eth_address': eth_address},
+            handler=AttestationLookupService.get_summary,
+            request_schema=AttestationSummaryRequest,
+            response_schema=AttestationSummaryResponse)
+
+
+class HasAttestations(Resource):
+    def get(self, eth_address):
+        return handle_request(
+            data={'eth_address': eth_address},
+            handler=AttestationLookupService.has_attestations,
+            request_schema=HasAttestationsRequest,
+            response_schema=HasAttestationsResponse)
 
 
 resources = {
@@ -202,5 +280,8 @@ resources = {
     'twitter/auth-url': TwitterAuthUrl,
     'twitter/verify': VerifyTwitter,
     'airbnb/generate-code': AirbnbVerificationCode,
-    'airbnb/verify': VerifyAirbnb
+    'airbnb/verify': VerifyAirbnb,
+    'identity/<string:eth_address>': ListAttestations,
+    'identity/<string:eth_address>/exists': HasAttestations,
+    'identity/<string:eth_address>/summary': AttestationSummary
 }
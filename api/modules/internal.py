@@ -0,0 +1,95 @@
+from flask import Response, request, stream_with_context
+from flask_restful import Resource
+from marshmallow import ValidationError, fields, validate
+from logic.attestation_export_service import (
+    AttestationExportService,
+    CONTENT_TYPES,
+    FORMATS
+)
+from logic.attestation_rollup_service import AttestationRollupService
+from logic.attestation_service import CLAIM_TYPES
+from logic.database_stats_service import DatabaseStatsService
+from api.helpers import StandardRequest, StandardResponse, handle_request
+from api.helpers import error_response, internal_api
+
+
+class DatabaseStatsRequest(StandardRequest):
+    pass
+
+
+class DatabaseStatsResponse(StandardResponse):
+    pool = fields.Dict()
+    replica_pool = fields.Dict(allow_none=True)
+    requests = fields.Dict()
+
+
+class ExportAttestationsRequest(StandardRequest):
+    export_format = fields.Str(missing='ndjson', data_key='format',
+                               validate=validate.OneOf(FORMATS))
+    method = fields.Str(missing=None, validate=validate.OneOf(CLAIM_TYPES))
+    since = fields.DateTime(missing=None)
+    until = fields.DateTime(missing=None)
+    batch_size = fields.Integer(missing=1000, data_key='batch-size',
+                                validate=validate.Range(min=1, max=10000))
+
+
+class DailyCountSchema(StandardResponse):
+    day = fields.Date()
+    method = fields.Str()
+    count = fields.Integer()
+
+
+class CoverageSchema(StandardResponse):
+    methods = fields.List(fields.Str())
+    identities = fields.Integer()
+
+
+class AttestationStatsRequest(StandardRequest):
+    since = fields.Date(missing=None)
+    until = fields.Date(missing=None)
+
+
+class AttestationStatsResponse(StandardResponse):
+    daily = fields.Nested(DailyCountSchema, many=True)
+    coverage = fields.Nested(CoverageSchema, many=True)
+    identities = fields.Integer()
+    last_id = fields.Integer(data_key='last-id')
+
+
+class DatabaseStats(Resource):
+    def get(self):
+        return handle_request(
+            data={},
+            handler=internal_api(DatabaseStatsService.get_stats),
+            request_schema=DatabaseStatsRequest,
+            response_schema=DatabaseStatsResponse)
+
+
+class ExportAttestations(Resource):
+    def get(self):
+        # Streamed, so not wrapped in handle_request and its deadline
+        load = internal_api(ExportAttestationsRequest().load)
+        try:
+            args = load(request.values.to_dict())
+        except ValidationError as validation_err:
+            return error_response(validation_err.normalized_messages(), 400)
+        chunks = AttestationExportService.export(**args)
+        # No Content-Length, so the response is sent chunked
+        return Response(stream_with_context(chunks),
+                        content_type=CONTENT_TYPES[args['export_format']])
+
+
+class AttestationStats(Resource):
+    def get(self):
+        return handle_request(
+            data=request.values.to_dict(),
+            handler=internal_api(AttestationRollupService.get_stats),
+            request_schema=AttestationStatsRequest,
+            response_schema=AttestationStatsResponse)
+
+
+resources = {
+    'database-stats': DatabaseStats,
+    'attestations/export': ExportAttestations,
+    'attestation-stats': AttestationStats
+}
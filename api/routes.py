@@ -1,4 +1,5 @@
 from api.modules import attestations
+from api.modules import internal
 
 
 def add_resources(api, resources, namespace):
@@ -9,3 +10,4 @@ def add_resources(api, resources, namespace):
 def init_routes(api):
     # add routes for new modules here
     add_resources(api, attestations.resources, '/api/attestations/')
+    add_resources(api, internal.resources, '/api/internal/')
@@ -5,8 +5,22 @@ import flask_migrate
 
 from config import settings
 from database import db
+from database import instrumentation
+from database import replica
+from database import sharding
 from flask_session import Session
 from api import start_restful_api
+from logic.attestation_filter import attestation_filter
+from logic.attestation_writer import attestation_writer
+
+
+def _binds():
+    binds = {}
+    if settings.READ_DATABASE_URL:
+        binds[replica.BIND] = settings.READ_DATABASE_URL
+    for index, url in enumerate(settings.ATTESTATION_SHARD_URLS):
+        binds[sharding.bind_name(index)] = url
+    return binds or None
 
 
 class AppConfig(object):
@@ -15,8 +29,16 @@ class AppConfig(object):
     CSRF_ENABLED = True
 
     SQLALCHEMY_DATABASE_URI = settings.DATABASE_URL
+    SQLALCHEMY_BINDS = _binds()
     SQLALCHEMY_TRACK_MODIFICATIONS = False
     SQLALCHEMY_ECHO = False
+    SQLALCHEMY_POOL_MODE = settings.DB_POOL_MODE
+    SQLALCHEMY_POOL_SIZE = settings.DB_POOL_SIZE
+    SQLALCHEMY_MAX_OVERFLOW = settings.DB_MAX_OVERFLOW
+    SQLALCHEMY_POOL_TIMEOUT = settings.DB_POOL_TIMEOUT
+    SQLALCHEMY_POOL_RECYCLE = settings.DB_POOL_RECYCLE
+    SQLALCHEMY_POOL_PRE_PING = settings.DB_POOL_PRE_PING
+    SQLALCHEMY_STATEMENT_TIMEOUT = settings.DB_STATEMENT_TIMEOUT
 
 
 def init_api(app):
@@ -27,12 +49,17 @@ def init_app(app):
     sess = Session()
     sess.init_app(app)
     db.init_app(app)
+    instrumentation.init_app(app)
     flask_migrate.Migrate(app, db, directory='database/migrations')
+    attestation_writer.init_app(app)
+    attestation_filter.init_app(app)
 
 
 # App initialization only appropriate for dev/production but not tests.
-def init_prod_app(app):
+def init_prod_app(app, **config):
+    """config overrides AppConfig's settings."""
     app.config.from_object(__name__ + '.AppConfig')
+    app.config.update(config)
     init_app(app)
     init_api(app)
 
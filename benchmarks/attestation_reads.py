@@ -0,0 +1,115 @@
+#! /usr/bin/env python3
+"""
+Compares reading attestations as ORM objects with reading them as
+AttestationRecord objects from database.attestation_records.
+
+Synthetic rows are loaded into a temporary table named attestation, which
+hides the real table for the benchmark's connection, in the database
+configured by DATABASE_URL. Nothing is written to the real attestation
+table.
+
+Each path is timed on its own, then run again under tracemalloc to measure
+the memory allocated per row.
+
+    python -m benchmarks.attestation_reads --rows 100000
+"""
+import argparse
+import gc
+import time
+import tracemalloc
+
+from database import db
+from database.attestation_records import fetch_attestations
+from database.attestation_records import select_attestations
+from database.models import Attestation
+from tools import db_utils
+
+
+def load(conn, rows):
+    conn.execute("""
+        CREATE TEMPORARY TABLE attestation (
+            id serial PRIMARY KEY,
+            method attestationtypes,
+            eth_address bytea,
+            value varchar,
+            signature bytea,
+            created_at timestamp,
+            updated_at timestamp
+        )
+    """)
+    conn.execute("""
+        INSERT INTO attestation (method, eth_address, value, signature,
+                                 created_at)
+        SELECT 'PHONE', decode(substr(md5(i::text) || md5((i + 1)::text),
+                                      1, 40), 'hex'),
+               '1 5555555555',
+               decode(substr(repeat(md5(i::text), 5), 1, 130), 'hex'),
+               now() - i * interval '1 second'
+        FROM generate_series(1, %s) AS i
+    """, rows)
+    conn.execute('ANALYZE attestation')
+
+
+def read_orm(session):
+    # A fresh session each time, as a request would have
+    return session.query(Attestation).all()
+
+
+def read_records(session):
+    return fetch_attestations(select_attestations(), session)
+
+
+PATHS = (
+    ('orm', read_orm),
+    ('records', read_records),
+)
+
+
+def measure(conn, read):
+    session = db.create_scoped_session(options={'bind': conn})
+    gc.collect()
+    start = time.perf_counter()
+    result = read(session)
+    elapsed = time.perf_counter() - start
+    del result
+    session.remove()
+
+    session = db.create_scoped_session(options={'bind': conn})
+    gc.collect()
+    tracemalloc.start()
+    result = read(session)
+    allocated, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del result
+    session.remove()
+    return elapsed, allocated, peak
+
+
+def report(rows, repeat):
+    with db.engine.connect() as conn:
+        load(conn, rows)
+        results = []
+        for name, read in PATHS:
+            runs = [measure(conn, read) for _ in range(repeat)]
+            results.append((name, min(runs)))
+
+    print("%d rows, best of %d" % (rows, repeat))
+    print("%-8s %10s %10s %14s %14s" % (
+        'path', 'seconds', 'us/row', 'held bytes/row', 'peak bytes/row'))
+    for name, (elapsed, allocated, peak) in results:
+        print("%-8s %10.3f %10.2f %14.0f %14.0f" % (
+            name, elapsed, 1e6 * elapsed / rows, float(allocated) / rows,
+            float(peak) / rows))
+
+
+if __name__ == '__main__':
+    db_utils.request_context().push()
+    parser = argparse.ArgumentParser(
+        description="Reports the latency and memory per row of reading "
+        "attestations through the ORM and as slotted records.")
+    parser.add_argument('--rows', type=int, default=100000,
+                        help="number of synthetic attestations")
+    parser.add_argument('--repeat', type=int, default=3,
+                        help="runs per path, the best is reported")
+    args = parser.parse_args()
+    report(args.rows, args.repeat)
@@ -0,0 +1,89 @@
+#! /usr/bin/env python3
+"""
+Compares the storage and index size of the attestation table with
+eth_address and signature stored as hex strings (before) and as bytea
+(after).
+
+Both layouts are loaded with the same synthetic rows into temporary tables,
+with the lookup indexes of the attestation table, in the database configured
+by DATABASE_URL. Nothing is written to the real attestation table.
+
+    python -m benchmarks.attestation_storage --rows 1000000
+"""
+import argparse
+
+from database import db
+from tools import db_utils
+
+LAYOUTS = (
+    ('before', 'varchar', "'0x' || {}"),
+    ('after', 'bytea', "decode({}, 'hex')"),
+)
+
+# 40 and 130 hex characters derived from the row number
+ETH_ADDRESS_HEX = "substr(md5(i::text) || md5((i + 1)::text), 1, 40)"
+SIGNATURE_HEX = ("substr(md5(i::text) || md5((i + 1)::text) || "
+                 "md5((i + 2)::text) || md5((i + 3)::text) || "
+                 "md5((i + 4)::text), 1, 130)")
+
+
+def load(conn, name, column_type, expression, rows):
+    table = 'attestation_{}'.format(name)
+    conn.execute("""
+        CREATE TEMPORARY TABLE {table} (
+            id serial PRIMARY KEY,
+            method attestationtypes,
+            eth_address {type},
+            value varchar,
+            signature {type},
+            created_at timestamp
+        )
+    """.format(table=table, type=column_type))
+    conn.execute("""
+        INSERT INTO {table} (method, eth_address, value, signature, created_at)
+        SELECT 'PHONE', {eth_address}, '1 5555555555', {signature},
+               now() - i * interval '1 second'
+        FROM generate_series(1, %s) AS i
+    """.format(table=table,
+               eth_address=expression.format(ETH_ADDRESS_HEX),
+               signature=expression.format(SIGNATURE_HEX)), rows)
+    conn.execute('CREATE INDEX ON {} (eth_address, created_at, id)'.format(
+        table))
+    conn.execute(
+        'CREATE INDEX ON {} (eth_address, method, created_at, id)'.format(
+            table))
+    conn.execute('ANALYZE {}'.format(table))
+    return conn.execute("""
+        SELECT pg_relation_size('{table}'),
+               pg_indexes_size('{table}'),
+               pg_total_relation_size('{table}'),
+               (SELECT avg(pg_column_size(t.*)) FROM {table} t)
+    """.format(table=table)).first()
+
+
+def report(rows):
+    with db.engine.connect() as conn:
+        results = [(name, load(conn, name, column_type, expression, rows))
+                   for name, column_type, expression in LAYOUTS]
+
+    print("%d rows" % rows)
+    print("%-8s %14s %14s %14s %10s" % (
+        'layout', 'table bytes', 'index bytes', 'total bytes', 'row bytes'))
+    for name, (table, indexes, total, row) in results:
+        print("%-8s %14d %14d %14d %10.1f" % (
+            name, table, indexes, total, row))
+    before, after = results[0][1], results[1][1]
+    print("%-8s %13.1f%% %13.1f%% %13.1f%% %9.1f%%" % (
+        'saved', *(100.0 * (1 - float(a) / float(b))
+                   for a, b in zip(after, before))))
+
+
+if __name__ == '__main__':
+    db_utils.request_context().push()
+    parser = argparse.ArgumentParser(
+        description="Reports attestation table and index sizes with hex "
+        "string and bytea eth_address and signature columns.")
+    parser.add_argument('--rows', type=int, default=100000,
+                        help="number of synthetic attestations per layout")
+    args = parser.parse_args()
+    report(args.rows)
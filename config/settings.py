@@ -57,6 +57,9 @@ FLASK_SECRET_KEY = get_env_default('FLASK_SECRET_KEY')
 
 DATABASE_URL = get_env_default('DATABASE_URL')
 TEST_DATABASE_URL = get_env_default('TEST_DATABASE_URL')
+# Two or more databases to run the attestation sharding tests against
+TEST_SHARD_URLS = [url for url in (
+    get_env_default('TEST_SHARD_URLS') or '').split(',') if url]
 
 TEMPLATE_ROOT = os.path.join(PROJECTPATH, 'templates')
 STATIC_ROOT = os.path.join(PROJECTPATH, 'static')
@@ -86,6 +89,125 @@ BIND_HOST = get_env_default("BIND_HOST")
 
 CONTRACT_DIR = get_env_default('CONTRACT_DIR') or 'contracts'
 
+RPC_SERVER = get_env_default('RPC_SERVER')
+RPC_PROTOCOL = get_env_default('RPC_PROTOCOL') or 'https'
+# Largest block range requested with one eth_getLogs call. Ranges that
+# return too many logs are split further.
+EVENT_CHUNK_SIZE = int(get_env_default('EVENT_CHUNK_SIZE') or 5000)
+# Concurrent eth_getLogs requests when fetching a long block range
+EVENT_FETCH_WORKERS = int(get_env_default('EVENT_FETCH_WORKERS') or 1)
+# Blocks on top of an event's block before it is treated as final
+EVENT_CONFIRMATIONS = int(get_env_default('EVENT_CONFIRMATIONS') or 12)
+# SQLite database caching the logs of confirmed blocks, unset to disable
+EVENT_CACHE_FILE = get_env_default('EVENT_CACHE_FILE')
+# Seconds without a pushed event before an event subscription checks its
+# connection
+EVENT_SUBSCRIPTION_TIMEOUT = int(
+    get_env_default('EVENT_SUBSCRIPTION_TIMEOUT') or 60)
+
 RESOURCES_DIR = get_env_default('RESOURCES_DIR') or 'resources'
 
 INTERNAL_API_TOKEN = get_env_default('INTERNAL_API_TOKEN')
+
+# Seconds a response stored for an Idempotency-Key header is replayed for
+IDEMPOTENCY_KEY_TTL = int(get_env_default('IDEMPOTENCY_KEY_TTL') or 86400)
+
+# Incorrect phone or email codes allowed per identity within the window
+# (in seconds) before further attempts are rejected without checking them
+VERIFY_FAILURE_THRESHOLD = int(
+    get_env_default('VERIFY_FAILURE_THRESHOLD') or 5)
+VERIFY_FAILURE_WINDOW = int(get_env_default('VERIFY_FAILURE_WINDOW') or 900)
+
+# Admission control for API requests. Expensive routes (verify) run in the
+# low priority class, everything else in the high priority class. Requests
+# that queued longer than their class' budget (in seconds, measured from the
+# X-Request-Start header), or arrive while their class is at its in-flight
+# limit (0 for none), get an immediate 503.
+ADMISSION_MAX_IN_FLIGHT_LOW = int(
+    get_env_default('ADMISSION_MAX_IN_FLIGHT_LOW') or 3)
+ADMISSION_MAX_IN_FLIGHT_HIGH = int(
+    get_env_default('ADMISSION_MAX_IN_FLIGHT_HIGH') or 0)
+ADMISSION_QUEUE_BUDGET_LOW = float(
+    get_env_default('ADMISSION_QUEUE_BUDGET_LOW') or 2)
+ADMISSION_QUEUE_BUDGET_HIGH = float(
+    get_env_default('ADMISSION_QUEUE_BUDGET_HIGH') or 10)
+ADMISSION_RETRY_AFTER = int(get_env_default('ADMISSION_RETRY_AFTER') or 1)
+
+# Default seconds an API request may take end to end, including the time it
+# was queued. Outbound provider calls and database commits only get the time
+# that is left. Clients can ask for less with an X-Request-Timeout header.
+REQUEST_TIMEOUT = float(get_env_default('REQUEST_TIMEOUT') or 25)
+
+# Write-behind for attestation inserts. When enabled, verify requests return
+# once the attestation is appended to the local spill file, and a background
+# thread inserts queued attestations in batches every flush interval.
+ATTESTATION_WRITE_BEHIND = parse_bool(
+    get_env_default('ATTESTATION_WRITE_BEHIND'))
+ATTESTATION_SPILL_FILE = get_env_default('ATTESTATION_SPILL_FILE') or \
+    abspath('attestation-spill.jsonl')
+ATTESTATION_SPILL_FSYNC = parse_bool(
+    get_env_default('ATTESTATION_SPILL_FSYNC') or '1')
+ATTESTATION_FLUSH_INTERVAL = float(
+    get_env_default('ATTESTATION_FLUSH_INTERVAL') or 0.5)
+ATTESTATION_FLUSH_BATCH_SIZE = int(
+    get_env_default('ATTESTATION_FLUSH_BATCH_SIZE') or 500)
+# Attempts at writing a batch, with exponential backoff, before its rows
+# are written one by one and those that still fail are moved to
+# <ATTESTATION_SPILL_FILE>.dead
+ATTESTATION_FLUSH_MAX_RETRIES = int(
+    get_env_default('ATTESTATION_FLUSH_MAX_RETRIES') or 10)
+
+# Database connection pool. DB_POOL_MODE is "session" to pool connections
+# in this process, or "transaction" when connecting through PgBouncer in
+# transaction pooling mode, in which case nothing is pooled here and the
+# size, overflow and timeout settings are ignored. DB_STATEMENT_TIMEOUT is
+# in milliseconds, 0 for none, and does not apply to tools/.
+DB_POOL_MODE = get_env_default('DB_POOL_MODE') or 'session'
+DB_POOL_SIZE = int(get_env_default('DB_POOL_SIZE') or 5)
+DB_MAX_OVERFLOW = int(get_env_default('DB_MAX_OVERFLOW') or 10)
+DB_POOL_TIMEOUT = int(get_env_default('DB_POOL_TIMEOUT') or 10)
+DB_POOL_RECYCLE = int(get_env_default('DB_POOL_RECYCLE') or 1800)
+DB_POOL_PRE_PING = parse_bool(get_env_default('DB_POOL_PRE_PING') or '1')
+DB_STATEMENT_TIMEOUT = int(get_env_default('DB_STATEMENT_TIMEOUT') or 30000)
+
+# Optional streaming replica for read-only queries. An identity's
+# attestations are read from the primary for REPLICA_MAX_LAG seconds after
+# they are written, which should exceed the replica's usual lag.
+READ_DATABASE_URL = get_env_default('READ_DATABASE_URL')
+REPLICA_MAX_LAG = float(get_env_default('REPLICA_MAX_LAG') or 10)
+
+# Bloom filter of the identities that have attestations, to answer the
+# existence check without a query for most identities that have none.
+# ATTESTATION_FILTER_FILE, e.g. on /dev/shm, shares one filter between the
+# processes on a host.
+ATTESTATION_FILTER = parse_bool(get_env_default('ATTESTATION_FILTER'))
+ATTESTATION_FILTER_CAPACITY = int(
+    get_env_default('ATTESTATION_FILTER_CAPACITY') or 1000000)
+ATTESTATION_FILTER_ERROR_RATE = float(
+    get_env_default('ATTESTATION_FILTER_ERROR_RATE') or 0.01)
+ATTESTATION_FILTER_FILE = get_env_default('ATTESTATION_FILTER_FILE')
+ATTESTATION_FILTER_REFRESH_INTERVAL = float(
+    get_env_default('ATTESTATION_FILTER_REFRESH_INTERVAL') or 5)
+
+# Cache of each identity's attestation summary. With
+# ATTESTATION_SUMMARY_CACHE_FILE, e.g. on /dev/shm, the cache is shared by
+# the processes on a host.
+ATTESTATION_SUMMARY_CACHE_SIZE = int(
+    get_env_default('ATTESTATION_SUMMARY_CACHE_SIZE') or 10000)
+ATTESTATION_SUMMARY_CACHE_TTL = float(
+    get_env_default('ATTESTATION_SUMMARY_CACHE_TTL') or 300)
+ATTESTATION_SUMMARY_CACHE_FILE = get_env_default(
+    'ATTESTATION_SUMMARY_CACHE_FILE')
+
+# Comma separated databases to spread attestations across by eth_address.
+# Only append to the list: a shard is identified by its position.
+ATTESTATION_SHARD_URLS = [url for url in (
+    get_env_default('ATTESTATION_SHARD_URLS') or '').split(',') if url]
+
+# Set once the attestation table is partitioned by created_at (migration
+# a3f7c2d9e614, upgrade to partitioning@head). Partitioned tables cannot
+# have the unique index the INSERT ... ON CONFLICT upsert relies on, so
+# attestations are stored under an advisory lock instead. Enable it before
+# running the migration, which refuses to run otherwise.
+ATTESTATION_PARTITIONED = parse_bool(
+    get_env_default('ATTESTATION_PARTITIONED'))
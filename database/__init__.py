@@ -1,3 +1,65 @@
 import flask_sqlalchemy
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
 
-db = flask_sqlalchemy.SQLAlchemy(session_options=dict(autoflush=False))
+from database.instrumentation import InstrumentedNullPool
+from database.instrumentation import InstrumentedQueuePool
+
+POOL_MODE_SESSION = 'session'
+POOL_MODE_TRANSACTION = 'transaction'
+
+
+class SQLAlchemy(flask_sqlalchemy.SQLAlchemy):
+    """
+    Adds pool pre-ping, a statement timeout and a PgBouncer transaction
+    pooling mode on top of Flask-SQLAlchemy's pool settings.
+
+    In transaction mode PgBouncer owns the server connections, so nothing
+    is pooled here, and the statement timeout is set per transaction with
+    SET LOCAL since PgBouncer rejects it as a startup parameter and a
+    session level SET would leak to other clients.
+    """
+
+    def apply_driver_hacks(self, app, info, options):
+        super().apply_driver_hacks(app, info, options)
+        if not info.drivername.startswith('postgresql'):
+            return
+
+        if app.config.get('SQLALCHEMY_POOL_PRE_PING'):
+            options['pool_pre_ping'] = True
+
+        statement_timeout = app.config.get('SQLALCHEMY_STATEMENT_TIMEOUT')
+        mode = app.config.get('SQLALCHEMY_POOL_MODE') or POOL_MODE_SESSION
+        if mode == POOL_MODE_TRANSACTION:
+            options['poolclass'] = InstrumentedNullPool
+            for key in ('pool_size', 'pool_timeout', 'max_overflow'):
+                options.pop(key, None)
+            if statement_timeout:
+                options['execution_options'] = {
+                    'local_statement_timeout': statement_timeout}
+        elif mode == POOL_MODE_SESSION:
+            options['poolclass'] = InstrumentedQueuePool
+            if statement_timeout:
+                options.setdefault('connect_args', {})['options'] = \
+                    '-c statement_timeout={:d}'.format(statement_timeout)
+        else:
+            raise ValueError('Unknown SQLALCHEMY_POOL_MODE {!r}'.format(mode))
+
+
+@event.listens_for(Engine, 'begin')
+def _set_local_statement_timeout(conn):
+    # SQLAlchemy 1.2 has no public accessor for a connection's execution
+    # options, get_execution_options() only exists from 1.3. They include the
+    # engine's, so this sees the timeout set in apply_driver_hacks.
+    timeout = conn._execution_options.get('local_statement_timeout')
+    if timeout:
+        # Through the DBAPI cursor so it isn't counted as a request query
+        cursor = conn.connection.cursor()
+        try:
+            cursor.execute(
+                'SET LOCAL statement_timeout = {:d}'.format(timeout))
+        finally:
+            cursor.close()
+
+
+db = SQLAlchemy(session_options=dict(autoflush=False))
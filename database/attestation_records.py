@@ -0,0 +1,74 @@
+"""
+Reads attestations with SQLAlchemy Core instead of the ORM.
+
+Rows become AttestationRecord objects: plain slotted objects that are not
+tracked by the session's identity map and carry no instrumentation, which
+makes them several times cheaper to build and hold than Attestation
+instances. Use them for read paths that do not modify what they load.
+"""
+from sqlalchemy import and_, select
+
+from database import db
+from database.models import Attestation
+
+COLUMNS = ('id', 'method', 'eth_address', 'value', 'signature', 'created_at',
+           'updated_at')
+
+
+class AttestationRecord():
+    __slots__ = COLUMNS
+
+    def __init__(self, id, method, eth_address, value, signature,
+                 created_at, updated_at):
+        self.id = id
+        self.method = method
+        self.eth_address = eth_address
+        self.value = value
+        self.signature = signature
+        self.created_at = created_at
+        self.updated_at = updated_at
+
+    def as_dict(self):
+        return {column: getattr(self, column) for column in COLUMNS}
+
+    def __repr__(self):
+        return '<AttestationRecord {} {}>'.format(self.id, self.method)
+
+
+def select_attestations(*criteria):
+    """
+    Returns a SELECT of the record columns of attestations matching all
+    criteria, to be refined with order_by(), limit() etc.
+    """
+    table = Attestation.__table__
+    query = select([table.c[column] for column in COLUMNS])
+    if criteria:
+        query = query.where(and_(*criteria))
+    return query
+
+
+def fetch_attestations(query, conn=None):
+    """
+    Runs a query from select_attestations on conn, the session by default.
+
+    Returns:
+        list of AttestationRecord
+    """
+    conn = db.session if conn is None else conn
+    return [AttestationRecord(*row) for row in conn.execute(query)]
+
+
+def iter_attestations(query, conn, batch_size=1000):
+    """
+    Runs a query from select_attestations through a server-side cursor on
+    conn, a Connection, fetching batch_size rows at a time.
+
+    Returns:
+        Generator of lists of at most batch_size AttestationRecord
+    """
+    result = conn.execution_options(stream_results=True).execute(query)
+    while True:
+        rows = result.fetchmany(batch_size)
+        if not rows:
+            return
+        yield [AttestationRecord(*row) for row in rows]
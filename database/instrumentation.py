@@ -0,0 +1,125 @@
+import threading
+import time
+
+from flask import g, has_request_context, request
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from sqlalchemy.pool import NullPool, QueuePool
+
+
+class PoolStats():
+    """
+    Connection checkout and per-request query statistics for this process.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.clear()
+
+    def clear(self):
+        with self._lock:
+            self.checkouts = 0
+            self.checkout_timeouts = 0
+            self.checkout_wait_total = 0.0
+            self.checkout_wait_max = 0.0
+            self.requests = {}
+
+    def record_checkout(self, waited, timed_out=False):
+        with self._lock:
+            self.checkouts += 1
+            self.checkout_timeouts += int(timed_out)
+            self.checkout_wait_total += waited
+            self.checkout_wait_max = max(self.checkout_wait_max, waited)
+
+    def record_request(self, endpoint, queries):
+        with self._lock:
+            count, total, most = self.requests.get(endpoint, (0, 0, 0))
+            self.requests[endpoint] = (count + 1, total + queries,
+                                       max(most, queries))
+
+    def checkout_stats(self):
+        with self._lock:
+            return {
+                'checkouts': self.checkouts,
+                'timeouts': self.checkout_timeouts,
+                'wait_avg': (self.checkout_wait_total / self.checkouts
+                             if self.checkouts else 0.0),
+                'wait_max': self.checkout_wait_max
+            }
+
+    def request_stats(self):
+        with self._lock:
+            return {
+                endpoint: {
+                    'requests': count,
+                    'queries_avg': total / count,
+                    'queries_max': most
+                }
+                for endpoint, (count, total, most) in self.requests.items()
+            }
+
+
+pool_stats = PoolStats()
+
+
+class _TimedCheckout():
+    # Pools only fire their checkout event once a connection was obtained,
+    # so the wait for a free slot (or a new connection) is timed here.
+    def _do_get(self, *args, **kwargs):
+        start = time.monotonic()
+        try:
+            conn = super()._do_get(*args, **kwargs)
+        except PoolTimeoutError:
+            pool_stats.record_checkout(time.monotonic() - start, True)
+            raise
+        pool_stats.record_checkout(time.monotonic() - start)
+        return conn
+
+
+class InstrumentedQueuePool(_TimedCheckout, QueuePool):
+    pass
+
+
+class InstrumentedNullPool(_TimedCheckout, NullPool):
+    pass
+
+
+def pool_status(engine):
+    """
+    Returns the current state of the engine's pool. Saturation is the
+    share of the pool's capacity (size plus overflow) checked out.
+    """
+    pool = engine.pool
+    status = {'pool': type(pool).__name__}
+    if isinstance(pool, QueuePool):
+        # A negative overflow or a size of 0 means the pool is unbounded
+        capacity = pool.size() + pool._max_overflow
+        status.update({
+            'size': pool.size(),
+            'max_overflow': pool._max_overflow,
+            'checked_in': pool.checkedin(),
+            'checked_out': pool.checkedout(),
+            'overflow': pool.overflow(),
+            'saturation': (pool.checkedout() / capacity
+                           if pool.size() and pool._max_overflow >= 0
+                           else None)
+        })
+    status.update(pool_stats.checkout_stats())
+    return status
+
+
+@event.listens_for(Engine, 'before_cursor_execute')
+def _count_query(conn, cursor, statement, parameters, context, executemany):
+    # Queries run outside a request, e.g. by the attestation writer, are
+    # not counted
+    if has_request_context():
+        g.db_queries = g.get('db_queries', 0) + 1
+
+
+def init_app(app):
+    @app.teardown_request
+    def record_query_count(exc):
+        if request.endpoint is not None:
+            pool_stats.record_request(request.endpoint,
+                                      g.get('db_queries', 0))
@@ -0,0 +1,30 @@
+"""Add event block hashes
+
+Revision ID: 2c6f8e4a9b17
+Revises: 8a5d3f7e1c29
+Create Date: 2018-10-18 15:03:52.618240
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '2c6f8e4a9b17'
+down_revision = '8a5d3f7e1c29'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'event_block',
+        sa.Column('name', sa.String(), nullable=False),
+        sa.Column('block_number', sa.BigInteger(), nullable=False),
+        sa.Column('block_hash', sa.LargeBinary(), nullable=False),
+        sa.PrimaryKeyConstraint('name', 'block_number')
+    )
+
+
+def downgrade():
+    op.drop_table('event_block')
@@ -0,0 +1,40 @@
+"""Add idempotency_key table
+
+Revision ID: 3f1c9a7d2b4e
+Revises: 65daf2256cbe
+Create Date: 2018-10-02 10:12:44.201553
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '3f1c9a7d2b4e'
+down_revision = '65daf2256cbe'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'idempotency_key',
+        sa.Column('key', sa.LargeBinary(length=32), nullable=False),
+        sa.Column('request_hash', sa.LargeBinary(length=32), nullable=False),
+        sa.Column('status_code', sa.SmallInteger(), nullable=False),
+        sa.Column('response', sa.Text(), nullable=False),
+        sa.Column('expires_at', sa.DateTime(), nullable=False),
+        sa.PrimaryKeyConstraint('key')
+    )
+    op.create_index(
+        op.f('ix_idempotency_key_expires_at'),
+        'idempotency_key',
+        ['expires_at'],
+        unique=False
+    )
+
+
+def downgrade():
+    op.drop_index(op.f('ix_idempotency_key_expires_at'),
+                  table_name='idempotency_key')
+    op.drop_table('idempotency_key')
@@ -0,0 +1,30 @@
+"""Add re-sign checkpoints
+
+Revision ID: 4b7e9c2a1d63
+Revises: e1b6d0c4a8f2
+Create Date: 2018-10-17 14:22:05.913208
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '4b7e9c2a1d63'
+down_revision = 'e1b6d0c4a8f2'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'resign_checkpoint',
+        sa.Column('phase', sa.String(), nullable=False),
+        sa.Column('signer', sa.String(), nullable=False),
+        sa.Column('last_id', sa.BigInteger(), nullable=False),
+        sa.PrimaryKeyConstraint('phase')
+    )
+
+
+def downgrade():
+    op.drop_table('resign_checkpoint')
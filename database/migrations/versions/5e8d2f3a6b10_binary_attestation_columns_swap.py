@@ -0,0 +1,78 @@
+"""Swap attestation eth_address and signature to bytea
+
+Second half of the online migration started in c47a1e0b5d93. The columns
+are already backfilled and indexed, so the swap only holds an exclusive lock
+for the renames.
+
+Downgrading converts the columns back to hex strings, with eth_address in
+lowercase rather than in the format originally submitted.
+
+Revision ID: 5e8d2f3a6b10
+Revises: c47a1e0b5d93
+Create Date: 2018-10-09 11:05:27.019844
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '5e8d2f3a6b10'
+down_revision = 'c47a1e0b5d93'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Fail rather than queue behind long running queries, blocking all
+    # writes to the table while waiting for the lock
+    op.execute("SET LOCAL lock_timeout = '5s'")
+    op.execute('LOCK TABLE attestation IN ACCESS EXCLUSIVE MODE')
+    op.execute('DROP TRIGGER attestation_sync_binary ON attestation')
+    op.execute('DROP FUNCTION attestation_sync_binary()')
+
+    # Dropping the columns also drops the indexes built on them
+    op.drop_column('attestation', 'eth_address')
+    op.drop_column('attestation', 'signature')
+    op.alter_column('attestation', 'eth_address_bin',
+                    new_column_name='eth_address')
+    op.alter_column('attestation', 'signature_bin',
+                    new_column_name='signature')
+    op.execute('ALTER INDEX ix_attestation_eth_address_bin_created_at_id '
+               'RENAME TO ix_attestation_eth_address_created_at_id')
+    op.execute('ALTER INDEX ix_attestation_eth_address_bin_method_created_at_id '
+               'RENAME TO ix_attestation_eth_address_method_created_at_id')
+
+
+def downgrade():
+    op.execute('LOCK TABLE attestation IN ACCESS EXCLUSIVE MODE')
+    op.alter_column('attestation', 'eth_address',
+                    new_column_name='eth_address_bin')
+    op.alter_column('attestation', 'signature',
+                    new_column_name='signature_bin')
+    op.execute('ALTER INDEX ix_attestation_eth_address_created_at_id '
+               'RENAME TO ix_attestation_eth_address_bin_created_at_id')
+    op.execute('ALTER INDEX ix_attestation_eth_address_method_created_at_id '
+               'RENAME TO ix_attestation_eth_address_bin_method_created_at_id')
+
+    op.add_column('attestation',
+                  sa.Column('eth_address', sa.String(), nullable=True))
+    op.add_column('attestation',
+                  sa.Column('signature', sa.String(), nullable=True))
+    op.execute("""
+        UPDATE attestation
+        SET eth_address = '0x' || encode(eth_address_bin, 'hex'),
+            signature = '0x' || encode(signature_bin, 'hex')
+    """)
+    op.create_index(
+        'ix_attestation_eth_address_created_at_id',
+        'attestation',
+        ['eth_address', 'created_at', 'id'],
+        unique=False
+    )
+    op.create_index(
+        'ix_attestation_eth_address_method_created_at_id',
+        'attestation',
+        ['eth_address', 'method', 'created_at', 'id'],
+        unique=False
+    )
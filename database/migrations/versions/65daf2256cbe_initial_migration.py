@@ -11,7 +11,9 @@ import sqlalchemy as sa
 # revision identifiers, used by Alembic.
 revision = '65daf2256cbe'
 down_revision = None
-branch_labels = None
+# Upgrade to main@head: partitioning is an opt-in branch of its own, see
+# a3f7c2d9e614
+branch_labels = ('main',)
 depends_on = None
 
 
@@ -0,0 +1,93 @@
+"""Make attestations unique per fact
+
+Adds updated_at and a unique index on (eth_address, method, value), which
+the upsert in save_attestation relies on. Existing duplicates are merged
+first, in batches committed on their own like
+tools/dedupe_attestations.py does: the first row stored for a fact is
+kept with the newest signature. The index is built without blocking
+writes, so if duplicates were inserted in the meantime and the build
+fails, run the upgrade again.
+
+Revision ID: 7d4c1b9e2f85
+Revises: 5e8d2f3a6b10
+Create Date: 2018-10-11 10:12:48.530117
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '7d4c1b9e2f85'
+down_revision = '5e8d2f3a6b10'
+branch_labels = None
+depends_on = None
+
+BATCH_SIZE = 10000
+
+# Same statements as logic/attestation_maintenance_service.py, as of this
+# revision's schema
+REFRESH_FIRST = sa.text("""
+    UPDATE attestation AS first
+    SET signature = latest.signature, updated_at = latest.created_at
+    FROM (
+        SELECT DISTINCT ON (eth_address, method, coalesce(value, ''))
+            id, eth_address, method, coalesce(value, '') AS value,
+            signature, created_at
+        FROM attestation
+        WHERE id >= :start AND id < :end
+        ORDER BY eth_address, method, coalesce(value, ''), id DESC
+    ) AS latest
+    WHERE first.eth_address = latest.eth_address
+        AND first.method = latest.method
+        AND coalesce(first.value, '') = latest.value
+        AND first.id < latest.id
+        AND NOT EXISTS (
+            SELECT 1 FROM attestation AS earlier
+            WHERE earlier.eth_address = first.eth_address
+                AND earlier.method = first.method
+                AND coalesce(earlier.value, '') = coalesce(first.value, '')
+                AND earlier.id < first.id)
+""")
+
+DELETE_LATER = sa.text("""
+    DELETE FROM attestation AS later
+    USING attestation AS earlier
+    WHERE later.id >= :start AND later.id < :end
+        AND earlier.eth_address = later.eth_address
+        AND earlier.method = later.method
+        AND coalesce(earlier.value, '') = coalesce(later.value, '')
+        AND earlier.id < later.id
+""")
+
+
+def upgrade():
+    # IF NOT EXISTS as a failed index build leaves the column behind
+    op.execute('ALTER TABLE attestation '
+               'ADD COLUMN IF NOT EXISTS updated_at timestamp')
+
+    # See 9b2e4d61c0a7 for the transaction handling around CONCURRENTLY.
+    # Each batch of the merge commits on its own.
+    op.execute('COMMIT')
+    conn = op.get_bind()
+    start, last = conn.execute(
+        'SELECT min(id), max(id) FROM attestation').first()
+    while start is not None and start <= last:
+        window = {'start': start, 'end': start + BATCH_SIZE}
+        conn.execute(REFRESH_FIRST, window)
+        conn.execute(DELETE_LATER, window)
+        start += BATCH_SIZE
+
+    # A build that failed leaves an invalid index behind
+    op.execute('DROP INDEX CONCURRENTLY IF EXISTS '
+               'uq_attestation_eth_address_method_value')
+    op.execute("CREATE UNIQUE INDEX CONCURRENTLY "
+               "uq_attestation_eth_address_method_value "
+               "ON attestation (eth_address, method, coalesce(value, ''))")
+    op.execute('BEGIN')
+
+
+def downgrade():
+    op.drop_index('uq_attestation_eth_address_method_value',
+                  table_name='attestation')
+    op.drop_column('attestation', 'updated_at')
@@ -0,0 +1,31 @@
+"""Add event checkpoints
+
+Revision ID: 8a5d3f7e1c29
+Revises: 4b7e9c2a1d63
+Create Date: 2018-10-18 10:41:37.204518
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '8a5d3f7e1c29'
+down_revision = '4b7e9c2a1d63'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'event_checkpoint',
+        sa.Column('name', sa.String(), nullable=False),
+        sa.Column('block_number', sa.BigInteger(), nullable=False),
+        sa.Column('transaction_index', sa.Integer(), nullable=True),
+        sa.Column('log_index', sa.Integer(), nullable=True),
+        sa.PrimaryKeyConstraint('name')
+    )
+
+
+def downgrade():
+    op.drop_table('event_checkpoint')
@@ -0,0 +1,45 @@
+"""Add attestation lookup indexes
+
+Revision ID: 9b2e4d61c0a7
+Revises: 3f1c9a7d2b4e
+Create Date: 2018-10-04 16:41:09.883127
+
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = '9b2e4d61c0a7'
+down_revision = '3f1c9a7d2b4e'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # CREATE INDEX CONCURRENTLY cannot run inside a transaction block. End
+    # the transaction Alembic opened so the indexes are built without
+    # blocking inserts into the attestation table.
+    op.execute('COMMIT')
+    op.create_index(
+        'ix_attestation_eth_address_created_at_id',
+        'attestation',
+        ['eth_address', 'created_at', 'id'],
+        unique=False,
+        postgresql_concurrently=True
+    )
+    op.create_index(
+        'ix_attestation_eth_address_method_created_at_id',
+        'attestation',
+        ['eth_address', 'method', 'created_at', 'id'],
+        unique=False,
+        postgresql_concurrently=True
+    )
+    # Open a transaction again for the migrations that follow
+    op.execute('BEGIN')
+
+
+def downgrade():
+    op.drop_index('ix_attestation_eth_address_method_created_at_id',
+                  table_name='attestation')
+    op.drop_index('ix_attestation_eth_address_created_at_id',
+                  table_name='attestation')
@@ -0,0 +1,144 @@
+"""Partition attestation by created_at
+
+Turns attestation into a table partitioned by month of created_at without
+copying rows: the existing table becomes the partition attestation_legacy
+for everything created before the start of next month, and empty monthly
+partitions follow it. Requires Postgres 11 or later, and
+ATTESTATION_PARTITIONED to be enabled on every server before upgrading
+since the partitioned table has no unique index for INSERT ... ON
+CONFLICT.
+
+This is the opt-in branch labelled partitioning, applied with
+
+    FLASK_APP=main.py flask db upgrade partitioning@head
+
+and left alone by upgrades to main@head.
+
+Partitions for later months are created, and old ones archived, with
+tools/attestation_partitions.py.
+
+Revision ID: a3f7c2d9e614
+Depends on: 7d4c1b9e2f85
+Create Date: 2018-10-12 15:27:04.116392
+
+"""
+import datetime
+
+from alembic import op
+
+from config import settings
+
+
+# revision identifiers, used by Alembic.
+revision = 'a3f7c2d9e614'
+down_revision = None
+branch_labels = ('partitioning',)
+depends_on = '7d4c1b9e2f85'
+
+INDEXES = (
+    ('ix_attestation_eth_address_created_at_id',
+     'eth_address, created_at, id'),
+    ('ix_attestation_eth_address_method_created_at_id',
+     'eth_address, method, created_at, id'),
+)
+
+
+def upgrade():
+    if not settings.ATTESTATION_PARTITIONED:
+        raise RuntimeError('set ATTESTATION_PARTITIONED=1 on every server '
+                           'before partitioning the attestation table')
+    version = int(op.get_bind().execute('SHOW server_version_num').scalar())
+    if version < 110000:
+        raise RuntimeError('partitioning the attestation table requires '
+                           'Postgres 11 or later')
+
+    cutover = op.get_bind().execute(
+        "SELECT date_trunc('month', timezone('UTC', now())) "
+        "+ interval '1 month'").scalar()
+    following = (cutover + datetime.timedelta(days=32)).replace(day=1)
+
+    # A validated constraint matching the partition bounds lets ATTACH
+    # PARTITION skip scanning the table while it holds an exclusive lock.
+    # Validating only takes a lock that does not block writes, so it runs
+    # in a transaction of its own (see 9b2e4d61c0a7).
+    op.execute("SET LOCAL lock_timeout = '5s'")
+    op.execute("ALTER TABLE attestation ADD CONSTRAINT "
+               "attestation_legacy_created_at_check CHECK "
+               "(created_at IS NOT NULL AND created_at < '{}') "
+               "NOT VALID".format(cutover))
+    op.execute('COMMIT')
+    op.execute('BEGIN')
+    op.execute('ALTER TABLE attestation VALIDATE CONSTRAINT '
+               'attestation_legacy_created_at_check')
+    op.execute('COMMIT')
+    op.execute('BEGIN')
+
+    op.execute("SET LOCAL lock_timeout = '5s'")
+    op.execute('LOCK TABLE attestation IN ACCESS EXCLUSIVE MODE')
+    op.execute('ALTER TABLE attestation RENAME TO attestation_legacy')
+    for name, _ in INDEXES:
+        op.execute('ALTER INDEX {} RENAME TO {}'.format(
+            name, name.replace('attestation', 'attestation_legacy', 1)))
+    op.execute('ALTER INDEX uq_attestation_eth_address_method_value '
+               'RENAME TO uq_attestation_legacy_eth_address_method_value')
+
+    # Primary keys of partitioned tables must include the partition key, so
+    # each partition has its own on id instead. Ids come from the shared
+    # sequence.
+    op.execute("""
+        CREATE TABLE attestation (
+            id integer NOT NULL DEFAULT nextval('attestation_id_seq'),
+            method attestationtypes,
+            eth_address bytea,
+            value varchar,
+            signature bytea,
+            created_at timestamp without time zone,
+            updated_at timestamp without time zone
+        ) PARTITION BY RANGE (created_at)
+    """)
+    op.execute('ALTER SEQUENCE attestation_id_seq OWNED BY attestation.id')
+    for name, columns in INDEXES:
+        op.execute('CREATE INDEX {} ON attestation ({})'.format(
+            name, columns))
+    # The legacy indexes match and are attached rather than rebuilt
+    op.execute("ALTER TABLE attestation ATTACH PARTITION attestation_legacy "
+               "FOR VALUES FROM (MINVALUE) TO ('{}')".format(cutover))
+    op.execute("""
+        CREATE TABLE attestation_y{:%Y}m{:%m} PARTITION OF attestation
+            (PRIMARY KEY (id)) FOR VALUES FROM ('{}') TO ('{}')
+    """.format(cutover, cutover, cutover, following))
+    # Catches rows beyond the last monthly partition, which should stay
+    # empty: a partition cannot be created for a range it has rows for
+    op.execute('CREATE TABLE attestation_default PARTITION OF attestation '
+               '(PRIMARY KEY (id)) DEFAULT')
+
+
+def downgrade():
+    bind = op.get_bind()
+    if bind.execute("SELECT to_regclass('attestation_legacy')").scalar() \
+            is None:
+        raise RuntimeError('attestation_legacy was archived, the table '
+                           'cannot be converted back')
+
+    op.execute('LOCK TABLE attestation IN ACCESS EXCLUSIVE MODE')
+    op.execute('ALTER TABLE attestation DETACH PARTITION attestation_legacy')
+    op.execute('ALTER TABLE attestation_legacy DROP CONSTRAINT '
+               'attestation_legacy_created_at_check')
+    op.execute("""
+        INSERT INTO attestation_legacy
+            (id, method, eth_address, value, signature, created_at,
+             updated_at)
+        SELECT id, method, eth_address, value, signature, created_at,
+            updated_at
+        FROM attestation
+    """)
+    op.execute('ALTER SEQUENCE attestation_id_seq '
+               'OWNED BY attestation_legacy.id')
+    # Drops the remaining partitions
+    op.execute('DROP TABLE attestation')
+    op.execute('ALTER TABLE attestation_legacy RENAME TO attestation')
+    for name, _ in INDEXES:
+        op.execute('ALTER INDEX {} RENAME TO {}'.format(
+            name.replace('attestation', 'attestation_legacy', 1), name))
+    op.execute('ALTER INDEX uq_attestation_legacy_eth_address_method_value '
+               'RENAME TO uq_attestation_eth_address_method_value')
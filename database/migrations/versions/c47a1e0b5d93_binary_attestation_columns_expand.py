@@ -0,0 +1,101 @@
+"""Add bytea copies of attestation eth_address and signature
+
+First half of the online migration of attestation.eth_address and
+attestation.signature from hex strings to bytea. It adds the bytea columns,
+keeps them in sync with a trigger, backfills existing rows in batches and
+builds the lookup indexes on the new column concurrently, without blocking
+writes. It can be applied ahead of a deploy with
+
+    FLASK_APP=main.py flask db upgrade c47a1e0b5d93
+
+The next revision swaps the columns in a short transaction.
+
+Revision ID: c47a1e0b5d93
+Revises: 9b2e4d61c0a7
+Create Date: 2018-10-09 11:03:52.417310
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'c47a1e0b5d93'
+down_revision = '9b2e4d61c0a7'
+branch_labels = None
+depends_on = None
+
+BATCH_SIZE = 10000
+
+
+def hex_to_bytea(column):
+    # Values that are not well formed hex are left NULL rather than failing
+    # the migration
+    return ("CASE WHEN {0} ~ '^0x([0-9a-fA-F]{{2}})+$' "
+            "THEN decode(substr({0}, 3), 'hex') END").format(column)
+
+
+def upgrade():
+    op.add_column('attestation',
+                  sa.Column('eth_address_bin', sa.LargeBinary(), nullable=True))
+    op.add_column('attestation',
+                  sa.Column('signature_bin', sa.LargeBinary(), nullable=True))
+
+    # Keep the new columns in sync for rows written during the backfill
+    op.execute("""
+        CREATE FUNCTION attestation_sync_binary() RETURNS trigger AS $$
+        BEGIN
+            NEW.eth_address_bin := {};
+            NEW.signature_bin := {};
+            RETURN NEW;
+        END;
+        $$ LANGUAGE plpgsql
+    """.format(hex_to_bytea('NEW.eth_address'),
+               hex_to_bytea('NEW.signature')))
+    op.execute("""
+        CREATE TRIGGER attestation_sync_binary
+        BEFORE INSERT OR UPDATE ON attestation
+        FOR EACH ROW EXECUTE PROCEDURE attestation_sync_binary()
+    """)
+
+    # Backfill and build indexes outside of a transaction so that each batch
+    # commits on its own and locks are held only briefly
+    op.execute('COMMIT')
+    conn = op.get_bind()
+    max_id = conn.execute('SELECT max(id) FROM attestation').scalar() or 0
+    for low in range(0, max_id, BATCH_SIZE):
+        conn.execute(sa.text("""
+            UPDATE attestation
+            SET eth_address_bin = {}, signature_bin = {}
+            WHERE id > :low AND id <= :high
+        """.format(hex_to_bytea('eth_address'), hex_to_bytea('signature'))),
+            low=low, high=low + BATCH_SIZE)
+
+    op.create_index(
+        'ix_attestation_eth_address_bin_created_at_id',
+        'attestation',
+        ['eth_address_bin', 'created_at', 'id'],
+        unique=False,
+        postgresql_concurrently=True
+    )
+    op.create_index(
+        'ix_attestation_eth_address_bin_method_created_at_id',
+        'attestation',
+        ['eth_address_bin', 'method', 'created_at', 'id'],
+        unique=False,
+        postgresql_concurrently=True
+    )
+    # Open a transaction again for the migrations that follow
+    op.execute('BEGIN')
+
+
+def downgrade():
+    op.drop_index('ix_attestation_eth_address_bin_method_created_at_id',
+                  table_name='attestation')
+    op.drop_index('ix_attestation_eth_address_bin_created_at_id',
+                  table_name='attestation')
+    # The trigger is already gone when downgrading from 5e8d2f3a6b10
+    op.execute('DROP TRIGGER IF EXISTS attestation_sync_binary ON attestation')
+    op.execute('DROP FUNCTION IF EXISTS attestation_sync_binary()')
+    op.drop_column('attestation', 'signature_bin')
+    op.drop_column('attestation', 'eth_address_bin')
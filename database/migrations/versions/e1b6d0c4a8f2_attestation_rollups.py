@@ -0,0 +1,57 @@
+"""Add attestation rollup tables
+
+Revision ID: e1b6d0c4a8f2
+Revises: 7d4c1b9e2f85
+Create Date: 2018-10-15 09:48:36.271550
+
+"""
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+
+# revision identifiers, used by Alembic.
+revision = 'e1b6d0c4a8f2'
+down_revision = '7d4c1b9e2f85'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table(
+        'attestation_daily_count',
+        sa.Column('day', sa.Date(), nullable=False),
+        sa.Column(
+            'method',
+            postgresql.ENUM('PHONE', 'EMAIL', 'AIRBNB', 'FACEBOOK', 'TWITTER',
+                            name='attestationtypes', create_type=False),
+            nullable=False
+        ),
+        sa.Column('count', sa.BigInteger(), nullable=False),
+        sa.PrimaryKeyConstraint('day', 'method')
+    )
+    op.create_table(
+        'identity_coverage',
+        sa.Column('eth_address', sa.LargeBinary(), nullable=False),
+        sa.Column('methods', sa.SmallInteger(), nullable=False),
+        sa.PrimaryKeyConstraint('eth_address')
+    )
+    op.create_table(
+        'coverage_count',
+        sa.Column('methods', sa.SmallInteger(), nullable=False),
+        sa.Column('identities', sa.BigInteger(), nullable=False),
+        sa.PrimaryKeyConstraint('methods')
+    )
+    op.create_table(
+        'rollup_watermark',
+        sa.Column('name', sa.String(), nullable=False),
+        sa.Column('last_id', sa.BigInteger(), nullable=False),
+        sa.PrimaryKeyConstraint('name')
+    )
+
+
+def downgrade():
+    op.drop_table('rollup_watermark')
+    op.drop_table('coverage_count')
+    op.drop_table('identity_coverage')
+    op.drop_table('attestation_daily_count')
@@ -1,4 +1,8 @@
+from config import settings
 from database import db
+from sqlalchemy import func, literal_column
+from sqlalchemy.dialects.postgresql import insert
+from database.types import EthAddress, HexBytes
 from datetime import datetime
 from enum import Enum
 
@@ -14,7 +18,123 @@ class AttestationTypes(Enum):
 class Attestation(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     method = db.Column(db.Enum(AttestationTypes))
-    eth_address = db.Column(db.String)
+    eth_address = db.Column(EthAddress)
     value = db.Column(db.String)
-    signature = db.Column(db.String)
+    signature = db.Column(HexBytes)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
+    # Set when the same fact is verified again
+    updated_at = db.Column(db.DateTime)
+
+    __table_args__ = (
+        # Keyset pagination of an identity's attestations, optionally
+        # filtered by method, ordered by (created_at, id)
+        db.Index('ix_attestation_eth_address_created_at_id',
+                 eth_address, created_at, id),
+        db.Index('ix_attestation_eth_address_method_created_at_id',
+                 eth_address, method, created_at, id),
+    )
+    if not settings.ATTESTATION_PARTITIONED:
+        # One row per verified fact. value is NULL for Facebook and Twitter.
+        # The partitioned table cannot have it, see ATTESTATION_PARTITIONED,
+        # only its attestation_legacy partition keeps a copy.
+        __table_args__ += (
+            db.Index('uq_attestation_eth_address_method_value',
+                     eth_address, method, func.coalesce(value, ''),
+                     unique=True),
+        )
+
+
+def upsert_attestations(rows):
+    """
+    Returns an INSERT for the given attestation rows (dicts of column values)
+    that refreshes the signature and updated_at of any fact already stored
+    instead of adding a duplicate. Postgres rejects a statement that would
+    update the same row twice, so rows must not repeat a fact.
+    """
+    stmt = insert(Attestation.__table__).values(rows)
+    return stmt.on_conflict_do_update(
+        index_elements=_fact_index_elements(),
+        set_={
+            'signature': stmt.excluded.signature,
+            'updated_at': stmt.excluded.created_at
+        })
+
+
+def insert_new_attestations(rows):
+    """
+    Returns an INSERT for the given attestation rows that skips the facts
+    already stored, leaving their rows as they are.
+    """
+    return insert(Attestation.__table__).values(rows).on_conflict_do_nothing(
+        index_elements=_fact_index_elements())
+
+
+def _fact_index_elements():
+    table = Attestation.__table__
+    # Postgres only matches the index with the same literal, not a bound
+    # parameter
+    return [table.c.eth_address, table.c.method,
+            func.coalesce(table.c.value, literal_column("''"))]
+
+
+class IdempotencyKey(db.Model):
+    # SHA-256 of the route and the client supplied Idempotency-Key header
+    key = db.Column(db.LargeBinary(32), primary_key=True)
+    # SHA-256 of the request payload, to detect a key reused for another request
+    request_hash = db.Column(db.LargeBinary(32), nullable=False)
+    status_code = db.Column(db.SmallInteger, nullable=False)
+    response = db.Column(db.Text, nullable=False)
+    expires_at = db.Column(db.DateTime, nullable=False, index=True)
+
+
+class AttestationDailyCount(db.Model):
+    # New attestations per day of created_at and method
+    day = db.Column(db.Date, primary_key=True)
+    method = db.Column(db.Enum(AttestationTypes), primary_key=True)
+    count = db.Column(db.BigInteger, nullable=False)
+
+
+class IdentityCoverage(db.Model):
+    # Methods each identity has attestations for
+    eth_address = db.Column(EthAddress, primary_key=True)
+    # Bit (value - 1) is set for each AttestationTypes member
+    methods = db.Column(db.SmallInteger, nullable=False)
+
+
+class CoverageCount(db.Model):
+    # Number of identities per combination of attested methods
+    methods = db.Column(db.SmallInteger, primary_key=True)
+    identities = db.Column(db.BigInteger, nullable=False)
+
+
+class RollupWatermark(db.Model):
+    # Highest attestation id included in the rollups above
+    name = db.Column(db.String, primary_key=True)
+    last_id = db.Column(db.BigInteger, nullable=False)
+
+
+class ResignCheckpoint(db.Model):
+    # Progress of tools/resign_attestations.py through each phase, 'sign'
+    # or 'apply', followed by ':<shard name>' when sharded, for the signing
+    # key with address signer
+    phase = db.Column(db.String, primary_key=True)
+    signer = db.Column(db.String, nullable=False)
+    last_id = db.Column(db.BigInteger, nullable=False)
+
+
+class EventCheckpoint(db.Model):
+    # Position of the event consumer called name: blocks before block_number
+    # were processed, and so were the events of block_number up to the one
+    # at (transaction_index, log_index) when these are set
+    name = db.Column(db.String, primary_key=True)
+    block_number = db.Column(db.BigInteger, nullable=False)
+    transaction_index = db.Column(db.Integer)
+    log_index = db.Column(db.Integer)
+
+
+class EventBlock(db.Model):
+    # Hashes of the unconfirmed blocks the consumer called name has seen, to
+    # detect reorgs. Rows older than EVENT_CONFIRMATIONS blocks are deleted.
+    name = db.Column(db.String, primary_key=True)
+    block_number = db.Column(db.BigInteger, primary_key=True)
+    block_hash = db.Column(HexBytes, nullable=False)
@@ -0,0 +1,46 @@
+"""
+Routes read-only queries to the read replica set by READ_DATABASE_URL.
+
+The replica applies the primary's changes with some lag, so an identity's
+own attestations are read from the primary for REPLICA_MAX_LAG seconds
+after they were written by this process. Reads that do not depend on a
+particular write, such as exports and statistics, always go to the replica.
+"""
+from flask import current_app
+
+from config import settings
+from database import db
+from util.addresses import canonical_address
+from util.ttl_cache import TTLCache
+
+BIND = 'replica'
+
+# eth_address -> True while a write may not have reached the replica
+recent_writes = TTLCache(maxsize=100000, ttl=settings.REPLICA_MAX_LAG)
+
+
+def record_write(eth_address):
+    """Read eth_address's attestations from the primary for a while."""
+    recent_writes.set(canonical_address(eth_address), True)
+
+
+def replica_engine():
+    """
+    Returns the replica's Engine, or None if no replica is configured.
+    """
+    if BIND not in (current_app.config.get('SQLALCHEMY_BINDS') or {}):
+        return None
+    return db.get_engine(bind=BIND)
+
+
+def reader(eth_address=None):
+    """
+    Returns what to execute a read-only query on: the replica's Engine, or
+    the session when there is no replica or eth_address was written too
+    recently for the replica to have caught up.
+    """
+    engine = replica_engine()
+    if engine is None or (eth_address is not None and
+                          recent_writes.get(canonical_address(eth_address))):
+        return db.session
+    return engine
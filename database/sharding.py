@@ -0,0 +1,124 @@
+"""
+Spreads attestations across the databases in ATTESTATION_SHARD_URLS by
+eth_address. Every other table stays on DATABASE_URL.
+
+All attestations of an identity are stored on one shard, picked by
+rendezvous hashing: each shard's name is hashed together with the address
+and the highest hash wins. Appending a shard only moves the identities it
+now wins, about 1/N of them, which
+tools/rebalance_attestation_shards.py copies over.
+
+Ids are assigned by each shard's own sequence, so they are only unique
+within a shard.
+"""
+import concurrent.futures
+import hashlib
+from contextlib import contextmanager
+
+from flask import current_app
+from sqlalchemy.orm import Session
+
+from database import db
+from util.addresses import canonical_address
+
+PREFIX = 'attestation_shard_'
+
+
+def bind_name(index):
+    return PREFIX + str(index)
+
+
+def shard_names():
+    """Bind names of the configured shards, empty if not sharded."""
+    binds = current_app.config.get('SQLALCHEMY_BINDS') or {}
+    return sorted((name for name in binds if name.startswith(PREFIX)),
+                  key=lambda name: int(name[len(PREFIX):]))
+
+
+def _weight(name, eth_address):
+    digest = hashlib.blake2b(
+        (name + ':' + canonical_address(eth_address)).encode('utf-8'),
+        digest_size=8).digest()
+    return int.from_bytes(digest, 'big')
+
+
+def owner(eth_address, names):
+    """Returns the name of the shard among names storing eth_address."""
+    return max(names, key=lambda name: _weight(name, eth_address))
+
+
+def shard_engine(eth_address):
+    """
+    Returns the Engine of the shard storing eth_address's attestations, or
+    None if not sharded.
+    """
+    names = shard_names()
+    if not names:
+        return None
+    return db.get_engine(bind=owner(eth_address, names))
+
+
+def shard_engines():
+    """Returns (name, Engine) for each shard."""
+    return [(name, db.get_engine(bind=name)) for name in shard_names()]
+
+
+@contextmanager
+def attestation_transaction(eth_address):
+    """
+    Yields what to read and write eth_address's attestations on in one
+    transaction, committed on exit and rolled back on error: a Connection
+    to its shard, or the session if not sharded.
+    """
+    engine = shard_engine(eth_address)
+    if engine is not None:
+        with engine.begin() as conn:
+            yield conn
+        return
+    try:
+        yield db.session
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        raise
+
+
+def attestation_sessions():
+    """
+    Yields (shard name, Session) for each database storing attestations, in
+    turn: a session on each shard, closed once the next is asked for, or
+    (None, db.session) if not sharded. For maintenance that runs on every
+    database.
+    """
+    engines = shard_engines()
+    if not engines:
+        yield None, db.session
+        return
+    for name, engine in engines:
+        session = Session(bind=engine)
+        try:
+            yield name, session
+        finally:
+            session.close()
+
+
+def scatter(statement, **params):
+    """
+    Runs a read-only statement on all shards at once, or on the session if
+    not sharded.
+
+    Returns:
+        list of (shard name, list of rows), with None as the name when not
+        sharded
+    """
+    engines = shard_engines()
+    if not engines:
+        return [(None, db.session.execute(statement, params).fetchall())]
+    with concurrent.futures.ThreadPoolExecutor(len(engines)) as pool:
+        futures = [(name, pool.submit(_fetch_all, engine, statement, params))
+                   for name, engine in engines]
+        return [(name, future.result()) for name, future in futures]
+
+
+def _fetch_all(engine, statement, params):
+    return engine.execute(statement, params).fetchall()
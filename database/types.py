@@ -0,0 +1,36 @@
+from sqlalchemy import types
+from web3 import Web3
+
+
+class HexBytes(types.TypeDecorator):
+    """
+    Stores a 0x prefixed hex string, such as a signature, as raw bytes and
+    returns it as a 0x prefixed lowercase hex string.
+    """
+    impl = types.LargeBinary
+
+    def process_bind_param(self, value, dialect):
+        if value is None:
+            return None
+        if isinstance(value, (bytes, bytearray, memoryview)):
+            return bytes(value)
+        if value[:2] in ('0x', '0X'):
+            value = value[2:]
+        return bytes.fromhex(value)
+
+    def process_result_value(self, value, dialect):
+        if value is None:
+            return None
+        return '0x' + bytes(value).hex()
+
+
+class EthAddress(HexBytes):
+    """
+    Stores an Ethereum address as its 20 raw bytes and returns it in
+    checksum format.
+    """
+
+    def process_result_value(self, value, dialect):
+        if value is None:
+            return None
+        return Web3.toChecksumAddress('0x' + bytes(value).hex())
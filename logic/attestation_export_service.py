@@ -0,0 +1,79 @@
+import csv
+import io
+import json
+
+from database import db
+from database.attestation_records import COLUMNS
+from database.attestation_records import iter_attestations
+from database.attestation_records import select_attestations
+from database.models import Attestation, AttestationTypes
+from database.replica import replica_engine
+from database.sharding import shard_engines
+
+FORMATS = ('ndjson', 'csv')
+
+CONTENT_TYPES = {
+    'ndjson': 'application/x-ndjson',
+    'csv': 'text/csv'
+}
+
+
+def _values(record):
+    values = record.as_dict()
+    values['method'] = values['method'].name.lower()
+    for column in ('created_at', 'updated_at'):
+        if values[column] is not None:
+            values[column] = values[column].isoformat()
+    return values
+
+
+def _ndjson(records):
+    return ''.join(json.dumps(_values(record)) + '\n' for record in records)
+
+
+def _csv(records):
+    out = io.StringIO()
+    writer = csv.DictWriter(out, COLUMNS)
+    writer.writerows(_values(record) for record in records)
+    return out.getvalue()
+
+
+class AttestationExportService:
+
+    def export(export_format='ndjson', method=None, since=None, until=None,
+               batch_size=1000):
+        """Stream attestations as NDJSON or CSV, in no particular order.
+
+        Rows are read from each shard in turn, or from the read replica if
+        there is one, through a server-side cursor batch_size at a time, so
+        memory use does not depend on the number of attestations. Must be
+        consumed within an application context.
+
+        Args:
+            export_format (str): 'ndjson' or 'csv'
+            method (str): Optional attestation method to filter by
+            since (datetime): Optional earliest created_at to include
+            until (datetime): Optional created_at to stop before
+
+        Returns:
+            Generator of str chunks, one per batch.
+        """
+        criteria = []
+        if method:
+            criteria.append(
+                Attestation.method == AttestationTypes[method.upper()])
+        if since:
+            criteria.append(Attestation.created_at >= since)
+        if until:
+            criteria.append(Attestation.created_at < until)
+        query = select_attestations(*criteria)
+        encode = _csv if export_format == 'csv' else _ndjson
+
+        if export_format == 'csv':
+            yield ','.join(COLUMNS) + '\r\n'
+        engines = [engine for _, engine in shard_engines()] or \
+            [replica_engine() or db.engine]
+        for engine in engines:
+            with engine.connect() as conn:
+                for records in iter_attestations(query, conn, batch_size):
+                    yield encode(records)
@@ -0,0 +1,160 @@
+import datetime
+import fcntl
+import logging
+import os
+import threading
+import time
+
+from sqlalchemy import text
+
+from config import settings
+from database import db
+from database.replica import replica_engine
+from database.sharding import shard_engines
+from util.addresses import address_bytes
+from util.bloom import BloomFilter
+
+# Seconds during which an attestation is added again by every refresh. Ids
+# are assigned before the inserting transaction commits, so a lower id may
+# still become visible after a higher one.
+LAG = 60
+
+_UPTO = text("""
+SELECT max(id) FROM attestation WHERE id > :last_id AND created_at < :cutoff
+""")
+
+_ADDRESSES = text("""
+SELECT id, eth_address FROM attestation
+WHERE id > :last_id AND id <= :upto
+ORDER BY id
+LIMIT :batch_size
+""")
+
+# Attestations past the refresh's ids that may have been committed out of
+# id order, added on every refresh until they are older than LAG
+_RECENT_ADDRESSES = text("""
+SELECT eth_address FROM attestation
+WHERE id > :last_id AND created_at >= :cutoff
+""")
+
+
+def _key(eth_address):
+    return address_bytes(eth_address)
+
+
+class AttestationFilter():
+    """
+    Opt-in Bloom filter of the addresses of identities with attestations,
+    which tells that an identity has none without querying Postgres.
+
+    A background thread fills the filter from the attestation table when the
+    app starts, and every ATTESTATION_FILTER_REFRESH_INTERVAL seconds adds
+    the attestations stored since by any process. Those stored in the last
+    LAG seconds are added again by each refresh, as they may have become
+    visible out of id order. Attestations stored by this process are added
+    right away. The filter is only used once the first fill is complete.
+
+    With ATTESTATION_FILTER_FILE the filter is mapped from that file and
+    shared by the processes on the host. Only the process holding its lock
+    fills and refreshes it, and another takes over if that one exits.
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self._filter = None
+        self._ready = False
+        self._ready_path = None
+        self._owner = None
+        self._filled = False
+        self._last_ids = {}
+
+    def init_app(self, app):
+        if not settings.ATTESTATION_FILTER:
+            return
+        self.app = app
+        path = settings.ATTESTATION_FILTER_FILE
+        self._filter = BloomFilter(settings.ATTESTATION_FILTER_CAPACITY,
+                                   settings.ATTESTATION_FILTER_ERROR_RATE,
+                                   path)
+        if path:
+            self._ready_path = path + '.ready'
+        self.enabled = True
+
+        thread = threading.Thread(target=self._run,
+                                  name='attestation-filter',
+                                  daemon=True)
+        thread.start()
+
+    @property
+    def ready(self):
+        if not self._ready and self._ready_path is not None:
+            self._ready = os.path.exists(self._ready_path)
+        return self._ready
+
+    def add(self, eth_address):
+        if self.enabled:
+            self._filter.add(_key(eth_address))
+
+    def might_have_attestations(self, eth_address):
+        """
+        Returns:
+            bool: False if the identity has no attestations. True if it may
+            have some, or if the filter is not in use.
+        """
+        if not self.enabled or not self.ready:
+            return True
+        return _key(eth_address) in self._filter
+
+    def _is_owner(self):
+        if self._ready_path is None or self._owner is not None:
+            return True
+        owner = open(settings.ATTESTATION_FILTER_FILE + '.lock', 'w')
+        try:
+            fcntl.flock(owner, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            owner.close()
+            return False
+        self._owner = owner
+        # Attestations stored while no process refreshed the filter are
+        # missing until this process has filled it again
+        if os.path.exists(self._ready_path):
+            os.remove(self._ready_path)
+        return True
+
+    def _refresh(self, batch_size=10000):
+        cutoff = datetime.datetime.utcnow() - datetime.timedelta(seconds=LAG)
+        engines = shard_engines() or [(None, replica_engine() or db.engine)]
+        for name, engine in engines:
+            last_id = self._last_ids.get(name, 0)
+            upto = engine.execute(_UPTO, last_id=last_id,
+                                  cutoff=cutoff).scalar()
+            while upto is not None and last_id < upto:
+                rows = engine.execute(_ADDRESSES, last_id=last_id, upto=upto,
+                                      batch_size=batch_size).fetchall()
+                if not rows:
+                    break
+                self._filter.update(bytes(eth_address)
+                                    for _, eth_address in rows)
+                last_id = self._last_ids[name] = rows[-1][0]
+            self._filter.update(bytes(eth_address) for eth_address, in
+                                engine.execute(_RECENT_ADDRESSES,
+                                               last_id=last_id,
+                                               cutoff=cutoff))
+
+    def _run(self):
+        while True:
+            try:
+                if self._is_owner():
+                    with self.app.app_context():
+                        self._refresh()
+                    if not self._filled:
+                        self._filled = self._ready = True
+                        if self._ready_path is not None:
+                            open(self._ready_path, 'w').close()
+                        logging.info("attestation filter is ready")
+            except Exception:
+                logging.exception("failed to refresh the attestation filter")
+            time.sleep(settings.ATTESTATION_FILTER_REFRESH_INTERVAL)
+
+
+attestation_filter = AttestationFilter()
@@ -0,0 +1,161 @@
+import base64
+import datetime
+
+from marshmallow.exceptions import ValidationError
+from sqlalchemy import exists, func, select, tuple_
+from web3 import Web3
+
+from database.attestation_records import fetch_attestations
+from database.attestation_records import select_attestations
+from database.replica import reader
+from database.sharding import shard_engine
+from database.models import Attestation, AttestationTypes
+from logic.attestation_filter import attestation_filter
+from logic.attestation_service import claim_for_attestation
+from logic.attestation_summary_cache import attestation_summary_cache
+
+CURSOR_DATETIME_FORMAT = '%Y-%m-%dT%H:%M:%S.%f'
+
+
+class LookupServiceResponse():
+    def __init__(self, data={}):
+        self.data = data
+
+
+def encode_cursor(created_at, id):
+    raw = '{}|{}'.format(created_at.strftime(CURSOR_DATETIME_FORMAT), id)
+    return base64.urlsafe_b64encode(raw.encode('utf-8')).decode('ascii')
+
+
+def decode_cursor(cursor):
+    """
+    Raises:
+        ValidationError: The cursor was not produced by encode_cursor
+    """
+    try:
+        raw = base64.urlsafe_b64decode(cursor.encode('ascii')).decode('utf-8')
+        created_at, id = raw.split('|')
+        return (datetime.datetime.strptime(created_at, CURSOR_DATETIME_FORMAT),
+                int(id))
+    except (ValueError, UnicodeError):
+        raise ValidationError('Invalid cursor.', 'cursor')
+
+
+def _attestation(row):
+    claim_type, data = claim_for_attestation(row.method, row.value)
+    return {
+        'method': row.method.name.lower(),
+        'claim_type': claim_type,
+        'data': data,
+        'signature': row.signature,
+        'created_at': row.created_at
+    }
+
+
+class AttestationLookupService:
+
+    def list_attestations(eth_address, method=None, limit=20, cursor=None):
+        """List the attestations of an identity, newest first.
+
+        Results are paginated by keyset on (created_at, id), so every page
+        is a range scan of the (eth_address[, method], created_at, id) index
+        no matter how deep into the results it is.
+
+        Args:
+            eth_address (str): Address of ERC725 identity
+            method (str): Optional attestation method to filter by, e.g.
+                'phone'
+            limit (int): Maximum number of attestations to return
+            cursor (str): next_cursor of the previous page
+
+        Returns:
+            LookupServiceResponse
+
+        Raises:
+            ValidationError: The identity or cursor is invalid
+        """
+        if not Web3.isAddress(eth_address):
+            raise ValidationError('Invalid identity.', 'identity')
+
+        criteria = [Attestation.eth_address == eth_address]
+        if method:
+            criteria.append(
+                Attestation.method == AttestationTypes[method.upper()])
+        if cursor:
+            criteria.append(
+                tuple_(Attestation.created_at, Attestation.id) <
+                tuple_(*decode_cursor(cursor)))
+        rows = fetch_attestations(select_attestations(*criteria).order_by(
+            Attestation.created_at.desc(),
+            Attestation.id.desc()
+        ).limit(limit + 1), shard_engine(eth_address) or reader(eth_address))
+
+        next_cursor = None
+        if len(rows) > limit:
+            rows = rows[:limit]
+            next_cursor = encode_cursor(rows[-1].created_at, rows[-1].id)
+
+        return LookupServiceResponse({
+            'attestations': [_attestation(row) for row in rows],
+            'next_cursor': next_cursor
+        })
+
+    def get_summary(eth_address):
+        """Summarize the attestations of an identity: the methods it has
+        attestations for, and the latest signed attestation of each method,
+        newest first. Summaries are cached until the identity stores an
+        attestation, see AttestationSummaryCache.
+
+        Args:
+            eth_address (str): Address of ERC725 identity
+
+        Returns:
+            LookupServiceResponse
+
+        Raises:
+            ValidationError: The identity is invalid
+        """
+        if not Web3.isAddress(eth_address):
+            raise ValidationError('Invalid identity.', 'identity')
+
+        def load():
+            signed_at = func.coalesce(Attestation.updated_at,
+                                      Attestation.created_at)
+            rows = fetch_attestations(select_attestations(
+                Attestation.eth_address == eth_address
+            ).distinct(Attestation.method).order_by(
+                Attestation.method, signed_at.desc(), Attestation.id.desc()
+            ), shard_engine(eth_address) or reader(eth_address))
+            rows.sort(key=lambda row: (row.updated_at or row.created_at,
+                                       row.id), reverse=True)
+            return {
+                'methods': [row.method.name.lower() for row in rows],
+                'attestations': [_attestation(row) for row in rows]
+            }
+
+        return LookupServiceResponse(
+            attestation_summary_cache.get_or_load(eth_address, load))
+
+    def has_attestations(eth_address):
+        """Tell whether an identity has any attestation. Most identities
+        without attestations are answered by the attestation filter without
+        a query.
+
+        Args:
+            eth_address (str): Address of ERC725 identity
+
+        Returns:
+            LookupServiceResponse
+
+        Raises:
+            ValidationError: The identity is invalid
+        """
+        if not Web3.isAddress(eth_address):
+            raise ValidationError('Invalid identity.', 'identity')
+
+        found = False
+        if attestation_filter.might_have_attestations(eth_address):
+            conn = shard_engine(eth_address) or reader(eth_address)
+            found = conn.execute(select([exists().where(
+                Attestation.eth_address == eth_address)])).scalar()
+        return LookupServiceResponse({'exists': found})
@@ -0,0 +1,236 @@
+import datetime
+import gzip
+import logging
+import os
+import re
+
+from sqlalchemy import func, text
+
+from database.models import Attestation
+from database.sharding import attestation_sessions
+
+EXPORT_COLUMNS = ('id', 'method', 'eth_address', 'value', 'signature',
+                  'created_at', 'updated_at')
+
+# e.g. FOR VALUES FROM ('2018-11-01 00:00:00') TO ('2018-12-01 00:00:00')
+_RANGE_BOUND = re.compile(r"FROM \((.+)\) TO \((.+)\)")
+
+# Rows in the id window that were verified again later keep the first row
+# for the fact, refreshed with the newest signature. Windows are walked in
+# id order, so the last window to touch a fact leaves the newest values.
+_REFRESH_FIRST = text("""
+UPDATE attestation AS first
+SET signature = latest.signature, updated_at = latest.created_at
+FROM (
+    SELECT DISTINCT ON (eth_address, method, coalesce(value, ''))
+        id, eth_address, method, coalesce(value, '') AS value, signature,
+        created_at
+    FROM attestation
+    WHERE id >= :start AND id < :end
+    ORDER BY eth_address, method, coalesce(value, ''), id DESC
+) AS latest
+WHERE first.eth_address = latest.eth_address
+    AND first.method = latest.method
+    AND coalesce(first.value, '') = latest.value
+    AND first.id < latest.id
+    AND NOT EXISTS (
+        SELECT 1 FROM attestation AS earlier
+        WHERE earlier.eth_address = first.eth_address
+            AND earlier.method = first.method
+            AND coalesce(earlier.value, '') = coalesce(first.value, '')
+            AND earlier.id < first.id)
+""")
+
+_PARTITIONS = text("""
+SELECT child.relname, pg_get_expr(child.relpartbound, child.oid)
+FROM pg_inherits
+JOIN pg_class AS child ON child.oid = pg_inherits.inhrelid
+WHERE pg_inherits.inhparent = 'attestation'::regclass
+""")
+
+# Partitions that were detached by an archive run that did not finish
+_DETACHED = text("""
+SELECT relname FROM pg_class
+WHERE relkind = 'r' AND NOT relispartition
+    AND (relname = 'attestation_legacy'
+         OR relname ~ '^attestation_y\\d{4}m\\d{2}$')
+""")
+
+_DELETE_LATER = text("""
+DELETE FROM attestation AS later
+USING attestation AS earlier
+WHERE later.id >= :start AND later.id < :end
+    AND earlier.eth_address = later.eth_address
+    AND earlier.method = later.method
+    AND coalesce(earlier.value, '') = coalesce(later.value, '')
+    AND earlier.id < later.id
+""")
+
+
+class AttestationMaintenanceService:
+
+    def has_duplicates():
+        """
+        Returns:
+            bool: Whether any fact is stored in more than one row, on any
+            shard.
+        """
+        for _, session in attestation_sessions():
+            duplicate = session.query(func.count()).select_from(
+                Attestation).group_by(
+                Attestation.eth_address,
+                Attestation.method,
+                func.coalesce(Attestation.value, '')
+            ).having(func.count() > 1).limit(1)
+            if session.query(duplicate.exists()).scalar():
+                return True
+        return False
+
+    def deduplicate(batch_size=10000):
+        """Collapse attestations of the same fact into the first row stored
+        for it, carrying over the newest signature as an update would.
+
+        Walks the table in id windows of batch_size, committing after each,
+        so locks are held briefly and the work can be resumed. Each shard
+        is deduplicated in turn: all attestations of an identity are on
+        one shard.
+
+        Returns:
+            int: Number of rows deleted.
+        """
+        deleted = 0
+        for _, session in attestation_sessions():
+            start, last = session.query(
+                func.min(Attestation.id), func.max(Attestation.id)).one()
+            while start is not None and start <= last:
+                window = {'start': start, 'end': start + batch_size}
+                session.execute(_REFRESH_FIRST, window)
+                deleted += session.execute(_DELETE_LATER, window).rowcount
+                session.commit()
+                start += batch_size
+        return deleted
+
+    def create_partitions(months_ahead=3):
+        """Create the monthly partitions of the attestation table up to
+        months_ahead months after the current one, continuing from the
+        last existing partition, on each shard.
+
+        Returns:
+            list: Names of the partitions created, prefixed with the shard
+            name and a dot when sharded.
+
+        Raises:
+            ValueError: The attestation table is not partitioned
+        """
+        start = _month(datetime.datetime.utcnow())
+        created = []
+        for shard, session in attestation_sessions():
+            uppers = [upper for _, _, upper in _partitions(session)
+                      if upper is not None]
+            if not uppers:
+                raise ValueError(
+                    "attestation is not partitioned{}, see migration "
+                    "a3f7c2d9e614".format(
+                        '' if shard is None else ' on ' + shard))
+            latest = max(uppers)
+            month = max(start, latest)
+            while month <= _add_months(start, months_ahead):
+                name = _partition_name(month)
+                _execute_with_lock_timeout(
+                    session,
+                    "CREATE TABLE {} PARTITION OF attestation "
+                    "(PRIMARY KEY (id)) FOR VALUES FROM ('{}') TO ('{}')"
+                    .format(name, month, _add_months(month, 1)))
+                created.append(_qualified(shard, name))
+                month = _add_months(month, 1)
+        return created
+
+    def archive_partitions(keep_months, directory):
+        """Detach the partitions of the attestation table that end more than
+        keep_months months before the current month, write each to
+        <directory>/<partition>.csv.gz and drop it. When sharded, this is
+        done on each shard, to <directory>/<shard>.<partition>.csv.gz.
+
+        The archive is written and synced to disk before the partition is
+        dropped, and a partition left detached by an interrupted run is
+        archived by the next one.
+
+        Returns:
+            list: Paths of the archives written.
+        """
+        cutoff = _add_months(_month(datetime.datetime.utcnow()),
+                             -keep_months)
+        archived = []
+        for shard, session in attestation_sessions():
+            for name, _, upper in _partitions(session):
+                if upper is not None and upper <= cutoff:
+                    _execute_with_lock_timeout(
+                        session,
+                        'ALTER TABLE attestation DETACH PARTITION {}'.format(
+                            name))
+            for name, in session.execute(_DETACHED).fetchall():
+                path = os.path.join(directory,
+                                    _qualified(shard, name) + '.csv.gz')
+                _copy_to_gzip(session, name, path)
+                session.execute('DROP TABLE {}'.format(name))
+                session.commit()
+                logging.info("archived %s to %s", name, path)
+                archived.append(path)
+        return archived
+
+
+def _month(d):
+    return datetime.datetime(d.year, d.month, 1)
+
+
+def _add_months(month, months):
+    years, month_index = divmod(month.month - 1 + months, 12)
+    return month.replace(year=month.year + years, month=month_index + 1)
+
+
+def _partition_name(month):
+    return 'attestation_y{:%Y}m{:%m}'.format(month, month)
+
+
+def _qualified(shard, name):
+    return name if shard is None else shard + '.' + name
+
+
+def _partitions(session):
+    """Returns (name, lower, upper) for each partition, with None for the
+    bounds of the default partition and for MINVALUE."""
+    partitions = []
+    for name, bound in session.execute(_PARTITIONS).fetchall():
+        match = _RANGE_BOUND.search(bound)
+        lower, upper = match.groups() if match else (None, None)
+        partitions.append((name, _parse_bound(lower), _parse_bound(upper)))
+    return partitions
+
+
+def _parse_bound(bound):
+    if bound is None or bound == 'MINVALUE':
+        return None
+    return datetime.datetime.strptime(bound.strip("'"), '%Y-%m-%d %H:%M:%S')
+
+
+def _execute_with_lock_timeout(session, statement):
+    # Attaching and detaching partitions locks the whole table. Fail rather
+    # than block all attestation reads and writes queued behind a long
+    # running query.
+    session.execute("SET LOCAL lock_timeout = '5s'")
+    session.execute(statement)
+    session.commit()
+
+
+def _copy_to_gzip(session, table, path):
+    tmp_path = path + '.tmp'
+    cursor = session.connection().connection.cursor()
+    with open(tmp_path, 'wb') as f:
+        with gzip.GzipFile(fileobj=f, mode='wb') as archive:
+            cursor.copy_expert(
+                'COPY {} ({}) TO STDOUT WITH (FORMAT csv, HEADER)'.format(
+                    table, ', '.join(EXPORT_COLUMNS)), archive)
+        f.flush()
+        os.fsync(f.fileno())
+    os.rename(tmp_path, path)
+    session.commit()
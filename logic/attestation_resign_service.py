@@ -0,0 +1,175 @@
+import collections
+import concurrent.futures
+import io
+import logging
+import os
+
+from eth_account import Account
+from sqlalchemy import text
+
+from database import db
+from database.attestation_records import iter_attestations
+from database.attestation_records import select_attestations
+from database.models import Attestation, ResignCheckpoint
+from database.sharding import attestation_sessions
+from logic.attestation_service import claim_for_attestation
+from util.attestations import generate_signature
+
+STAGING_TABLE = 'attestation_resign_staging'
+
+SIGN = 'sign'
+APPLY = 'apply'
+
+_CREATE_STAGING = text("""
+CREATE TABLE IF NOT EXISTS {} (
+    id bigint PRIMARY KEY,
+    signature bytea NOT NULL
+)
+""".format(STAGING_TABLE))
+
+_NEXT_WINDOW = text("""
+SELECT max(id) FROM (
+    SELECT id FROM {} WHERE id > :start ORDER BY id LIMIT :batch_size
+) AS staged
+""".format(STAGING_TABLE))
+
+# Rows staged by a batch whose checkpoint was not committed
+_DELETE_UNCHECKED = text("""
+DELETE FROM {} WHERE id > :last_id
+""".format(STAGING_TABLE))
+
+_APPLY_WINDOW = text("""
+UPDATE attestation
+SET signature = staged.signature
+FROM {} AS staged
+WHERE staged.id > :start AND staged.id <= :end
+    AND attestation.id = staged.id
+""".format(STAGING_TABLE))
+
+
+def _sign_batch(private_key, claims):
+    # Runs in a worker process
+    return [(id, generate_signature(private_key, eth_address, claim_type,
+                                    data))
+            for id, eth_address, claim_type, data in claims]
+
+
+class AttestationResignService:
+
+    def resign(private_key, workers=None, batch_size=1000):
+        """Replace the signature of every attestation with one made with
+        private_key, e.g. after ATTESTATION_SIGNING_KEY was rotated.
+
+        First all attestations are read through a server-side cursor in id
+        order and signed by a pool of worker processes, and the signatures
+        are loaded into a staging table with COPY. Then the staged
+        signatures are written to the attestation table batch_size ids per
+        transaction. Each phase records the last id it finished in the same
+        transaction as its work, so an interrupted run carries on where it
+        stopped when started again with the same key.
+
+        When sharded, this is done on each shard in turn, with a staging
+        table on the shard. Its checkpoints stay on DATABASE_URL and are
+        committed right after the shard's transaction; work they missed is
+        done again, to the same effect.
+
+        Attestations stored while the run is in progress should already be
+        signed with the new key, and their staged signatures are identical
+        anyway since signing is deterministic.
+
+        Returns:
+            int: Number of attestations signed by this run.
+        """
+        signer = Account.privateKeyToAccount(private_key).address
+        signed = 0
+        for shard, session in attestation_sessions():
+            session.execute(_CREATE_STAGING)
+            session.commit()
+            signed += _sign_all(session, _phase(SIGN, shard), private_key,
+                                signer, workers, batch_size)
+            _apply_all(session, _phase(APPLY, shard), signer, batch_size)
+            session.execute('DROP TABLE {}'.format(STAGING_TABLE))
+            session.commit()
+
+        ResignCheckpoint.query.delete()
+        db.session.commit()
+        return signed
+
+
+def _phase(phase, shard):
+    return phase if shard is None else phase + ':' + shard
+
+
+def _checkpoint(phase, signer):
+    checkpoint = ResignCheckpoint.query.get(phase)
+    if checkpoint is None:
+        checkpoint = ResignCheckpoint(phase=phase, signer=signer, last_id=0)
+        db.session.add(checkpoint)
+    elif checkpoint.signer != signer:
+        raise ValueError(
+            "An interrupted run for signing key {} must be finished with "
+            "that key first".format(checkpoint.signer))
+    return checkpoint
+
+
+def _sign_all(session, phase, private_key, signer, workers, batch_size):
+    last_id = _checkpoint(phase, signer).last_id
+    db.session.commit()
+    session.execute(_DELETE_UNCHECKED, {'last_id': last_id})
+    session.commit()
+    query = select_attestations(Attestation.id > last_id).order_by(
+        Attestation.id)
+
+    workers = workers or os.cpu_count() or 1
+    signed = 0
+    pending = collections.deque()
+    with concurrent.futures.ProcessPoolExecutor(workers) as pool, \
+            session.get_bind().connect() as conn:
+        # Batches are staged in id order as they complete. Only a couple of
+        # batches per worker are read ahead, bounding memory.
+        for records in iter_attestations(query, conn, batch_size):
+            claims = [(record.id, record.eth_address) +
+                      claim_for_attestation(record.method, record.value)
+                      for record in records]
+            pending.append(pool.submit(_sign_batch, private_key, claims))
+            if len(pending) >= 2 * workers:
+                signed += _stage(session, phase,
+                                 pending.popleft().result(), signer)
+        while pending:
+            signed += _stage(session, phase, pending.popleft().result(),
+                             signer)
+    return signed
+
+
+def _stage(session, phase, signatures, signer):
+    rows = ''.join('{:d}\t\\\\x{}\n'.format(id, signature[2:])
+                   for id, signature in signatures)
+    cursor = session.connection().connection.cursor()
+    cursor.copy_expert('COPY {} (id, signature) FROM STDIN'.format(
+        STAGING_TABLE), io.StringIO(rows))
+    _checkpoint(phase, signer).last_id = signatures[-1][0]
+    # The same transaction when not sharded. On a shard, the checkpoint is
+    # committed after the rows it covers.
+    session.commit()
+    db.session.commit()
+    logging.info("signed attestations up to id %d", signatures[-1][0])
+    return len(signatures)
+
+
+def _apply_all(session, phase, signer, batch_size):
+    while True:
+        checkpoint = _checkpoint(phase, signer)
+        start = checkpoint.last_id
+        end = session.execute(_NEXT_WINDOW, {
+            'start': start, 'batch_size': batch_size}).scalar()
+        if end is None:
+            session.commit()
+            db.session.commit()
+            return
+        # Applying a window again after an interruption writes the same
+        # signatures
+        session.execute(_APPLY_WINDOW, {'start': start, 'end': end})
+        checkpoint.last_id = end
+        session.commit()
+        db.session.commit()
+        logging.info("applied signatures up to id %d", end)
@@ -0,0 +1,215 @@
+import datetime
+
+from sqlalchemy import func, or_, select, text
+
+from database import db
+from database.models import AttestationDailyCount, AttestationTypes
+from database.models import CoverageCount, RollupWatermark
+from database.replica import reader
+from database.sharding import shard_engines
+
+WATERMARK = 'attestation_rollups'
+
+# Bit for an attestation's method in IdentityCoverage.methods
+_METHOD_BIT = ("(1 << (array_position(enum_range(NULL::attestationtypes), "
+               "method) - 1))")
+
+_UPTO = text("""
+SELECT max(id) FROM attestation WHERE id > :last_id AND created_at < :cutoff
+""")
+
+_DAILY_COUNTS = text("""
+SELECT created_at::date, method::text, count(*)
+FROM attestation
+WHERE id > :start AND id <= :end
+GROUP BY 1, 2
+""")
+
+_SEEN = text("""
+SELECT eth_address, bit_or({bit})::smallint
+FROM attestation
+WHERE id > :start AND id <= :end
+GROUP BY eth_address
+""".format(bit=_METHOD_BIT))
+
+# The counts and coverage are read from the attestations' database, a
+# shard or DATABASE_URL, and added to the rollups on DATABASE_URL
+_ADD_DAILY_COUNTS = text("""
+INSERT INTO attestation_daily_count (day, method, count)
+SELECT * FROM unnest(CAST(:days AS date[]),
+                     CAST(:methods AS attestationtypes[]),
+                     CAST(:counts AS bigint[]))
+ON CONFLICT (day, method) DO UPDATE
+SET count = attestation_daily_count.count + excluded.count
+""")
+
+# All parts of the statement see the coverage as it was before the upsert,
+# so each identity whose methods changed moves from its old combination's
+# count to its new one.
+_ADD_COVERAGE = text("""
+WITH seen AS (
+    SELECT * FROM unnest(CAST(:addresses AS bytea[]),
+                         CAST(:methods AS smallint[]))
+        AS seen (eth_address, methods)
+), old AS (
+    SELECT eth_address, identity_coverage.methods
+    FROM identity_coverage JOIN seen USING (eth_address)
+), new AS (
+    INSERT INTO identity_coverage (eth_address, methods)
+    SELECT eth_address, methods FROM seen
+    ON CONFLICT (eth_address) DO UPDATE
+    SET methods = identity_coverage.methods | excluded.methods
+    RETURNING eth_address, methods
+), changes AS (
+    SELECT old.methods, -1 AS delta
+    FROM new JOIN old USING (eth_address)
+    WHERE old.methods <> new.methods
+    UNION ALL
+    SELECT new.methods, 1 AS delta
+    FROM new LEFT JOIN old USING (eth_address)
+    WHERE old.methods IS DISTINCT FROM new.methods
+)
+INSERT INTO coverage_count (methods, identities)
+SELECT methods, sum(delta) FROM changes GROUP BY methods
+ON CONFLICT (methods) DO UPDATE
+SET identities = coverage_count.identities + excluded.identities
+""")
+
+
+class RollupServiceResponse():
+    def __init__(self, data={}):
+        self.data = data
+
+
+def _method_names(methods):
+    return [method.name.lower() for method in AttestationTypes
+            if methods & (1 << (method.value - 1))]
+
+
+def _sources():
+    """Returns (watermark name, what to read attestations from) for the
+    session, or for each shard with a watermark of its own, as ids are only
+    unique within a shard."""
+    engines = shard_engines()
+    if not engines:
+        return [(WATERMARK, db.session)]
+    return [(WATERMARK + ':' + name, engine) for name, engine in engines]
+
+
+def _add_window(source, window):
+    daily = source.execute(_DAILY_COUNTS, window).fetchall()
+    seen = source.execute(_SEEN, window).fetchall()
+    db.session.execute(_ADD_DAILY_COUNTS, {
+        'days': [day for day, _, _ in daily],
+        'methods': [method for _, method, _ in daily],
+        'counts': [count for _, _, count in daily]
+    })
+    db.session.execute(_ADD_COVERAGE, {
+        'addresses': [bytes(eth_address) for eth_address, _ in seen],
+        'methods': [methods for _, methods in seen]
+    })
+
+
+class AttestationRollupService:
+
+    def refresh(batch_size=10000, lag=60):
+        """Add attestations created since the last refresh to the rollups,
+        committing after every batch_size ids together with the watermark,
+        so each attestation is counted once even if a refresh is
+        interrupted.
+
+        Attestations created in the last lag seconds are left for the next
+        refresh: an id is assigned before the inserting transaction commits,
+        so a lower id may still become visible after a higher one. lag must
+        exceed the longest insert transaction.
+
+        When sharded, the attestations of each shard are added in turn.
+
+        Returns:
+            int: Highest attestation id included in the rollups, of any
+            shard.
+        """
+        cutoff = datetime.datetime.utcnow() - datetime.timedelta(seconds=lag)
+        last_ids = []
+        for name, source in _sources():
+            if RollupWatermark.query.get(name) is None:
+                db.session.add(RollupWatermark(name=name, last_id=0))
+                db.session.commit()
+
+            while True:
+                # Concurrent refreshes wait for each other's batch rather
+                # than counting the same attestations twice
+                watermark = RollupWatermark.query.filter(
+                    RollupWatermark.name == name).with_for_update().one()
+                upto = source.execute(_UPTO, {
+                    'last_id': watermark.last_id, 'cutoff': cutoff}).scalar()
+                if upto is None:
+                    last_ids.append(watermark.last_id)
+                    db.session.commit()
+                    break
+                window = {'start': watermark.last_id,
+                          'end': min(watermark.last_id + batch_size, upto)}
+                _add_window(source, window)
+                watermark.last_id = window['end']
+                db.session.commit()
+        return max(last_ids)
+
+    def rebuild(batch_size=10000, lag=60):
+        """Recompute the rollups from scratch, e.g. after attestations were
+        deleted or archived."""
+        db.session.execute('TRUNCATE attestation_daily_count, '
+                           'identity_coverage, coverage_count, '
+                           'rollup_watermark')
+        db.session.commit()
+        return AttestationRollupService.refresh(batch_size, lag)
+
+    def get_stats(since=None, until=None):
+        """Read attestation statistics from the rollups, on the read replica
+        if there is one.
+
+        Args:
+            since (date): First day to count attestations for, 30 days ago
+                if not set
+            until (date): Day to stop counting before, unbounded if not set
+
+        Returns:
+            RollupServiceResponse
+        """
+        conn = reader()
+        if since is None:
+            since = datetime.datetime.utcnow().date() - \
+                datetime.timedelta(days=30)
+        query = select([
+            AttestationDailyCount.day,
+            AttestationDailyCount.method,
+            AttestationDailyCount.count
+        ]).where(AttestationDailyCount.day >= since)
+        if until is not None:
+            query = query.where(AttestationDailyCount.day < until)
+        daily = [{
+            'day': day,
+            'method': method.name.lower(),
+            'count': count
+        } for day, method, count in conn.execute(query.order_by(
+            AttestationDailyCount.day, AttestationDailyCount.method))]
+
+        coverage = [{
+            'methods': _method_names(methods),
+            'identities': identities
+        } for methods, identities in conn.execute(select([
+            CoverageCount.methods, CoverageCount.identities
+        ]).where(CoverageCount.identities > 0).order_by(
+            CoverageCount.methods))]
+
+        last_id = conn.execute(select([
+            func.max(RollupWatermark.last_id)
+        ]).where(or_(
+            RollupWatermark.name == WATERMARK,
+            RollupWatermark.name.startswith(WATERMARK + ':')
+        ))).scalar()
+        return RollupServiceResponse({
+            'daily': daily,
+            'coverage': coverage,
+            'identities': sum(row['identities'] for row in coverage),
+            'last_id': last_id or 0
+        })
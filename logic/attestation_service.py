@@ -5,18 +5,26 @@ import json
 import requests
 import sendgrid
 import re
+import socket
 from random import randint
 
 from marshmallow.exceptions import ValidationError
+from requests.exceptions import Timeout as RequestTimeout
+from sqlalchemy.exc import OperationalError
 from urllib.request import Request, urlopen, HTTPError, URLError
 from sendgrid.helpers.mail import Email, Content, Mail
 from werkzeug.security import generate_password_hash, check_password_hash
 
 from config import settings
-from database import db
+from database import replica
+from database import sharding
 from database.models import Attestation
 from database.models import AttestationTypes
 from flask import session
+from logic.attestation_filter import attestation_filter
+from logic.attestation_summary_cache import attestation_summary_cache
+from logic.attestation_writer import COLUMNS, attestation_writer
+from logic.attestation_writer import store_attestations
 from logic.service_utils import (
     AirbnbVerificationError,
     EmailVerificationError,
@@ -25,7 +33,9 @@ from logic.service_utils import (
     TwitterVerificationError,
 )
 from requests_oauthlib import OAuth1
-from util import attestations, urls
+from util import attestations, deadline, urls
+from util.failure_counter import FailureCounter
+from util.singleflight import coalesce
 from web3 import Web3
 
 signing_key = settings.ATTESTATION_SIGNING_KEY
@@ -34,6 +44,12 @@ twitter_request_token_url = 'https://api.twitter.com/oauth/request_token'
 twitter_authenticate_url = 'https://api.twitter.com/oauth/authenticate'
 twitter_access_token_url = 'https://api.twitter.com/oauth/access_token'
 
+failed_attempts = FailureCounter(settings.VERIFY_FAILURE_THRESHOLD,
+                                 settings.VERIFY_FAILURE_WINDOW)
+
+# Postgres error code for a statement cancelled by statement_timeout
+QUERY_CANCELED = '57014'
+
 CLAIM_TYPES = {
     'phone': 10,
     'email': 11,
@@ -43,6 +59,12 @@ CLAIM_TYPES = {
 }
 
 
+def _session_scope():
+    # Email and Twitter verification read state from the caller's session,
+    # so identical arguments from different sessions must not be coalesced.
+    return getattr(session, 'sid', None)
+
+
 class VerificationServiceResponse():
     def __init__(self, data={}):
         self.data = data
@@ -84,7 +106,11 @@ class VerificationService:
         }
 
         url = 'https://api.authy.com/protected/json/phones/verification/start'
-        response = requests.post(url, params=params, headers=headers)
+        try:
+            response = requests.post(url, params=params, headers=headers,
+                                     timeout=deadline.timeout())
+        except RequestTimeout:
+            raise deadline.exceeded()
 
         try:
             response.raise_for_status()
@@ -105,6 +131,7 @@ class VerificationService:
 
         return VerificationServiceResponse()
 
+    @coalesce()
     def verify_phone(country_calling_code, phone, code, eth_address):
         """Check a phone verification code against the Twilio Verify API for a
         phone number.
@@ -124,6 +151,9 @@ class VerificationService:
             PhoneVerificationError: Verification request failed for a reason not
                 related to the arguments
         """
+        phone_number = "{} {}".format(country_calling_code, phone)
+        check_failed_attempts(eth_address, phone_number)
+
         params = {
             'country_code': country_calling_code,
             'phone_number': phone,
@@ -135,7 +165,11 @@ class VerificationService:
         }
 
         url = 'https://api.authy.com/protected/json/phones/verification/check'
-        response = requests.get(url, params=params, headers=headers)
+        try:
+            response = requests.get(url, params=params, headers=headers,
+                                    timeout=deadline.timeout())
+        except RequestTimeout:
+            raise deadline.exceeded()
 
         try:
             response.raise_for_status()
@@ -146,6 +180,7 @@ class VerificationService:
                 raise ValidationError('Verification code has expired.',
                                       field_names=['code'])
             elif response.json()['error_code'] == '60022':
+                failed_attempts.record_failure(eth_address, phone_number)
                 raise ValidationError('Verification code is incorrect.',
                                       field_names=['code'])
             else:
@@ -157,21 +192,18 @@ class VerificationService:
         # but it a good precaution to handle any inconsistency between the
         # success field and the status code
         if response.json()['success'] is True:
+            failed_attempts.reset(eth_address, phone_number)
             # TODO: determine what the text should be
             data = 'phone verified'
             # TODO: determine claim type integer code for phone verification
-            signature = attestations.generate_signature(
-                signing_key, eth_address, CLAIM_TYPES['phone'], data
-            )
+            signature = sign_claim(eth_address, 'phone', data)
 
-            attestation = Attestation(
+            save_attestation(Attestation(
                 method=AttestationTypes.PHONE,
                 eth_address=eth_address,
-                value="{} {}".format(country_calling_code, phone),
+                value=phone_number,
                 signature=signature
-            )
-            db.session.add(attestation)
-            db.session.commit()
+            ))
 
             return VerificationServiceResponse({
                 'signature': signature,
@@ -215,6 +247,9 @@ class VerificationService:
         content = Content('text/plain', message)
         mail = Mail(from_email, subject, to_email, content)
 
+        # The SendGrid client does not accept a timeout, so only check that
+        # the deadline has not passed before sending
+        deadline.check()
         try:
             _send_email_using_sendgrid(mail)
         except Exception as exc:
@@ -226,6 +261,7 @@ class VerificationService:
 
         return VerificationServiceResponse()
 
+    @coalesce(scope=_session_scope)
     def verify_email(email, code, eth_address):
         """Check a email verification code against the verification code stored
         in the session for that email.
@@ -241,6 +277,8 @@ class VerificationService:
         Raises:
             ValidationError: Verification request failed due to invalid arguments
         """
+        check_failed_attempts(eth_address, email)
+
         verification_obj = session.get('email_attestation', None)
         if not verification_obj:
             raise EmailVerificationError('No verification code was found.')
@@ -254,25 +292,23 @@ class VerificationService:
             raise ValidationError('Verification code has expired.', 'code')
 
         if verification_obj['code'] != code:
+            failed_attempts.record_failure(eth_address, email)
             raise ValidationError('Verification code is incorrect.', 'code')
 
+        failed_attempts.reset(eth_address, email)
         session.pop('email_attestation')
 
         # TODO: determine what the text should be
         data = 'email verified'
         # TODO: determine claim type integer code for email verification
-        signature = attestations.generate_signature(
-            signing_key, eth_address, CLAIM_TYPES['email'], data
-        )
+        signature = sign_claim(eth_address, 'email', data)
 
-        attestation = Attestation(
+        save_attestation(Attestation(
             method=AttestationTypes.EMAIL,
             eth_address=eth_address,
             value=email,
             signature=signature
-        )
-        db.session.add(attestation)
-        db.session.commit()
+        ))
 
         return VerificationServiceResponse({
             'signature': signature,
@@ -287,6 +323,7 @@ class VerificationService:
                '&redirect_uri={}').format(client_id, redirect_uri)
         return VerificationServiceResponse({'url': url})
 
+    @coalesce()
     def verify_facebook(code, eth_address):
         base_url = 'graph.facebook.com'
         client_id = settings.FACEBOOK_CLIENT_ID
@@ -296,9 +333,13 @@ class VerificationService:
         path = ('/v2.12/oauth/access_token?client_id={}'
                 '&client_secret={}&redirect_uri={}&code={}').format(
                     client_id, client_secret, redirect_uri, code)
-        conn = http.client.HTTPSConnection(base_url)
-        conn.request('GET', path)
-        response = json.loads(conn.getresponse().read())
+        conn = http.client.HTTPSConnection(base_url,
+                                           timeout=deadline.timeout())
+        try:
+            conn.request('GET', path)
+            response = json.loads(conn.getresponse().read())
+        except socket.timeout:
+            raise deadline.exceeded()
         has_access_token = ('access_token' in response)
         if not has_access_token or 'error' in response:
             raise FacebookVerificationError(
@@ -307,17 +348,13 @@ class VerificationService:
         # TODO: determine what the text should be
         data = 'facebook verified'
         # TODO: determine claim type integer code for phone verification
-        signature = attestations.generate_signature(
-            signing_key, eth_address, CLAIM_TYPES['facebook'], data
-        )
+        signature = sign_claim(eth_address, 'facebook', data)
 
-        attestation = Attestation(
+        save_attestation(Attestation(
             method=AttestationTypes.FACEBOOK,
             eth_address=eth_address,
             signature=signature
-        )
-        db.session.add(attestation)
-        db.session.commit()
+        ))
 
         return VerificationServiceResponse({
             'signature': signature,
@@ -331,7 +368,11 @@ class VerificationService:
             settings.TWITTER_CONSUMER_KEY,
             settings.TWITTER_CONSUMER_SECRET,
             callback_uri=callback_uri)
-        r = requests.post(url=twitter_request_token_url, auth=oauth)
+        try:
+            r = requests.post(url=twitter_request_token_url, auth=oauth,
+                              timeout=deadline.timeout())
+        except RequestTimeout:
+            raise deadline.exceeded()
         if r.status_code != 200:
             raise TwitterVerificationError('Invalid response from Twitter.')
         as_bytes = dict(cgi.parse_qsl(r.content))
@@ -346,6 +387,7 @@ class VerificationService:
             request_token['oauth_token'])
         return VerificationServiceResponse({'url': url})
 
+    @coalesce(scope=_session_scope)
     def verify_twitter(oauth_verifier, eth_address):
         # Verify authenticity of user
         if 'request_token' not in session:
@@ -356,7 +398,11 @@ class VerificationService:
             session['request_token']['oauth_token'],
             session['request_token']['oauth_token_secret'],
             verifier=oauth_verifier)
-        r = requests.post(url=twitter_access_token_url, auth=oauth)
+        try:
+            r = requests.post(url=twitter_access_token_url, auth=oauth,
+                              timeout=deadline.timeout())
+        except RequestTimeout:
+            raise deadline.exceeded()
         if r.status_code != 200:
             raise TwitterVerificationError(
                 'The verifier you provided is invalid.')
@@ -364,16 +410,13 @@ class VerificationService:
         # TODO: determine what the text should be
         data = 'twitter verified'
         # TODO: determine claim type integer code for phone verification
-        signature = attestations.generate_signature(
-            signing_key, eth_address, CLAIM_TYPES['twitter'], data)
+        signature = sign_claim(eth_address, 'twitter', data)
 
-        attestation = Attestation(
+        save_attestation(Attestation(
             method=AttestationTypes.TWITTER,
             eth_address=eth_address,
             signature=signature
-        )
-        db.session.add(attestation)
-        db.session.commit()
+        ))
 
         return VerificationServiceResponse({
             'signature': signature,
@@ -388,6 +431,7 @@ class VerificationService:
             'code': get_airbnb_verification_code(eth_address, airbnbUserId)
         })
 
+    @coalesce()
     def verify_airbnb(eth_address, airbnbUserId):
         validate_airbnb_user_id(airbnbUserId)
 
@@ -401,7 +445,10 @@ class VerificationService:
         )
 
         try:
-            response = urlopen(request)
+            response = urlopen(request, timeout=deadline.timeout())
+            profile = response.read().decode('utf-8')
+        except socket.timeout:
+            raise deadline.exceeded()
         except HTTPError as e:
             if e.code == 404:
                 raise AirbnbVerificationError(
@@ -410,10 +457,13 @@ class VerificationService:
                 raise AirbnbVerificationError(
                     "Can not fetch user's Airbnb profile.")
         except URLError as e:
+            # A connect timeout comes wrapped in URLError
+            if isinstance(e.reason, socket.timeout):
+                raise deadline.exceeded()
             raise AirbnbVerificationError(
                 "Can not fetch user's Airbnb profile.")
 
-        if code not in response.read().decode('utf-8'):
+        if code not in profile:
             raise AirbnbVerificationError(
                 "Origin verification code: " + code +
                 " has not been found in user's Airbnb profile."
@@ -421,18 +471,14 @@ class VerificationService:
 
         # TODO: determine the schema for claim data
         data = 'airbnbUserId:' + airbnbUserId
-        signature = attestations.generate_signature(
-            signing_key, eth_address, CLAIM_TYPES['airbnb'], data
-        )
+        signature = sign_claim(eth_address, 'airbnb', data)
 
-        attestation = Attestation(
+        save_attestation(Attestation(
             method=AttestationTypes.AIRBNB,
             eth_address=eth_address,
             value=airbnbUserId,
             signature=signature
-        )
-        db.session.add(attestation)
-        db.session.commit()
+        ))
 
         return VerificationServiceResponse({
             'signature': signature,
@@ -441,6 +487,76 @@ class VerificationService:
         })
 
 
+def claim_for_attestation(method, value):
+    """Returns the claim type code and claim data that were signed for a
+    stored attestation.
+
+    Args:
+        method (AttestationTypes): Attestation method
+        value (str): Attested value stored with the attestation
+    """
+    claim_type = method.name.lower()
+    if method == AttestationTypes.AIRBNB:
+        data = 'airbnbUserId:' + value
+    else:
+        data = '{} verified'.format(claim_type)
+    return CLAIM_TYPES[claim_type], data
+
+
+def sign_claim(eth_address, claim_type, data):
+    """Sign claim data for an identity, unless the request deadline has
+    already passed.
+
+    Args:
+        eth_address (str): Address of ERC725 identity token for claim
+        claim_type (str): Key of the claim type in CLAIM_TYPES
+        data (str): Claim data
+    """
+    deadline.check()
+    return attestations.generate_signature(
+        signing_key, eth_address, CLAIM_TYPES[claim_type], data
+    )
+
+
+def save_attestation(attestation):
+    """Store an attestation. If the same fact was verified before, the stored
+    row gets the new signature and updated_at instead of a duplicate row.
+    Inside a request deadline the commit is limited to the time that is left
+    using a transaction scoped statement timeout. With
+    ATTESTATION_WRITE_BEHIND the attestation is only queued and is stored
+    shortly after by the background writer. Either way the identity's
+    attestations are read from the primary until the replica catches up,
+    and its cached summary is invalidated. With ATTESTATION_SHARD_URLS it is
+    stored on the identity's shard.
+
+    Raises:
+        DeadlineExceededError: The deadline passed before the commit finished
+    """
+    deadline.check()
+    if attestation.created_at is None:
+        attestation.created_at = datetime.datetime.utcnow()
+    replica.record_write(attestation.eth_address)
+    attestation_filter.add(attestation.eth_address)
+    if attestation_writer.enabled:
+        attestation_writer.enqueue(attestation)
+        attestation_summary_cache.invalidate(attestation.eth_address)
+        return
+    row = {column: getattr(attestation, column) for column in COLUMNS}
+    remaining = deadline.remaining()
+    try:
+        with sharding.attestation_transaction(row['eth_address']) as conn:
+            if remaining is not None:
+                conn.execute(
+                    'SET LOCAL statement_timeout = %d' %
+                    max(1, int(remaining * 1000)))
+            store_attestations(conn, [row])
+    except OperationalError as exc:
+        if getattr(exc.orig, 'pgcode', None) == QUERY_CANCELED:
+            raise deadline.exceeded()
+        raise
+    attestation_summary_cache.invalidate(attestation.eth_address)
+
+
 def get_airbnb_verification_code(eth_address, airbnbUserid):
     # take the last 7 bytes of the hash
     hashCode = Web3.sha3(text=eth_address + airbnbUserid)[:7]
@@ -457,6 +573,19 @@ def get_airbnb_verification_code(eth_address, airbnbUserid):
         )
 
 
+def check_failed_attempts(eth_address, value):
+    """Reject a verification attempt without checking the code if the
+    identity has recently submitted too many incorrect codes for the value.
+
+    Raises:
+        ValidationError: Too many incorrect codes were submitted
+    """
+    if failed_attempts.is_blocked(eth_address, value):
+        raise ValidationError(
+            'Too many incorrect verification codes. Please try again later.',
+            'code')
+
+
 def validate_airbnb_user_id(airbnbUserId):
     if not re.compile(r"^\d*$").match(airbnbUserId):
         raise ValidationError(
@@ -0,0 +1,69 @@
+import logging
+
+from sqlalchemy import text
+
+from database import db
+from database.attestation_records import fetch_attestations
+from database.attestation_records import select_attestations
+from database.models import Attestation
+from database.sharding import owner, scatter, shard_engines
+from logic.attestation_writer import COLUMNS, copy_attestations
+
+_COUNT = text('SELECT count(*) FROM attestation')
+
+
+class AttestationShardService:
+
+    def count():
+        """
+        Returns:
+            dict: Number of attestations on each shard, by shard name.
+        """
+        return {name: rows[0][0] for name, rows in scatter(_COUNT)}
+
+    def rebalance(batch_size=1000):
+        """Move attestations stored on another shard than the one their
+        eth_address hashes to, e.g. after a shard was appended.
+
+        Each shard is walked in id order. Rows that belong elsewhere are
+        copied to their shard, keeping any row stored there for the same
+        fact since it was written later, and deleted once the copy is
+        committed. A batch interrupted between the two steps is copied
+        again by the next run, so it is safe to stop and rerun.
+
+        Returns:
+            dict: Number of rows moved by (source, target) shard names.
+        """
+        engines = shard_engines()
+        names = [name for name, _ in engines]
+        table = Attestation.__table__
+        moved = {}
+        for name, engine in engines:
+            last_id = 0
+            while True:
+                records = fetch_attestations(select_attestations(
+                    table.c.id > last_id
+                ).order_by(table.c.id).limit(batch_size), engine)
+                if not records:
+                    break
+                last_id = records[-1].id
+
+                targets = {}
+                for record in records:
+                    target = owner(record.eth_address, names)
+                    if target != name:
+                        targets.setdefault(target, []).append(record)
+                for target, misplaced in sorted(targets.items()):
+                    with db.get_engine(bind=target).begin() as conn:
+                        copy_attestations(conn, [{
+                            column: getattr(record, column)
+                            for column in COLUMNS + ('updated_at',)
+                        } for record in misplaced])
+                    with engine.begin() as conn:
+                        conn.execute(table.delete().where(table.c.id.in_(
+                            [record.id for record in misplaced])))
+                    moved[(name, target)] = \
+                        moved.get((name, target), 0) + len(misplaced)
+                    logging.info("moved %d attestations from %s to %s",
+                                 len(misplaced), name, target)
+        return moved
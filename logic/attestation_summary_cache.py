@@ -0,0 +1,74 @@
+import logging
+import pickle
+import sqlite3
+import time
+
+from config import settings
+from util.addresses import canonical_address
+from util.sqlite_cache import SQLiteCache
+from util.ttl_cache import TTLCache
+
+_INVALIDATED = 'invalidated:'
+# Seconds an invalidation is remembered, longer than any summary query
+_INVALIDATED_TTL = 60
+
+
+class AttestationSummaryCache():
+    """
+    Caches the attestation summary of each identity for
+    ATTESTATION_SUMMARY_CACHE_TTL seconds, up to
+    ATTESTATION_SUMMARY_CACHE_SIZE identities.
+
+    Entries are kept in this process, or with ATTESTATION_SUMMARY_CACHE_FILE
+    in an SQLite database shared by all processes on the host. Storing an
+    attestation invalidates its identity's entry, and a summary that was
+    loaded while its identity was invalidated is not cached. Other processes
+    not sharing the cache only see the change once their entry expires.
+    """
+
+    def __init__(self):
+        if settings.ATTESTATION_SUMMARY_CACHE_FILE:
+            self._entries = SQLiteCache(
+                settings.ATTESTATION_SUMMARY_CACHE_FILE,
+                settings.ATTESTATION_SUMMARY_CACHE_SIZE,
+                settings.ATTESTATION_SUMMARY_CACHE_TTL)
+        else:
+            self._entries = TTLCache(
+                settings.ATTESTATION_SUMMARY_CACHE_SIZE,
+                settings.ATTESTATION_SUMMARY_CACHE_TTL)
+
+    def get_or_load(self, eth_address, load):
+        """Returns the cached summary of eth_address, or the result of
+        load() which is cached."""
+        key = canonical_address(eth_address)
+        try:
+            cached = self._entries.get(key)
+        except sqlite3.Error:
+            logging.exception("failed to read the attestation summary cache")
+            return load()
+        if cached is not None:
+            return pickle.loads(cached)
+
+        started = time.time()
+        summary = load()
+        try:
+            invalidated = self._entries.get(_INVALIDATED + key)
+            if invalidated is None or pickle.loads(invalidated) < started:
+                self._entries.set(key, pickle.dumps(summary))
+        except sqlite3.Error:
+            logging.exception("failed to write the attestation summary cache")
+        return summary
+
+    def invalidate(self, eth_address):
+        key = canonical_address(eth_address)
+        try:
+            # Keeps a load that started before now from caching its result
+            self._entries.set(_INVALIDATED + key, pickle.dumps(time.time()),
+                              _INVALIDATED_TTL)
+            self._entries.pop(key)
+        except sqlite3.Error:
+            logging.exception("failed to invalidate the attestation summary "
+                              "of %s", eth_address)
+
+
+attestation_summary_cache = AttestationSummaryCache()
@@ -0,0 +1,341 @@
+import atexit
+import datetime
+import fcntl
+import hashlib
+import json
+import logging
+import os
+import signal
+import sys
+import threading
+
+from sqlalchemy import and_, func, literal_column, select, text
+
+from config import settings
+from database import db
+from database import sharding
+from database.models import Attestation, AttestationTypes
+from database.models import insert_new_attestations, upsert_attestations
+from logic.attestation_summary_cache import attestation_summary_cache
+
+DATETIME_FORMAT = '%Y-%m-%dT%H:%M:%S.%f'
+
+COLUMNS = ('method', 'eth_address', 'value', 'signature', 'created_at')
+
+# Longest wait in seconds between two attempts at writing a failed batch
+MAX_RETRY_DELAY = 60
+
+
+def _to_json(row):
+    return json.dumps({
+        'method': row['method'].name,
+        'eth_address': row['eth_address'],
+        'value': row['value'],
+        'signature': row['signature'],
+        'created_at': row['created_at'].strftime(DATETIME_FORMAT)
+    })
+
+
+def _from_json(line):
+    row = json.loads(line)
+    row['method'] = AttestationTypes[row['method']]
+    row['created_at'] = datetime.datetime.strptime(
+        row['created_at'], DATETIME_FORMAT)
+    return row
+
+
+def _fact(row):
+    return (row['eth_address'].lower(), row['method'].name,
+            row['value'] or '')
+
+
+def _fact_lock_id(fact):
+    digest = hashlib.blake2b('|'.join(fact).encode('utf-8'),
+                             digest_size=8).digest()
+    return int.from_bytes(digest, 'big', signed=True)
+
+
+def store_attestations(conn, rows):
+    """Store attestation rows (dicts of COLUMNS) on conn, a session or a
+    connection, refreshing the signature and updated_at of facts that are
+    already stored. The caller commits.
+
+    With ATTESTATION_PARTITIONED no unique index spans the partitions, so
+    instead of INSERT ... ON CONFLICT each fact is serialized with a
+    transaction scoped advisory lock, updated if present and inserted
+    otherwise.
+    """
+    # A fact verified twice within one batch would make the upsert update
+    # the same row twice, which Postgres rejects. Keep the last verification.
+    latest = {}
+    for row in rows:
+        latest[_fact(row)] = row
+    if not settings.ATTESTATION_PARTITIONED:
+        conn.execute(upsert_attestations(list(latest.values())))
+        return
+
+    _lock_facts(conn, latest)
+    table = Attestation.__table__
+    missing = []
+    for row in latest.values():
+        result = conn.execute(table.update().where(_same_fact(row)).values(
+            signature=row['signature'], updated_at=row['created_at']))
+        if result.rowcount == 0:
+            missing.append(row)
+    if missing:
+        conn.execute(table.insert().values(missing))
+
+
+def copy_attestations(conn, rows):
+    """Store attestation rows (dicts of COLUMNS and updated_at) on conn as
+    they are, skipping facts that are already stored. The caller commits.
+    """
+    latest = {}
+    for row in rows:
+        latest[_fact(row)] = row
+    if not settings.ATTESTATION_PARTITIONED:
+        conn.execute(insert_new_attestations(list(latest.values())))
+        return
+
+    _lock_facts(conn, latest)
+    table = Attestation.__table__
+    missing = [row for row in latest.values() if conn.execute(
+        select([table.c.id]).where(_same_fact(row)).limit(1)).first() is None]
+    if missing:
+        conn.execute(table.insert().values(missing))
+
+
+def _lock_facts(conn, facts):
+    # Locks are taken in a fixed order so concurrent batches cannot deadlock
+    conn.execute(
+        text('SELECT pg_advisory_xact_lock(id) '
+             'FROM unnest(CAST(:ids AS bigint[])) AS id'),
+        {'ids': sorted(_fact_lock_id(fact) for fact in facts)})
+
+
+def _same_fact(row):
+    table = Attestation.__table__
+    return and_(
+        table.c.eth_address == row['eth_address'],
+        table.c.method == row['method'],
+        func.coalesce(table.c.value, literal_column("''")) ==
+        (row['value'] or ''))
+
+
+class AttestationWriter():
+    """
+    Opt-in write-behind for attestation inserts.
+
+    Attestations are appended to a local spill file, fsynced, and handed to
+    a background thread that writes whatever accumulated every
+    flush_interval seconds using multi-row upserts in a single transaction.
+    The verify request returns without waiting for Postgres.
+
+    Before each flush the spill file is rotated to <spill>.flushing, which
+    is deleted once the batch is committed. Rows left in either file by a
+    crash are written again at the next start, so every attestation is
+    stored at least once. Remaining rows are flushed on shutdown.
+
+    A batch that fails is retried with exponential backoff. After
+    ATTESTATION_FLUSH_MAX_RETRIES attempts its rows are written one at a
+    time, and those that still fail are appended to <spill>.dead so they
+    no longer hold up the attestations queued after them. Appending that
+    file to the spill file before a restart queues them again.
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self._lock = threading.Condition()
+        self._pending = []
+        self._failed = None
+        self._retries = 0
+        self._spill = None
+        self._stopping = False
+        self._thread = None
+
+    def init_app(self, app):
+        if not settings.ATTESTATION_WRITE_BEHIND:
+            return
+        self.app = app
+        self.spill_path = settings.ATTESTATION_SPILL_FILE
+        self.flushing_path = self.spill_path + '.flushing'
+        self.dead_letter_path = self.spill_path + '.dead'
+
+        # Only one process may own the spill file. Others, such as tools
+        # started next to the server, keep inserting inline.
+        self._owner = open(self.spill_path + '.lock', 'w')
+        try:
+            fcntl.flock(self._owner, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            logging.warning("%s is in use by another process, attestations "
+                            "are written inline", self.spill_path)
+            self._owner.close()
+            return
+
+        self._recover()
+        self.enabled = True
+
+        self._thread = threading.Thread(target=self._run,
+                                        name='attestation-writer',
+                                        daemon=True)
+        self._thread.start()
+        atexit.register(self.stop)
+        _exit_on_sigterm()
+
+    def enqueue(self, attestation):
+        """Durably queue an attestation to be inserted by the flusher."""
+        row = {column: getattr(attestation, column) for column in COLUMNS}
+        if row['created_at'] is None:
+            row['created_at'] = datetime.datetime.utcnow()
+        with self._lock:
+            self._spill.write(_to_json(row) + '\n')
+            self._spill.flush()
+            if settings.ATTESTATION_SPILL_FSYNC:
+                os.fsync(self._spill.fileno())
+            self._pending.append(row)
+            # A failed batch is retried after its delay, not when more rows
+            # are queued
+            full = len(self._pending) >= settings.ATTESTATION_FLUSH_BATCH_SIZE
+            if full and self._failed is None:
+                self._lock.notify()
+
+    def stop(self):
+        """Stop the flusher thread after writing all pending attestations."""
+        if self._thread is None:
+            return
+        with self._lock:
+            self._stopping = True
+            self._lock.notify()
+        self._thread.join()
+        self._thread = None
+
+    def _recover(self):
+        rows = []
+        for path in (self.flushing_path, self.spill_path):
+            if os.path.exists(path):
+                with open(path) as f:
+                    # A crash can leave the last line partially written
+                    rows += [_from_json(line) for line in f
+                             if line.endswith('\n')]
+        if rows:
+            logging.info("recovered %d attestations from %s",
+                         len(rows), self.spill_path)
+        tmp_path = self.spill_path + '.tmp'
+        with open(tmp_path, 'w') as f:
+            f.writelines(_to_json(row) + '\n' for row in rows)
+            f.flush()
+            os.fsync(f.fileno())
+        os.rename(tmp_path, self.spill_path)
+        if os.path.exists(self.flushing_path):
+            os.remove(self.flushing_path)
+        self._spill = open(self.spill_path, 'a')
+        self._pending = rows
+
+    def _take_batch(self):
+        with self._lock:
+            if self._failed is not None:
+                # Retry the batch that is still in the flushing file
+                return self._failed
+            if not self._pending:
+                return []
+            rows, self._pending = self._pending, []
+            self._spill.close()
+            os.rename(self.spill_path, self.flushing_path)
+            self._spill = open(self.spill_path, 'a')
+            return rows
+
+    def _store(self, rows):
+        with self.app.app_context():
+            # Shards are committed one by one. If a later one fails the
+            # whole batch is retried, which stores the same facts again.
+            for engine, shard_rows in _by_shard(rows):
+                with engine.begin() as conn:
+                    size = settings.ATTESTATION_FLUSH_BATCH_SIZE
+                    for i in range(0, len(shard_rows), size):
+                        store_attestations(conn, shard_rows[i:i + size])
+
+    def _store_or_dead_letter(self, rows):
+        dead = []
+        for row in rows:
+            try:
+                self._store([row])
+            except Exception:
+                dead.append(row)
+        if not dead:
+            return
+        with open(self.dead_letter_path, 'a') as f:
+            f.writelines(_to_json(row) + '\n' for row in dead)
+            f.flush()
+            os.fsync(f.fileno())
+        logging.error("moved %d attestations that could not be written to "
+                      "%s", len(dead), self.dead_letter_path)
+
+    def _flush(self):
+        rows = self._take_batch()
+        if not rows:
+            return
+        try:
+            self._store(rows)
+        except Exception:
+            self._retries += 1
+            if self._retries < settings.ATTESTATION_FLUSH_MAX_RETRIES:
+                logging.exception("failed to write %d attestations",
+                                  len(rows))
+                self._failed = rows
+                return
+            logging.exception("failed to write %d attestations %d times, "
+                              "writing them one by one", len(rows),
+                              self._retries)
+            self._store_or_dead_letter(rows)
+        self._failed = None
+        self._retries = 0
+        os.remove(self.flushing_path)
+        for eth_address in set(row['eth_address'] for row in rows):
+            attestation_summary_cache.invalidate(eth_address)
+
+    def _delay(self):
+        if self._failed is None:
+            return settings.ATTESTATION_FLUSH_INTERVAL
+        return min(settings.ATTESTATION_FLUSH_INTERVAL * 2 ** self._retries,
+                   MAX_RETRY_DELAY)
+
+    def _run(self):
+        while True:
+            with self._lock:
+                if not self._stopping:
+                    self._lock.wait(self._delay())
+                stopping = self._stopping
+            self._flush()
+            if stopping:
+                # Flush rows queued while the last batch was written
+                self._flush()
+                return
+
+
+def _by_shard(rows):
+    names = sharding.shard_names()
+    if not names:
+        return [(db.engine, rows)]
+    shards = {}
+    for row in rows:
+        shards.setdefault(sharding.owner(row['eth_address'], names),
+                          []).append(row)
+    return [(db.get_engine(bind=name), shard_rows)
+            for name, shard_rows in sorted(shards.items())]
+
+
+def _exit_on_sigterm():
+    # The default SIGTERM handler exits without running atexit hooks, which
+    # would leave queued attestations to the next start
+    previous = signal.getsignal(signal.SIGTERM)
+
+    def handler(signum, frame):
+        if callable(previous):
+            previous(signum, frame)
+        sys.exit(0)
+
+    if threading.current_thread() is threading.main_thread():
+        signal.signal(signal.SIGTERM, handler)
+
+
+attestation_writer = AttestationWriter()
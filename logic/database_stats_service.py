@@ -0,0 +1,24 @@
+from database import db
+from database.instrumentation import pool_stats, pool_status
+from database.replica import replica_engine
+
+
+class DatabaseStatsServiceResponse():
+    def __init__(self, data={}):
+        self.data = data
+
+
+class DatabaseStatsService:
+
+    def get_stats():
+        """
+        Returns the connection pool's state, and the read replica's if there
+        is one, checkout wait times and the number of queries made per
+        request by endpoint, since the process started.
+        """
+        engine = replica_engine()
+        return DatabaseStatsServiceResponse({
+            'pool': pool_status(db.engine),
+            'replica_pool': pool_status(engine) if engine else None,
+            'requests': pool_stats.request_stats()
+        })
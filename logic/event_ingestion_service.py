@@ -0,0 +1,177 @@
+import logging
+
+from config import settings
+from database import db
+from database.models import EventBlock, EventCheckpoint
+from util.contract import ContractHelper
+
+
+def _position(checkpoint):
+    return (checkpoint.block_number, checkpoint.transaction_index,
+            checkpoint.log_index)
+
+
+def _hex(block_hash):
+    if isinstance(block_hash, (bytes, bytearray)):
+        return '0x' + bytes(block_hash).hex()
+    return block_hash.lower()
+
+
+def _lock_checkpoint(name):
+    # Concurrent runs of the same consumer wait for each other's batch
+    checkpoint = EventCheckpoint.query.filter(
+        EventCheckpoint.name == name).with_for_update().one_or_none()
+    if checkpoint is None:
+        checkpoint = EventCheckpoint(name=name, block_number=0)
+        db.session.add(checkpoint)
+    return checkpoint
+
+
+def _remember_block(name, block_number, block_hash):
+    db.session.merge(EventBlock(name=name, block_number=block_number,
+                                block_hash=_hex(block_hash)))
+
+
+def _fork_block(name, web3):
+    """Returns the first block that may have been replaced since the
+    consumer called name saw the chain, or None if none was."""
+    seen = EventBlock.query.filter(EventBlock.name == name).order_by(
+        EventBlock.block_number.desc()).all()
+    fork = None
+    # Each block hash covers its ancestors, so the chain is unchanged up to
+    # the highest block that still has the same hash. Only some blocks are
+    # kept, so any block after it may have been replaced.
+    for block in seen:
+        current = web3.eth.getBlock(block.block_number)
+        if current is not None and _hex(current['hash']) == block.block_hash:
+            return None if fork is None else block.block_number + 1
+        fork = block.block_number
+    if fork is not None:
+        logging.error("%s saw a reorg deeper than the %d blocks it tracks",
+                      name, len(seen))
+    return fork
+
+
+def _roll_back(name, checkpoint, fork, rollback):
+    logging.warning("reorg at block %d, rolling back events of %s",
+                    fork, name)
+    rollback(fork)
+    if checkpoint.block_number >= fork:
+        checkpoint.block_number = fork
+        checkpoint.transaction_index = None
+        checkpoint.log_index = None
+    EventBlock.query.filter(EventBlock.name == name,
+                            EventBlock.block_number >= fork).delete()
+
+
+class EventIngestionService:
+
+    def run(name, event_names, callback, contract_helper=None,
+            batch_size=100, block_to='latest', rollback=None,
+            confirmations=None):
+        """Deliver the named events to callback from where the consumer
+        called name stopped, up to block_to.
+
+        The checkpoint of the consumer advances with every event and is
+        committed after every batch_size events, in the same transaction as
+        what callback did through db.session. If callback raises, that
+        transaction is rolled back and the next run delivers its events
+        again, so each event takes effect once. Side effects outside the
+        database, such as RPC calls, may be repeated.
+
+        An event is final once confirmations blocks, EVENT_CONFIRMATIONS by
+        default, were mined on top of its block. Without rollback only final
+        events are delivered. With rollback, events are delivered as soon as
+        they are mined, and the hashes of the unconfirmed blocks with events,
+        of the head and of the last final block are kept. When a run finds
+        that one of these blocks was replaced by a reorg, it calls
+        rollback(block_number) with the block after the highest kept one
+        that is unchanged, in the same transaction as the first batch, to
+        undo what callback did for the events of that block and later, then
+        delivers the events from that block again.
+
+        A run stops without error if another run of the same consumer moved
+        the checkpoint in the meantime.
+
+        Returns:
+            int: Number of events delivered and committed.
+        """
+        contract_helper = contract_helper or ContractHelper()
+        web3 = contract_helper.web3
+        if confirmations is None:
+            confirmations = settings.EVENT_CONFIRMATIONS
+        if block_to == 'latest':
+            block_to = web3.eth.blockNumber
+        track = rollback is not None and confirmations > 0
+        if rollback is None:
+            block_to -= confirmations
+        final = block_to - confirmations
+
+        checkpoint = _lock_checkpoint(name)
+        if track:
+            fork = _fork_block(name, web3)
+            if fork is not None:
+                _roll_back(name, checkpoint, fork, rollback)
+            # Taken before the events are fetched, so a reorg while they
+            # are is seen by the next run. The hash of the last final block
+            # is kept too, as the fork is found from the highest kept block
+            # that is unchanged.
+            head = web3.eth.getBlock(block_to)
+            anchor = web3.eth.getBlock(final) if final >= 0 else None
+
+        events = contract_helper.iter_events(
+            event_names, checkpoint.block_number, block_to,
+            checkpoint.log_index, checkpoint.transaction_index)
+        delivered = 0
+        batch = 0
+        try:
+            for event in events:
+                callback(event)
+                checkpoint.block_number = event['blockNumber']
+                checkpoint.transaction_index = event['transactionIndex']
+                checkpoint.log_index = event['logIndex']
+                if track and event['blockNumber'] > final:
+                    _remember_block(name, event['blockNumber'],
+                                    event['blockHash'])
+                batch += 1
+                if batch < batch_size:
+                    continue
+
+                position = _position(checkpoint)
+                db.session.commit()
+                delivered += batch
+                batch = 0
+                checkpoint = _lock_checkpoint(name)
+                if _position(checkpoint) != position:
+                    logging.warning("events of %s are delivered by another "
+                                    "run, stopping", name)
+                    db.session.commit()
+                    return delivered
+        except Exception:
+            db.session.rollback()
+            raise
+
+        if checkpoint.block_number <= block_to:
+            checkpoint.block_number = block_to + 1
+            checkpoint.transaction_index = None
+            checkpoint.log_index = None
+        if track:
+            _remember_block(name, block_to, head['hash'])
+            if anchor is not None:
+                _remember_block(name, final, anchor['hash'])
+            EventBlock.query.filter(EventBlock.name == name,
+                                    EventBlock.block_number < final).delete()
+        db.session.commit()
+        delivered += batch
+        logging.info("delivered %d events to %s up to block %d",
+                     delivered, name, block_to)
+        return delivered
+
+    def reset(name, block_number=0):
+        """Make the consumer called name start over from block_number."""
+        checkpoint = _lock_checkpoint(name)
+        checkpoint.block_number = block_number
+        checkpoint.transaction_index = None
+        checkpoint.log_index = None
+        EventBlock.query.filter(EventBlock.name == name).delete()
+        db.session.commit()
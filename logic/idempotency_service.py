@@ -0,0 +1,96 @@
+import datetime
+import hashlib
+import json
+
+from sqlalchemy import select
+from sqlalchemy.dialects.postgresql import insert
+
+from config import settings
+from database import db
+from database.models import IdempotencyKey
+from logic.service_utils import IdempotencyKeyReusedError
+from util.encoder import JSONEncoder
+
+
+def _digest(*parts):
+    sha = hashlib.sha256()
+    for part in parts:
+        sha.update(part.encode('utf-8'))
+        sha.update(b'\0')
+    return sha.digest()
+
+
+def _fingerprint(payload):
+    return _digest(json.dumps(payload, sort_keys=True, cls=JSONEncoder))
+
+
+class IdempotencyService:
+
+    def lookup(key, scope, payload):
+        """Find the stored response for an idempotency key.
+
+        Args:
+            key (str): Client supplied Idempotency-Key header.
+            scope (str): Route the key was sent to.
+            payload (dict): Request payload.
+
+        Returns:
+            (dict, int) tuple of response body and status code, or None if
+            no unexpired response is stored for the key.
+
+        Raises:
+            IdempotencyKeyReusedError: The key was used for another payload.
+        """
+        stored = IdempotencyKey.query.filter(
+            IdempotencyKey.key == _digest(scope, key),
+            IdempotencyKey.expires_at > datetime.datetime.utcnow()
+        ).first()
+        if stored is None:
+            return None
+        if stored.request_hash != _fingerprint(payload):
+            raise IdempotencyKeyReusedError(
+                'Idempotency-Key was already used for a different request.')
+        return json.loads(stored.response), stored.status_code
+
+    def store(key, scope, payload, response, status_code):
+        """Persist a response so retries with the same key replay it.
+
+        An expired row for the same key is overwritten in the same statement.
+        """
+        now = datetime.datetime.utcnow()
+        table = IdempotencyKey.__table__
+        values = {
+            'key': _digest(scope, key),
+            'request_hash': _fingerprint(payload),
+            'status_code': status_code,
+            'response': json.dumps(response, cls=JSONEncoder),
+            'expires_at': now + datetime.timedelta(
+                seconds=settings.IDEMPOTENCY_KEY_TTL)
+        }
+        stmt = insert(table).values(**values)
+        stmt = stmt.on_conflict_do_update(
+            index_elements=[table.c.key],
+            set_=values,
+            where=table.c.expires_at <= now)
+        db.session.execute(stmt)
+        db.session.commit()
+
+    def purge_expired(batch_size=1000):
+        """Delete expired keys in batches of at most batch_size rows, walking
+        the expires_at index so each batch stays cheap.
+
+        Returns:
+            int: Number of keys deleted.
+        """
+        table = IdempotencyKey.__table__
+        deleted = 0
+        while True:
+            expired = select([table.c.key]).where(
+                table.c.expires_at <= datetime.datetime.utcnow()
+            ).order_by(table.c.expires_at).limit(batch_size)
+            result = db.session.execute(
+                table.delete().where(table.c.key.in_(expired)))
+            db.session.commit()
+            deleted += result.rowcount
+            if result.rowcount < batch_size:
+                return deleted
@@ -18,6 +18,11 @@ class AirbnbVerificationError(ServiceError):
     pass
 
 
+class DeadlineExceededError(ServiceError):
+    def __init__(self, message):
+        ServiceError.__init__(self, message, status_code=504)
+
+
 class EmailVerificationError(ServiceError):
     pass
 
@@ -26,6 +31,10 @@ class FacebookVerificationError(ServiceError):
     pass
 
 
+class IdempotencyKeyReusedError(ServiceError):
+    pass
+
+
 class PhoneVerificationError(ServiceError):
     pass
 
@@ -34,5 +43,13 @@ class TwitterVerificationError(ServiceError):
     pass
 
 
+class ServiceUnavailableError(ServiceError):
+    """Raised when a request is shed under load."""
+
+    def __init__(self, message, retry_after=None):
+        ServiceError.__init__(self, message, status_code=503)
+        self.retry_after = retry_after
+
+
 def req_error(code=None, path=None, message=None):
     return ServiceError({'code': code, 'message': message, 'path': path})
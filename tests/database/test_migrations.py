@@ -0,0 +1,88 @@
+import flask_migrate
+import mock
+import pytest
+from sqlalchemy import create_engine, text
+from sqlalchemy.engine.url import make_url
+
+from config import settings
+
+SCRATCH_DATABASE = 'origin_migrations_test'
+
+INSERT_ATTESTATION = text("""
+INSERT INTO attestation (method, eth_address, value, signature, created_at)
+VALUES ('AIRBNB', :eth_address, '123456', :signature,
+        timestamp '2018-10-01' + :days * interval '1 day')
+RETURNING id
+""")
+
+
+def execute_autocommit(db, statement):
+    with db.engine.connect() as conn:
+        conn.execution_options(isolation_level='AUTOCOMMIT').execute(
+            statement)
+
+
+@pytest.fixture
+def scratch_engine(app, db):
+    """Engine of an empty database that the app's migrations run on."""
+    execute_autocommit(db, 'DROP DATABASE IF EXISTS ' + SCRATCH_DATABASE)
+    execute_autocommit(db, 'CREATE DATABASE ' + SCRATCH_DATABASE)
+    url = make_url(str(db.engine.url))
+    url.database = SCRATCH_DATABASE
+    engine = create_engine(url)
+    flask_migrate.Migrate(app, db, directory='database/migrations')
+    with mock.patch.dict(app.config, {'SQLALCHEMY_DATABASE_URI': str(url)}):
+        yield engine
+    del app.extensions['migrate']
+    engine.dispose()
+    execute_autocommit(db, 'DROP DATABASE ' + SCRATCH_DATABASE)
+
+
+def test_unique_attestations_merges_existing_duplicates(scratch_engine):
+    flask_migrate.upgrade(revision='5e8d2f3a6b10')
+    eth_address = b'\x01' * 20
+
+    def insert(signature, days, eth_address=eth_address):
+        return scratch_engine.execute(
+            INSERT_ATTESTATION, eth_address=eth_address,
+            signature=signature * 65, days=days).scalar()
+
+    first = insert(b'\x01', 0)
+    insert(b'\x02', 1)
+    other = insert(b'\x03', 2, eth_address=b'\x02' * 20)
+    insert(b'\x04', 3)
+
+    flask_migrate.upgrade(revision='7d4c1b9e2f85')
+
+    rows = scratch_engine.execute(
+        'SELECT id, signature, updated_at::date FROM attestation '
+        'ORDER BY id').fetchall()
+    assert [(id, bytes(signature)) for id, signature, _ in rows] == [
+        (first, b'\x04' * 65), (other, b'\x03' * 65)]
+    assert str(rows[0][2]) == '2018-10-04'
+    assert rows[1][2] is None
+    assert scratch_engine.execute(
+        "SELECT indisvalid FROM pg_index WHERE indexrelid = "
+        "'uq_attestation_eth_address_method_value'::regclass").scalar()
+
+
+def test_main_head_leaves_attestation_unpartitioned(scratch_engine):
+    flask_migrate.upgrade(revision='main@head')
+
+    assert scratch_engine.execute(
+        "SELECT relkind FROM pg_class WHERE relname = 'attestation'"
+    ).scalar() == 'r'
+    assert scratch_engine.execute(
+        "SELECT to_regclass('rollup_watermark')").scalar() is not None
+
+
+def test_partitioning_refuses_to_run_without_flag(scratch_engine):
+    flask_migrate.upgrade(revision='main@head')
+
+    with mock.patch.object(settings, 'ATTESTATION_PARTITIONED', False):
+        with pytest.raises(RuntimeError):
+            flask_migrate.upgrade(revision='partitioning@head')
+
+    assert scratch_engine.execute(
+        "SELECT relkind FROM pg_class WHERE relname = 'attestation'"
+    ).scalar() == 'r'
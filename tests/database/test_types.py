@@ -0,0 +1,35 @@
+from database.types import EthAddress, HexBytes
+from tests.helpers.eth_utils import sample_eth_address, str_eth
+
+SIGNATURE = '0x' + 'ab' * 65
+
+
+def round_trip(column_type, value):
+    stored = column_type.process_bind_param(value, None)
+    return stored, column_type.process_result_value(stored, None)
+
+
+def test_hex_bytes_round_trip():
+    stored, loaded = round_trip(HexBytes(), '0X' + 'AB' * 65)
+    assert stored == b'\xab' * 65
+    assert loaded == SIGNATURE
+
+    assert round_trip(HexBytes(), 'ab' * 65) == (b'\xab' * 65, SIGNATURE)
+    assert round_trip(HexBytes(), b'\xab' * 65) == (b'\xab' * 65, SIGNATURE)
+    assert round_trip(HexBytes(), memoryview(b'\xab' * 65)) == (
+        b'\xab' * 65, SIGNATURE)
+    assert round_trip(HexBytes(), None) == (None, None)
+
+
+def test_eth_address_is_returned_checksummed():
+    eth_address = str_eth(sample_eth_address)
+
+    stored, loaded = round_trip(EthAddress(), eth_address.lower())
+
+    assert len(stored) == 20
+    assert loaded == eth_address
+    assert round_trip(EthAddress(), eth_address.upper().replace('0X', '0x')) \
+        == (stored, eth_address)
+    assert round_trip(EthAddress(), memoryview(stored)) == (
+        stored, eth_address)
+    assert round_trip(EthAddress(), None) == (None, None)
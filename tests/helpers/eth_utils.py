@@ -1,3 +1,4 @@
+import mock
 from web3 import Web3
 
 sample_eth_address = 562046206989085878832492993516240920558397288279
@@ -5,3 +6,28 @@ sample_eth_address = 562046206989085878832492993516240920558397288279
 
 def str_eth(numeric_eth_address):
     return Web3.toChecksumAddress(hex(int(numeric_eth_address)))
+
+
+def sample_log(block, transaction, log):
+    return {'blockNumber': block, 'transactionIndex': transaction,
+            'logIndex': log}
+
+
+def fake_web3(events, max_blocks=None):
+    """Web3 mock whose eth_getLogs returns the events in the requested
+    range, and refuses ranges longer than max_blocks like a node limiting
+    the number of logs returned."""
+    web3 = mock.Mock()
+    web3.sha3.return_value = b'\x01' * 32
+    web3.eth.blockNumber = max(event['blockNumber'] for event in events)
+
+    def get_logs(params):
+        start, end = params['fromBlock'], params['toBlock']
+        if max_blocks is not None and end - start + 1 > max_blocks:
+            raise ValueError({'code': -32005,
+                              'message': 'query returned more than 3 results'})
+        return [event for event in events
+                if start <= event['blockNumber'] <= end]
+
+    web3.eth.getLogs.side_effect = get_logs
+    return web3
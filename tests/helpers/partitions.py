@@ -0,0 +1,29 @@
+from database import db
+
+
+def partition_attestation_table(cutover, following):
+    """Partition the attestation table like migration a3f7c2d9e614, within
+    the test's transaction: existing rows become attestation_legacy, up to
+    cutover, followed by a monthly partition up to following and the
+    default partition."""
+    db.session.execute('ALTER TABLE attestation RENAME TO attestation_legacy')
+    db.session.execute("""
+        CREATE TABLE attestation (
+            id integer NOT NULL DEFAULT nextval('attestation_id_seq'),
+            method attestationtypes,
+            eth_address bytea,
+            value varchar,
+            signature bytea,
+            created_at timestamp without time zone,
+            updated_at timestamp without time zone
+        ) PARTITION BY RANGE (created_at)
+    """)
+    db.session.execute(
+        "ALTER TABLE attestation ATTACH PARTITION attestation_legacy "
+        "FOR VALUES FROM (MINVALUE) TO ('{}')".format(cutover))
+    db.session.execute(
+        "CREATE TABLE attestation_y{:%Y}m{:%m} PARTITION OF attestation "
+        "(PRIMARY KEY (id)) FOR VALUES FROM ('{}') TO ('{}')".format(
+            cutover, cutover, cutover, following))
+    db.session.execute('CREATE TABLE attestation_default PARTITION OF '
+                       'attestation (PRIMARY KEY (id)) DEFAULT')
@@ -1,32 +1,44 @@
 import datetime
 import mock
 import pytest
-from urllib.request import HTTPError
+import socket
+from urllib.request import HTTPError, URLError
 
 from marshmallow.exceptions import ValidationError
 import responses
 from werkzeug.security import generate_password_hash, check_password_hash
 
+from config import settings
 from database.models import AttestationTypes
 from database.models import Attestation
 from logic.attestation_service import (
     VerificationService,
     VerificationServiceResponse
 )
-from logic.attestation_service import CLAIM_TYPES
+from logic.attestation_service import CLAIM_TYPES, failed_attempts
 from logic.service_utils import (
     AirbnbVerificationError,
+    DeadlineExceededError,
     EmailVerificationError,
     FacebookVerificationError,
     PhoneVerificationError,
     TwitterVerificationError,
 )
 from tests.helpers.eth_utils import sample_eth_address, str_eth
+from tests.helpers.partitions import partition_attestation_table
 
 
 SIGNATURE_LENGTH = 132
 
 
+@pytest.fixture(autouse=True)
+def reset_failed_attempts():
+    # The counter is module level, so incorrect codes sent by one test would
+    # count towards the next one's, even if the test failed
+    yield
+    failed_attempts.clear()
+
+
 @responses.activate
 def test_send_phone_verification_success():
     responses.add(
@@ -145,6 +157,38 @@ def test_verify_phone_valid_code():
     assert(attestations[0].value) == "1 12341234"
 
 
+@pytest.mark.parametrize('partitioned', [False, True])
+@responses.activate
+def test_verify_phone_again_updates_attestation(partitioned):
+    responses.add(
+        responses.GET,
+        'https://api.authy.com/protected/json/phones/verification/check',
+        json={
+            'message': 'Verification code is correct.',
+            'success': True
+        }
+    )
+
+    args = {
+        'eth_address': str_eth(sample_eth_address),
+        'country_calling_code': '1',
+        'phone': '12341234',
+        'code': '123456'
+    }
+    if partitioned:
+        month = datetime.datetime.utcnow().replace(
+            day=1, hour=0, minute=0, second=0, microsecond=0)
+        following = (month + datetime.timedelta(days=32)).replace(day=1)
+        partition_attestation_table(month, following)
+    with mock.patch.object(settings, 'ATTESTATION_PARTITIONED', partitioned):
+        VerificationService.verify_phone(**args)
+        VerificationService.verify_phone(**args)
+
+    attestations = Attestation.query.all()
+    assert(len(attestations)) == 1
+    assert(attestations[0].updated_at) is not None
+
+
 @responses.activate
 def test_verify_phone_expired_code():
     responses.add(
@@ -191,6 +235,36 @@ def test_verify_phone_invalid_code():
     assert(validation_err.value.field_names[0]) == 'code'
 
 
+@responses.activate
+def test_verify_phone_too_many_incorrect_codes():
+    responses.add(
+        responses.GET,
+        'https://api.authy.com/protected/json/phones/verification/check',
+        json={'error_code': '60022'},
+        status=401
+    )
+
+    args = {
+        'eth_address': str_eth(sample_eth_address),
+        'country_calling_code': '1',
+        'phone': '55555555',
+        'code': 'garbage'
+    }
+    for _ in range(settings.VERIFY_FAILURE_THRESHOLD):
+        with pytest.raises(ValidationError):
+            VerificationService.verify_phone(**args)
+    assert len(responses.calls) == settings.VERIFY_FAILURE_THRESHOLD
+
+    # Further attempts are rejected without calling Twilio
+    with pytest.raises(ValidationError) as validation_err:
+        VerificationService.verify_phone(**args)
+
+    assert(validation_err.value.messages[0]) == \
+        'Too many incorrect verification codes. Please try again later.'
+    assert(validation_err.value.field_names[0]) == 'code'
+    assert len(responses.calls) == settings.VERIFY_FAILURE_THRESHOLD
+
+
 @mock.patch('logic.attestation_service._send_email_using_sendgrid')
 @mock.patch('logic.attestation_service.datetime')
 def test_send_email_verification(
@@ -656,3 +730,13 @@ def test_verify_airbnb_verification_code_internal_server_error(
         )
 
     assert str(service_err.value) == "Can not fetch user's Airbnb profile."
+
+
+@mock.patch('logic.attestation_service.urlopen',
+            side_effect=URLError(socket.timeout('timed out')))
+def test_verify_airbnb_connect_timeout(mock_urllib_request):
+    with pytest.raises(DeadlineExceededError):
+        VerificationService.verify_airbnb(
+            '0x112234455C3a32FD11230C42E7Bccd4A84e02010',
+            "123"
+        )
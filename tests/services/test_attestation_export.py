@@ -0,0 +1,87 @@
+import csv
+import datetime
+import io
+import json
+
+import mock
+import pytest
+
+from database.attestation_records import AttestationRecord, COLUMNS
+from database.attestation_records import iter_attestations
+from database.models import AttestationTypes
+from logic.attestation_export_service import AttestationExportService
+from tests.helpers.eth_utils import sample_eth_address, str_eth
+
+CREATED_AT = datetime.datetime(2018, 10, 1, 12, 30)
+
+
+def record(id, value):
+    return AttestationRecord(id, AttestationTypes.AIRBNB,
+                             str_eth(sample_eth_address), value,
+                             '0x' + '00' * 65, CREATED_AT, None)
+
+
+BATCHES = [
+    [record(1, '123'), record(2, 'has "quotes", commas\nand a newline')],
+    [record(3, None)]
+]
+
+
+@pytest.yield_fixture
+def iter_batches():
+    engine = mock.MagicMock()
+    with mock.patch('logic.attestation_export_service.shard_engines',
+                    return_value=[]), \
+            mock.patch('logic.attestation_export_service.replica_engine',
+                       return_value=engine), \
+            mock.patch('logic.attestation_export_service.iter_attestations',
+                       return_value=iter(BATCHES)) as iter_attestations:
+        yield iter_attestations
+
+
+def test_export_ndjson(iter_batches):
+    chunks = list(AttestationExportService.export('ndjson', batch_size=2))
+
+    # One chunk per batch read from the cursor
+    assert len(chunks) == 2
+    assert iter_batches.call_args[0][2] == 2
+    rows = [json.loads(line) for line in ''.join(chunks).splitlines()]
+    assert [row['id'] for row in rows] == [1, 2, 3]
+    assert rows[1] == {
+        'id': 2,
+        'method': 'airbnb',
+        'eth_address': str_eth(sample_eth_address),
+        'value': 'has "quotes", commas\nand a newline',
+        'signature': '0x' + '00' * 65,
+        'created_at': '2018-10-01T12:30:00',
+        'updated_at': None
+    }
+
+
+def test_export_csv(iter_batches):
+    chunks = list(AttestationExportService.export('csv', batch_size=2))
+
+    assert chunks[0] == ','.join(COLUMNS) + '\r\n'
+    assert len(chunks) == 3
+    rows = list(csv.DictReader(io.StringIO(''.join(chunks))))
+    assert [row['id'] for row in rows] == ['1', '2', '3']
+    assert rows[1]['value'] == 'has "quotes", commas\nand a newline'
+    assert rows[1]['method'] == 'airbnb'
+    assert rows[1]['created_at'] == '2018-10-01T12:30:00'
+    assert rows[2]['value'] == ''
+    assert rows[2]['updated_at'] == ''
+
+
+def test_iter_attestations_streams_batches():
+    conn = mock.Mock()
+    result = conn.execution_options.return_value.execute.return_value
+    rows = [(id, AttestationTypes.PHONE, '0x00', None, '0x00', CREATED_AT,
+             None) for id in range(5)]
+    result.fetchmany.side_effect = [rows[:2], rows[2:4], rows[4:], []]
+
+    batches = list(iter_attestations(mock.sentinel.query, conn, 2))
+
+    conn.execution_options.assert_called_once_with(stream_results=True)
+    result.fetchmany.assert_called_with(2)
+    assert [[record.id for record in batch] for batch in batches] == [
+        [0, 1], [2, 3], [4]]
@@ -0,0 +1,159 @@
+import datetime
+
+import mock
+import pytest
+from marshmallow.exceptions import ValidationError
+
+from database import db
+from database import replica
+from database.models import Attestation, AttestationTypes
+from logic.attestation_filter import attestation_filter
+from logic.attestation_lookup_service import AttestationLookupService
+from logic.attestation_service import save_attestation
+from logic.attestation_summary_cache import attestation_summary_cache
+from tests.helpers.eth_utils import sample_eth_address, str_eth
+from util.bloom import BloomFilter
+
+
+def create_attestations(eth_address, methods):
+    created_at = datetime.datetime(2018, 10, 1)
+    for i, method in enumerate(methods):
+        db.session.add(Attestation(
+            method=method,
+            eth_address=eth_address,
+            value='12345' + str(i) if method == AttestationTypes.AIRBNB
+            else None,
+            signature='0x' + '00' * 65,
+            created_at=created_at + datetime.timedelta(minutes=i)
+        ))
+    db.session.commit()
+
+
+def test_list_attestations_paginates_newest_first():
+    eth_address = str_eth(sample_eth_address)
+    create_attestations(eth_address, [
+        AttestationTypes.PHONE,
+        AttestationTypes.EMAIL,
+        AttestationTypes.AIRBNB,
+        AttestationTypes.FACEBOOK,
+        AttestationTypes.TWITTER
+    ])
+    create_attestations('0x112234455C3a32FD11230C42E7Bccd4A84e02010',
+                        [AttestationTypes.PHONE])
+
+    methods = []
+    cursor = None
+    pages = 0
+    while True:
+        resp = AttestationLookupService.list_attestations(
+            eth_address, limit=2, cursor=cursor)
+        methods += [a['method'] for a in resp.data['attestations']]
+        cursor = resp.data['next_cursor']
+        pages += 1
+        if cursor is None:
+            break
+
+    assert pages == 3
+    assert methods == ['twitter', 'facebook', 'airbnb', 'email', 'phone']
+
+
+def test_list_attestations_by_method():
+    eth_address = str_eth(sample_eth_address)
+    create_attestations(eth_address, [
+        AttestationTypes.AIRBNB,
+        AttestationTypes.PHONE,
+        AttestationTypes.AIRBNB
+    ])
+
+    resp = AttestationLookupService.list_attestations(
+        eth_address, method='airbnb')
+
+    attestations = resp.data['attestations']
+    assert len(attestations) == 2
+    assert attestations[0]['data'] == 'airbnbUserId:123452'
+    assert attestations[0]['claim_type'] == 5
+    assert resp.data['next_cursor'] is None
+
+
+def test_list_attestations_invalid_cursor():
+    with pytest.raises(ValidationError) as validation_err:
+        AttestationLookupService.list_attestations(
+            str_eth(sample_eth_address), cursor='garbage')
+
+    assert validation_err.value.field_names[0] == 'cursor'
+
+
+def test_list_attestations_reads_recent_writes_from_primary():
+    eth_address = str_eth(sample_eth_address)
+    create_attestations(eth_address, [AttestationTypes.PHONE])
+    engine = mock.Mock()
+    engine.execute.return_value = []
+
+    with mock.patch('database.replica.replica_engine', return_value=engine):
+        resp = AttestationLookupService.list_attestations(eth_address)
+        assert resp.data['attestations'] == []
+        assert engine.execute.call_count == 1
+
+        replica.record_write(eth_address)
+        resp = AttestationLookupService.list_attestations(eth_address)
+        assert len(resp.data['attestations']) == 1
+        assert engine.execute.call_count == 1
+    replica.recent_writes.clear()
+
+
+def test_has_attestations():
+    eth_address = str_eth(sample_eth_address)
+    create_attestations(eth_address, [AttestationTypes.PHONE])
+
+    assert AttestationLookupService.has_attestations(
+        eth_address).data['exists']
+    assert not AttestationLookupService.has_attestations(
+        '0x112234455C3a32FD11230C42E7Bccd4A84e02010').data['exists']
+
+
+def test_has_attestations_negatives_come_from_filter():
+    eth_address = str_eth(sample_eth_address)
+    # Stored without the filter seeing it, so only a query would find it
+    create_attestations(eth_address, [AttestationTypes.PHONE])
+
+    with mock.patch.multiple(attestation_filter, enabled=True, _ready=True,
+                             _filter=BloomFilter(100, 0.01)):
+        assert not AttestationLookupService.has_attestations(
+            eth_address).data['exists']
+        attestation_filter.add(eth_address)
+        assert AttestationLookupService.has_attestations(
+            eth_address).data['exists']
+        # Also without the 0x prefix, which Web3.isAddress accepts
+        assert AttestationLookupService.has_attestations(
+            eth_address[2:].lower()).data['exists']
+
+
+def test_get_summary_is_cached_until_an_attestation_is_stored():
+    eth_address = str_eth(sample_eth_address)
+    attestation_summary_cache.invalidate(eth_address)
+    create_attestations(eth_address, [
+        AttestationTypes.AIRBNB,
+        AttestationTypes.PHONE,
+        AttestationTypes.AIRBNB
+    ])
+
+    summary = AttestationLookupService.get_summary(eth_address).data
+    assert summary['methods'] == ['airbnb', 'phone']
+    assert summary['attestations'][0]['data'] == 'airbnbUserId:123452'
+
+    # Not seen until the cache is invalidated by storing an attestation
+    create_attestations(eth_address, [AttestationTypes.TWITTER])
+    assert AttestationLookupService.get_summary(
+        eth_address).data['methods'] == ['airbnb', 'phone']
+
+    save_attestation(Attestation(
+        method=AttestationTypes.EMAIL,
+        eth_address=eth_address,
+        value=None,
+        signature='0x' + '00' * 65,
+        created_at=datetime.datetime(2018, 10, 2)
+    ))
+    assert AttestationLookupService.get_summary(
+        eth_address).data['methods'] == ['email', 'airbnb', 'phone',
+                                         'twitter']
+    attestation_summary_cache.invalidate(eth_address)
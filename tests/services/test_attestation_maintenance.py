@@ -0,0 +1,117 @@
+import csv
+import datetime
+import gzip
+import os
+
+import pytest
+
+from database import db
+from database.models import Attestation, AttestationTypes
+from logic.attestation_maintenance_service import (
+    AttestationMaintenanceService,
+    _add_months,
+    _month,
+    _partition_name
+)
+from tests.helpers.eth_utils import sample_eth_address, str_eth
+from tests.helpers.partitions import partition_attestation_table
+
+OTHER_ETH_ADDRESS = '0x112234455C3a32FD11230C42E7Bccd4A84e02010'
+DAY = datetime.datetime(2018, 10, 1)
+
+
+def create_attestation(eth_address, signature, days, day=DAY):
+    attestation = Attestation(
+        method=AttestationTypes.AIRBNB,
+        eth_address=eth_address,
+        value='123456',
+        signature='0x' + signature * 65,
+        created_at=day + datetime.timedelta(days=days))
+    db.session.add(attestation)
+    db.session.commit()
+    return attestation
+
+
+def test_deduplicate_keeps_first_row_with_newest_signature():
+    # Duplicates predate the unique index, dropped for this test only
+    db.session.execute('DROP INDEX uq_attestation_eth_address_method_value')
+    eth_address = str_eth(sample_eth_address)
+    first = create_attestation(eth_address, '01', 0)
+    create_attestation(eth_address, '02', 1)
+    other = create_attestation(OTHER_ETH_ADDRESS, '03', 2)
+    create_attestation(eth_address, '04', 3)
+    ids = (first.id, other.id)
+    assert AttestationMaintenanceService.has_duplicates()
+
+    # Windows of two ids, so the fact's rows span both
+    assert AttestationMaintenanceService.deduplicate(batch_size=2) == 2
+
+    db.session.expire_all()
+    rows = Attestation.query.order_by(Attestation.id).all()
+    assert [row.id for row in rows] == list(ids)
+    assert rows[0].signature == '0x' + '04' * 65
+    assert rows[0].created_at == DAY
+    assert rows[0].updated_at == DAY + datetime.timedelta(days=3)
+    assert rows[1].signature == '0x' + '03' * 65
+    assert rows[1].updated_at is None
+    assert not AttestationMaintenanceService.has_duplicates()
+
+
+def partition_until_this_month():
+    # Legacy rows before last month, then a partition for last month
+    this_month = _month(datetime.datetime.utcnow())
+    partition_attestation_table(_add_months(this_month, -1), this_month)
+    return this_month
+
+
+def partition_names():
+    return sorted(name for name, in db.session.execute(
+        "SELECT child.relname FROM pg_inherits "
+        "JOIN pg_class AS child ON child.oid = pg_inherits.inhrelid "
+        "WHERE pg_inherits.inhparent = 'attestation'::regclass"))
+
+
+def test_create_partitions_requires_partitioned_table():
+    with pytest.raises(ValueError):
+        AttestationMaintenanceService.create_partitions()
+
+
+def test_create_partitions_continues_from_last_partition():
+    this_month = partition_until_this_month()
+
+    created = AttestationMaintenanceService.create_partitions(
+        months_ahead=2)
+
+    assert created == [_partition_name(_add_months(this_month, months))
+                       for months in range(3)]
+    assert partition_names() == sorted(
+        ['attestation_default', 'attestation_legacy',
+         _partition_name(_add_months(this_month, -1))] + created)
+    assert AttestationMaintenanceService.create_partitions(
+        months_ahead=2) == []
+
+
+def test_archive_partitions_writes_and_drops_old_partitions(tmpdir):
+    this_month = partition_until_this_month()
+    eth_address = str_eth(sample_eth_address)
+    legacy = create_attestation(eth_address, '01', 0,
+                                day=_add_months(this_month, -3))
+    create_attestation(OTHER_ETH_ADDRESS, '02', 0,
+                       day=_add_months(this_month, -1))
+    create_attestation(OTHER_ETH_ADDRESS, '03', 0, day=this_month)
+
+    archived = AttestationMaintenanceService.archive_partitions(
+        keep_months=1, directory=str(tmpdir))
+
+    path = os.path.join(str(tmpdir), 'attestation_legacy.csv.gz')
+    assert archived == [path]
+    with gzip.open(path, 'rt') as f:
+        rows = list(csv.DictReader(f))
+    assert [(int(row['id']), row['method'], row['value']) for row in rows] \
+        == [(legacy.id, 'AIRBNB', '123456')]
+    assert rows[0]['eth_address'] == '\\x' + eth_address[2:].lower()
+    assert 'attestation_legacy' not in partition_names()
+    assert db.session.execute(
+        "SELECT to_regclass('attestation_legacy')").scalar() is None
+    db.session.expire_all()
+    assert Attestation.query.count() == 2
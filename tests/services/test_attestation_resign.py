@@ -0,0 +1,93 @@
+import datetime
+
+import mock
+import pytest
+from eth_account import Account
+from eth_account.messages import defunct_hash_message
+from web3 import Web3
+
+from database import db
+from database.models import Attestation, AttestationTypes, ResignCheckpoint
+from logic import attestation_resign_service
+from logic.attestation_resign_service import (
+    SIGN,
+    AttestationResignService,
+    _sign_batch
+)
+from logic.attestation_service import claim_for_attestation
+from tests.helpers.eth_utils import sample_eth_address, str_eth
+
+PRIVATE_KEY = '0x' + '11' * 32
+OTHER_PRIVATE_KEY = '0x' + '22' * 32
+
+
+def test_sign_batch_signs_stored_claims_with_new_key():
+    eth_address = str_eth(sample_eth_address)
+    claim_type, data = claim_for_attestation(AttestationTypes.AIRBNB, '123')
+
+    [(id, signature)] = _sign_batch(
+        PRIVATE_KEY, [(7, eth_address, claim_type, data)])
+
+    assert id == 7
+    message = Web3.soliditySha3(['address', 'uint256', 'bytes32'], [
+        eth_address, claim_type, Web3.sha3(text=data)])
+    signer = Account.recoverHash(
+        defunct_hash_message(hexstr=message.hex()), signature=signature)
+    assert signer == Account.privateKeyToAccount(PRIVATE_KEY).address
+
+
+def create_attestations(count):
+    attestations = [Attestation(
+        method=AttestationTypes.AIRBNB,
+        eth_address=str_eth(sample_eth_address),
+        value=str(i),
+        signature='0x' + '00' * 65,
+        created_at=datetime.datetime(2018, 10, 1)
+    ) for i in range(count)]
+    db.session.add_all(attestations)
+    db.session.commit()
+    return [attestation.id for attestation in attestations]
+
+
+def expected_signature(attestation):
+    [(_, signature)] = _sign_batch(PRIVATE_KEY, [
+        (attestation.id, attestation.eth_address) +
+        claim_for_attestation(attestation.method, attestation.value)])
+    return signature
+
+
+def test_resign_resumes_from_checkpoint():
+    ids = create_attestations(3)
+    stage = attestation_resign_service._stage
+    calls = []
+
+    def stage_once(*args):
+        calls.append(args)
+        if len(calls) > 1:
+            raise RuntimeError("interrupted")
+        return stage(*args)
+
+    with mock.patch.object(attestation_resign_service, '_stage',
+                           side_effect=stage_once):
+        with pytest.raises(RuntimeError):
+            AttestationResignService.resign(PRIVATE_KEY, workers=1,
+                                            batch_size=1)
+
+    db.session.rollback()
+    assert ResignCheckpoint.query.get(SIGN).last_id == ids[0]
+    assert {attestation.signature for attestation in Attestation.query} == \
+        {'0x' + '00' * 65}
+    # The interrupted run must be finished with its own key
+    with pytest.raises(ValueError):
+        AttestationResignService.resign(OTHER_PRIVATE_KEY, workers=1)
+
+    db.session.rollback()
+    assert AttestationResignService.resign(
+        PRIVATE_KEY, workers=1, batch_size=1) == 2
+
+    db.session.expire_all()
+    attestations = Attestation.query.order_by(Attestation.id).all()
+    assert [attestation.id for attestation in attestations] == ids
+    for attestation in attestations:
+        assert attestation.signature == expected_signature(attestation)
+    assert ResignCheckpoint.query.count() == 0
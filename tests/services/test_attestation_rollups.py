@@ -0,0 +1,55 @@
+import datetime
+
+from database import db
+from database.models import Attestation, AttestationTypes
+from logic.attestation_rollup_service import AttestationRollupService
+from tests.helpers.eth_utils import sample_eth_address, str_eth
+
+OTHER_ETH_ADDRESS = '0x112234455C3a32FD11230C42E7Bccd4A84e02010'
+
+
+def create_attestation(eth_address, method, created_at):
+    db.session.add(Attestation(
+        method=method,
+        eth_address=eth_address,
+        value='123456' if method == AttestationTypes.AIRBNB else None,
+        signature='0x' + '00' * 65,
+        created_at=created_at
+    ))
+    db.session.commit()
+
+
+def test_refresh_adds_new_attestations():
+    eth_address = str_eth(sample_eth_address)
+    day = datetime.datetime(2018, 10, 1)
+    create_attestation(eth_address, AttestationTypes.PHONE, day)
+    create_attestation(eth_address, AttestationTypes.EMAIL, day)
+    create_attestation(OTHER_ETH_ADDRESS, AttestationTypes.PHONE,
+                       day + datetime.timedelta(days=1))
+
+    AttestationRollupService.refresh(lag=0)
+    stats = AttestationRollupService.get_stats(since=day.date()).data
+
+    assert [(row['day'], row['method'], row['count'])
+            for row in stats['daily']] == [
+        (day.date(), 'phone', 1),
+        (day.date(), 'email', 1),
+        (day.date() + datetime.timedelta(days=1), 'phone', 1)
+    ]
+    assert stats['coverage'] == [
+        {'methods': ['phone'], 'identities': 1},
+        {'methods': ['phone', 'email'], 'identities': 1}
+    ]
+
+    # Only attestations added since are counted, and the other identity
+    # moves to its new combination of methods
+    create_attestation(OTHER_ETH_ADDRESS, AttestationTypes.AIRBNB, day)
+    AttestationRollupService.refresh(lag=0)
+    stats = AttestationRollupService.get_stats(since=day.date()).data
+
+    assert stats['daily'][0]['count'] == 1
+    assert stats['coverage'] == [
+        {'methods': ['phone', 'email'], 'identities': 1},
+        {'methods': ['phone', 'airbnb'], 'identities': 1}
+    ]
+    assert stats['identities'] == 2
@@ -0,0 +1,149 @@
+import datetime
+
+import mock
+import pytest
+from sqlalchemy import func, select
+
+from config import settings
+from database import db
+from database.models import Attestation, AttestationTypes
+from database.sharding import bind_name, owner
+from logic.attestation_lookup_service import AttestationLookupService
+from logic.attestation_maintenance_service import (
+    AttestationMaintenanceService
+)
+from logic.attestation_resign_service import AttestationResignService
+from logic.attestation_rollup_service import AttestationRollupService
+from logic.attestation_service import save_attestation
+from logic.attestation_shard_service import AttestationShardService
+
+ETH_ADDRESSES = ['0x{:040x}'.format(i * 7919) for i in range(1, 9)]
+
+
+@pytest.fixture
+def shards(app):
+    if len(settings.TEST_SHARD_URLS) < 2:
+        pytest.skip("TEST_SHARD_URLS needs two or more databases")
+    binds = {bind_name(i): url
+             for i, url in enumerate(settings.TEST_SHARD_URLS)}
+    with mock.patch.dict(app.config, {'SQLALCHEMY_BINDS': binds}):
+        engines = {name: db.get_engine(bind=name) for name in binds}
+        for engine in engines.values():
+            Attestation.__table__.create(engine, checkfirst=True)
+        yield engines
+        for engine in engines.values():
+            Attestation.__table__.drop(engine)
+
+
+def phone_attestation(eth_address):
+    return Attestation(
+        method=AttestationTypes.PHONE,
+        eth_address=eth_address,
+        value='1 5555555555',
+        signature='0x' + '00' * 65,
+        created_at=datetime.datetime(2018, 10, 1)
+    )
+
+
+def test_owner_moves_only_identities_of_appended_shard():
+    addresses = ['0x{:040x}'.format(i) for i in range(3000)]
+    two = [bind_name(0), bind_name(1)]
+    three = two + [bind_name(2)]
+
+    moved = 0
+    for eth_address in addresses:
+        before = owner(eth_address, two)
+        after = owner(eth_address, three)
+        assert after in (before, bind_name(2))
+        moved += after != before
+
+    assert 0.25 < moved / len(addresses) < 0.42
+
+
+def test_attestations_are_stored_on_their_shard(shards):
+    for eth_address in ETH_ADDRESSES:
+        save_attestation(phone_attestation(eth_address))
+
+    counts = AttestationShardService.count()
+    assert sum(counts.values()) == len(ETH_ADDRESSES)
+    for eth_address in ETH_ADDRESSES:
+        resp = AttestationLookupService.list_attestations(eth_address)
+        assert len(resp.data['attestations']) == 1
+        for name, engine in shards.items():
+            stored = engine.execute(select([func.count()]).where(
+                Attestation.eth_address == eth_address)).scalar()
+            assert stored == (name == owner(eth_address, sorted(shards)))
+
+
+def test_rebalance_moves_misplaced_attestations(shards):
+    names = sorted(shards)
+    eth_address = ETH_ADDRESSES[0]
+    target = owner(eth_address, names)
+    source = next(name for name in names if name != target)
+    shards[source].execute(Attestation.__table__.insert().values(
+        method=AttestationTypes.PHONE,
+        eth_address=eth_address,
+        value='1 5555555555',
+        signature='0x' + '00' * 65,
+        created_at=datetime.datetime(2018, 10, 1)))
+
+    moved = AttestationShardService.rebalance()
+
+    assert moved == {(source, target): 1}
+    counts = AttestationShardService.count()
+    assert (counts[source], counts[target]) == (0, 1)
+    resp = AttestationLookupService.list_attestations(eth_address)
+    assert len(resp.data['attestations']) == 1
+
+
+def test_rollups_count_attestations_of_all_shards(shards):
+    for eth_address in ETH_ADDRESSES:
+        save_attestation(phone_attestation(eth_address))
+
+    AttestationRollupService.refresh(lag=0)
+    stats = AttestationRollupService.get_stats(
+        since=datetime.date(2018, 10, 1)).data
+
+    # Ids overlap between shards, so each shard has its own watermark
+    assert [(row['method'], row['count']) for row in stats['daily']] == [
+        ('phone', len(ETH_ADDRESSES))]
+    assert stats['coverage'] == [
+        {'methods': ['phone'], 'identities': len(ETH_ADDRESSES)}]
+
+    AttestationRollupService.refresh(lag=0)
+    stats = AttestationRollupService.get_stats(
+        since=datetime.date(2018, 10, 1)).data
+    assert stats['identities'] == len(ETH_ADDRESSES)
+
+
+def test_deduplicate_runs_on_every_shard(shards):
+    for engine in shards.values():
+        engine.execute('DROP INDEX uq_attestation_eth_address_method_value')
+    for eth_address in ETH_ADDRESSES:
+        target = shards[owner(eth_address, sorted(shards))]
+        for _ in range(2):
+            target.execute(Attestation.__table__.insert().values(
+                method=AttestationTypes.PHONE,
+                eth_address=eth_address,
+                value='1 5555555555',
+                signature='0x' + '00' * 65,
+                created_at=datetime.datetime(2018, 10, 1)))
+    assert AttestationMaintenanceService.has_duplicates()
+
+    assert AttestationMaintenanceService.deduplicate() == len(ETH_ADDRESSES)
+
+    assert not AttestationMaintenanceService.has_duplicates()
+    assert sum(AttestationShardService.count().values()) == \
+        len(ETH_ADDRESSES)
+
+
+def test_resign_signs_attestations_of_all_shards(shards):
+    for eth_address in ETH_ADDRESSES:
+        save_attestation(phone_attestation(eth_address))
+
+    signed = AttestationResignService.resign('0x' + '11' * 32, workers=1)
+
+    assert signed == len(ETH_ADDRESSES)
+    for engine in shards.values():
+        assert engine.execute(select([func.count()]).where(
+            Attestation.signature == '0x' + '00' * 65)).scalar() == 0
@@ -0,0 +1,148 @@
+import datetime
+import json
+import signal
+
+import mock
+import pytest
+
+from database.models import Attestation, AttestationTypes
+from logic import attestation_writer as writer_module
+from logic.attestation_writer import AttestationWriter
+from tests.helpers.eth_utils import sample_eth_address, str_eth
+
+CREATED_AT = datetime.datetime(2018, 10, 1, 12, 0, 0, 123456)
+
+
+def attestation(value):
+    return Attestation(method=AttestationTypes.AIRBNB,
+                       eth_address=str_eth(sample_eth_address),
+                       value=value,
+                       signature='0x' + '00' * 65,
+                       created_at=CREATED_AT)
+
+
+def stored_values(store):
+    return [row['value'] for call in store.call_args_list
+            for row in call[0][1]]
+
+
+def spilled_values(path):
+    with open(path) as f:
+        return [json.loads(line)['value'] for line in f]
+
+
+@pytest.yield_fixture
+def settings(tmpdir):
+    with mock.patch.object(writer_module, 'settings') as settings:
+        settings.ATTESTATION_WRITE_BEHIND = True
+        settings.ATTESTATION_SPILL_FILE = str(tmpdir.join('spill.jsonl'))
+        settings.ATTESTATION_SPILL_FSYNC = False
+        # Longer than the tests, which flush by hand
+        settings.ATTESTATION_FLUSH_INTERVAL = 20
+        settings.ATTESTATION_FLUSH_BATCH_SIZE = 500
+        settings.ATTESTATION_FLUSH_MAX_RETRIES = 3
+        yield settings
+
+
+@pytest.yield_fixture
+def store():
+    engine = mock.MagicMock()
+    with mock.patch.object(writer_module, 'store_attestations') as store, \
+            mock.patch.object(writer_module, '_by_shard',
+                              side_effect=lambda rows: [(engine, rows)]), \
+            mock.patch.object(writer_module, 'atexit'), \
+            mock.patch.object(writer_module, '_exit_on_sigterm'):
+        yield store
+
+
+def started_writer():
+    writer = AttestationWriter()
+    writer.init_app(mock.MagicMock())
+    return writer
+
+
+def test_enqueued_attestations_are_spilled_and_flushed(settings, store):
+    writer = started_writer()
+    writer.enqueue(attestation('1'))
+    writer.enqueue(attestation('2'))
+
+    assert spilled_values(settings.ATTESTATION_SPILL_FILE) == ['1', '2']
+
+    writer.stop()
+
+    assert stored_values(store) == ['1', '2']
+    assert spilled_values(settings.ATTESTATION_SPILL_FILE) == []
+    writer_module.atexit.register.assert_called_once_with(writer.stop)
+
+
+def test_spilled_attestations_are_recovered_after_crash(settings, store):
+    # A crash while flushing '1' and '2', after '3' was queued
+    with open(settings.ATTESTATION_SPILL_FILE + '.flushing', 'w') as f:
+        f.write(writer_module._to_json({
+            'method': AttestationTypes.AIRBNB, 'value': '1',
+            'eth_address': str_eth(sample_eth_address),
+            'signature': '0x00', 'created_at': CREATED_AT}) + '\n')
+        f.write(writer_module._to_json({
+            'method': AttestationTypes.AIRBNB, 'value': '2',
+            'eth_address': str_eth(sample_eth_address),
+            'signature': '0x00', 'created_at': CREATED_AT}) + '\n')
+    with open(settings.ATTESTATION_SPILL_FILE, 'w') as f:
+        f.write(writer_module._to_json({
+            'method': AttestationTypes.AIRBNB, 'value': '3',
+            'eth_address': str_eth(sample_eth_address),
+            'signature': '0x00', 'created_at': CREATED_AT}) + '\n')
+        # Partially written when the process died
+        f.write('{"method": "AIR')
+
+    writer = started_writer()
+    writer.stop()
+
+    assert stored_values(store) == ['1', '2', '3']
+    assert store.call_args[0][1][0]['created_at'] == CREATED_AT
+
+
+def test_failed_batch_is_retried(settings, store):
+    store.side_effect = [RuntimeError('connection lost'), None, None]
+    writer = started_writer()
+    writer.enqueue(attestation('1'))
+
+    writer._flush()
+    writer.enqueue(attestation('2'))
+    assert writer._delay() == 2 * settings.ATTESTATION_FLUSH_INTERVAL
+
+    writer._flush()
+    assert writer._delay() == settings.ATTESTATION_FLUSH_INTERVAL
+    writer.stop()
+
+    assert stored_values(store) == ['1', '1', '2']
+
+
+def test_rows_failing_every_retry_are_dead_lettered(settings, store):
+    stored = []
+
+    def fail_on_bad_row(conn, rows):
+        if any(row['value'] == 'bad' for row in rows):
+            raise ValueError('bad row')
+        stored.extend(row['value'] for row in rows)
+
+    store.side_effect = fail_on_bad_row
+    writer = started_writer()
+    writer.enqueue(attestation('1'))
+    writer.enqueue(attestation('bad'))
+    for _ in range(settings.ATTESTATION_FLUSH_MAX_RETRIES):
+        writer._flush()
+    writer.enqueue(attestation('2'))
+    writer.stop()
+
+    assert spilled_values(writer.dead_letter_path) == ['bad']
+    assert stored == ['1', '2']
+
+
+def test_sigterm_exits_through_atexit_hooks():
+    previous = signal.getsignal(signal.SIGTERM)
+    try:
+        writer_module._exit_on_sigterm()
+        with pytest.raises(SystemExit):
+            signal.getsignal(signal.SIGTERM)(signal.SIGTERM, None)
+    finally:
+        signal.signal(signal.SIGTERM, previous)
@@ -0,0 +1,155 @@
+import mock
+import pytest
+
+from database.models import EventCheckpoint
+from logic.event_ingestion_service import EventIngestionService
+from tests.helpers.eth_utils import fake_web3, sample_log
+from util.contract import ContractHelper
+
+EVENTS = [sample_log(block, transaction, 0)
+          for block in range(0, 20, 3)
+          for transaction in range(2)]
+
+
+def delivered(callback):
+    return [call[0][0] for call in callback.call_args_list]
+
+
+def test_run_resumes_from_checkpoint():
+    helper = ContractHelper(fake_web3(EVENTS))
+    callback = mock.Mock()
+
+    assert EventIngestionService.run('test', ['NewListing(uint256)'],
+                                     callback, helper, block_to=9,
+                                     confirmations=0) == 8
+    assert delivered(callback) == EVENTS[:8]
+    checkpoint = EventCheckpoint.query.get('test')
+    assert (checkpoint.block_number, checkpoint.log_index) == (10, None)
+
+    callback.reset_mock()
+    assert EventIngestionService.run('test', ['NewListing(uint256)'],
+                                     callback, helper,
+                                     confirmations=0) == 6
+    assert delivered(callback) == EVENTS[8:]
+
+
+def test_run_keeps_batches_committed_before_failure():
+    helper = ContractHelper(fake_web3(EVENTS))
+    callback = mock.Mock(side_effect=[None] * 5 + [RuntimeError])
+
+    with pytest.raises(RuntimeError):
+        EventIngestionService.run('test', ['NewListing(uint256)'], callback,
+                                  helper, batch_size=2, confirmations=0)
+
+    # The event that failed and the one before it are delivered again
+    callback = mock.Mock()
+    EventIngestionService.run('test', ['NewListing(uint256)'], callback,
+                              helper, batch_size=2, confirmations=0)
+    assert delivered(callback) == EVENTS[4:]
+
+
+def test_run_only_delivers_confirmed_events_without_rollback():
+    helper = ContractHelper(fake_web3(EVENTS))
+    callback = mock.Mock()
+
+    EventIngestionService.run('test', ['NewListing(uint256)'], callback,
+                              helper, confirmations=5)
+
+    assert delivered(callback) == [e for e in EVENTS
+                                   if e['blockNumber'] <= 13]
+
+
+def block_hash(fork, block_number):
+    return '0x{:02x}{:062x}'.format(fork, block_number)
+
+
+def on_chain(events, fork):
+    return [dict(e, blockHash=block_hash(fork, e['blockNumber']))
+            for e in events]
+
+
+def test_run_rolls_back_reorged_blocks():
+    chain = {'events': on_chain(EVENTS, 0), 'fork': 0}
+    web3 = fake_web3(EVENTS)
+    web3.eth.getLogs.side_effect = lambda params: [
+        e for e in chain['events']
+        if params['fromBlock'] <= e['blockNumber'] <= params['toBlock']]
+    web3.eth.getBlock.side_effect = lambda number: {
+        'hash': block_hash(chain['fork'] if number >= 18 else 0, number)}
+    helper = ContractHelper(web3)
+    callback = mock.Mock()
+    rollback = mock.Mock()
+
+    EventIngestionService.run('test', ['NewListing(uint256)'], callback,
+                              helper, rollback=rollback, confirmations=5)
+    assert delivered(callback) == chain['events']
+    assert not rollback.called
+
+    # Block 18 is replaced by one with another event
+    chain['fork'] = 1
+    chain['events'] = on_chain(EVENTS[:-2], 0) + on_chain(
+        [sample_log(18, 0, 1)], 1)
+    callback.reset_mock()
+    EventIngestionService.run('test', ['NewListing(uint256)'], callback,
+                              helper, rollback=rollback, confirmations=5)
+
+    # Blocks after 15, the highest one unchanged, may have been replaced
+    rollback.assert_called_once_with(16)
+    assert delivered(callback) == chain['events'][-1:]
+
+
+def test_run_rolls_back_from_block_after_last_unchanged_one():
+    chain = {'events': on_chain(EVENTS, 0), 'fork': 0}
+    web3 = fake_web3(EVENTS)
+    web3.eth.getLogs.side_effect = lambda params: [
+        e for e in chain['events']
+        if params['fromBlock'] <= e['blockNumber'] <= params['toBlock']]
+    web3.eth.getBlock.side_effect = lambda number: {
+        'hash': block_hash(chain['fork'] if number >= 16 else 0, number)}
+    helper = ContractHelper(web3)
+    callback = mock.Mock()
+    rollback = mock.Mock()
+
+    EventIngestionService.run('test', ['NewListing(uint256)'], callback,
+                              helper, rollback=rollback, confirmations=5)
+
+    # Blocks 16 to 18 are replaced and the new block 17 has an event, while
+    # only blocks 15 and 18 were remembered
+    chain['fork'] = 1
+    chain['events'] = on_chain(EVENTS[:-2], 0) + on_chain(
+        [sample_log(17, 0, 0)], 1)
+    callback.reset_mock()
+    EventIngestionService.run('test', ['NewListing(uint256)'], callback,
+                              helper, rollback=rollback, confirmations=5)
+
+    rollback.assert_called_once_with(16)
+    assert delivered(callback) == chain['events'][-1:]
+
+
+def test_run_rolls_back_from_last_final_block_when_only_head_was_kept():
+    chain = {'events': on_chain(EVENTS[:10], 0), 'fork': 0}
+    web3 = fake_web3(EVENTS)
+    web3.eth.getLogs.side_effect = lambda params: [
+        e for e in chain['events']
+        if params['fromBlock'] <= e['blockNumber'] <= params['toBlock']]
+    web3.eth.getBlock.side_effect = lambda number: {
+        'hash': block_hash(chain['fork'] if number >= 16 else 0, number)}
+    helper = ContractHelper(web3)
+    callback = mock.Mock()
+    rollback = mock.Mock()
+
+    # No event after block 12, so of the unconfirmed blocks only the head,
+    # 18, is kept along with the last final block, 13
+    EventIngestionService.run('test', ['NewListing(uint256)'], callback,
+                              helper, rollback=rollback, confirmations=5)
+
+    # Blocks 16 to 18 are replaced and the new block 16 has an event
+    chain['fork'] = 1
+    chain['events'] = on_chain(EVENTS[:10], 0) + on_chain(
+        [sample_log(16, 0, 0)], 1)
+    callback.reset_mock()
+    EventIngestionService.run('test', ['NewListing(uint256)'], callback,
+                              helper, rollback=rollback, confirmations=5)
+
+    rollback.assert_called_once_with(14)
+    assert delivered(callback) == chain['events'][-1:]
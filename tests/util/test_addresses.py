@@ -0,0 +1,14 @@
+from util.addresses import address_bytes, canonical_address
+
+CHECKSUMMED = '0xC741715d55dE72BF12461760bAAf97e0468E7B8e'
+
+
+def test_canonical_address_ignores_case_and_prefix():
+    for eth_address in (CHECKSUMMED, CHECKSUMMED.lower(), CHECKSUMMED[2:],
+                        CHECKSUMMED[2:].upper(), '0X' + CHECKSUMMED[2:]):
+        assert canonical_address(eth_address) == CHECKSUMMED.lower()
+
+
+def test_address_bytes_are_the_20_address_bytes():
+    assert address_bytes(CHECKSUMMED[2:]) == address_bytes(CHECKSUMMED) == \
+        bytes.fromhex('c741715d55de72bf12461760baaf97e0468e7b8e')
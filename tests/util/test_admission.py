@@ -0,0 +1,46 @@
+from util.admission import (
+    AdmissionController,
+    PRIORITY_HIGH,
+    PRIORITY_LOW,
+    queue_time
+)
+
+
+def controller():
+    return AdmissionController(
+        max_in_flight={PRIORITY_HIGH: 0, PRIORITY_LOW: 2},
+        queue_budget={PRIORITY_HIGH: 10, PRIORITY_LOW: 2})
+
+
+def test_low_priority_is_shed_at_in_flight_limit():
+    admission = controller()
+    assert admission.try_acquire(PRIORITY_LOW)
+    assert admission.try_acquire(PRIORITY_LOW)
+    assert not admission.try_acquire(PRIORITY_LOW)
+    # Cheap routes are still admitted
+    assert admission.try_acquire(PRIORITY_HIGH)
+
+    admission.release(PRIORITY_LOW)
+    assert admission.try_acquire(PRIORITY_LOW)
+
+    stats = admission.stats()
+    assert stats[PRIORITY_LOW]['in_flight'] == 2
+    assert stats[PRIORITY_LOW]['shed'] == 1
+    assert stats[PRIORITY_HIGH]['in_flight'] == 1
+
+
+def test_requests_queued_past_budget_are_shed():
+    admission = controller()
+    assert not admission.try_acquire(PRIORITY_LOW, queued_for=3)
+    assert admission.try_acquire(PRIORITY_HIGH, queued_for=3)
+    assert not admission.try_acquire(PRIORITY_HIGH, queued_for=11)
+
+
+def test_queue_time():
+    now = 1538000000.5
+    assert queue_time(None, now) == 0
+    assert queue_time('garbage', now) == 0
+    assert queue_time('1538000000000', now) == 0.5
+    assert queue_time('t=1538000000.250', now) == 0.25
+    assert queue_time('t=1538000000000000', now) == 0.5
+    assert queue_time('1538000001000', now) == 0
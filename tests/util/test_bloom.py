@@ -0,0 +1,30 @@
+import pytest
+
+from util.bloom import BloomFilter
+
+KEYS = [i.to_bytes(20, 'big') for i in range(1000)]
+
+
+def test_added_keys_are_always_found():
+    bloom = BloomFilter(capacity=1000, error_rate=0.01)
+    bloom.update(KEYS)
+
+    assert all(key in bloom for key in KEYS)
+    false_positives = sum((i + 1000).to_bytes(20, 'big') in bloom
+                          for i in range(10000))
+    assert false_positives < 300
+
+
+def test_filter_file_is_shared(tmpdir):
+    path = str(tmpdir.join('filter'))
+    writer = BloomFilter(capacity=1000, error_rate=0.01, path=path)
+    reader = BloomFilter(capacity=1000, error_rate=0.01, path=path)
+
+    writer.add(KEYS[0])
+
+    assert KEYS[0] in reader
+    assert KEYS[1] not in reader
+    with pytest.raises(ValueError):
+        BloomFilter(capacity=2000, error_rate=0.01, path=path)
+    writer.close()
+    reader.close()
@@ -0,0 +1,134 @@
+import itertools
+import mock
+import pytest
+
+from tests.helpers.eth_utils import fake_web3, sample_log
+from util.contract import ContractHelper
+from util.event_log_cache import EventLogCache
+
+EVENTS = [sample_log(block, transaction, log)
+          for block in range(0, 100, 7)
+          for transaction in range(2)
+          for log in range(2)]
+
+
+def test_iter_events_walks_range_in_chunks():
+    web3 = fake_web3(EVENTS)
+    helper = ContractHelper(web3)
+
+    events = list(helper.iter_events(['NewListing(uint256)'], chunk_size=10))
+
+    assert events == EVENTS
+    assert web3.eth.getLogs.call_count == 10
+
+
+def test_iter_events_shrinks_chunks_refused_by_node():
+    web3 = fake_web3(EVENTS, max_blocks=16)
+    helper = ContractHelper(web3)
+
+    events = list(helper.iter_events(['NewListing(uint256)'], chunk_size=64))
+
+    assert events == EVENTS
+
+
+def test_iter_events_raises_other_errors():
+    web3 = fake_web3(EVENTS)
+    web3.eth.getLogs.side_effect = ValueError({'code': -32000,
+                                               'message': 'unknown block'})
+    helper = ContractHelper(web3)
+
+    with pytest.raises(ValueError):
+        list(helper.iter_events(['NewListing(uint256)']))
+
+
+def test_fetch_events_resumes_after_last_event():
+    helper = ContractHelper(fake_web3(EVENTS))
+    callback = mock.Mock()
+
+    helper.fetch_events(['NewListing(uint256)'], callback,
+                        log_index=0, transaction_index=1, block_from=7)
+
+    processed = [call[0][0] for call in callback.call_args_list]
+    assert processed[0] == sample_log(7, 1, 1)
+    assert processed[1:] == [e for e in EVENTS if e['blockNumber'] > 7]
+
+
+def test_iter_events_merges_parallel_chunks_in_order():
+    web3 = fake_web3(list(reversed(EVENTS)), max_blocks=8)
+    helper = ContractHelper(web3)
+
+    events = list(helper.iter_events(['NewListing(uint256)'], chunk_size=10,
+                                     workers=4))
+
+    assert events == EVENTS
+
+
+def test_iter_events_reads_confirmed_blocks_from_cache(tmpdir):
+    web3 = fake_web3(EVENTS)
+    cache = EventLogCache(str(tmpdir.join('logs.db')))
+    helper = ContractHelper(web3, cache)
+
+    assert list(helper.iter_events(['NewListing(uint256)'], chunk_size=10,
+                                   block_to=49)) == EVENTS[:32]
+    web3.eth.getLogs.reset_mock()
+
+    events = list(helper.iter_events(['NewListing(uint256)'], chunk_size=10))
+
+    assert events == EVENTS
+    # Only the blocks after the cached ones are fetched
+    assert [(call[0][0]['fromBlock'], call[0][0]['toBlock'])
+            for call in web3.eth.getLogs.call_args_list] == [
+        (50, 59), (60, 69), (70, 79), (80, 86), (87, 96), (97, 98)]
+
+
+class FakeSubscription():
+    def __init__(self, logs):
+        self.logs = list(logs)
+        self.closed = False
+
+    def next(self):
+        if not self.logs:
+            raise ConnectionError('connection closed')
+        return self.logs.pop(0)
+
+    def close(self):
+        self.closed = True
+
+
+@mock.patch('util.contract.time.sleep')
+def test_subscription_fetches_events_missed_while_reconnecting(sleep):
+    events = list(EVENTS)
+    web3 = fake_web3(events)
+    helper = ContractHelper(web3)
+    first = FakeSubscription([sample_log(99, 0, 0)])
+    second = FakeSubscription([sample_log(100, 0, 0), sample_log(101, 0, 0)])
+
+    def subscribe(uri, topics):
+        if not first.closed:
+            return first
+        # Block 100 was mined while disconnected
+        events.append(sample_log(100, 0, 0))
+        web3.eth.blockNumber = 100
+        return second
+
+    with mock.patch('util.contract.LogSubscription', side_effect=subscribe):
+        subscribed = helper.iter_subscribed_events(['NewListing(uint256)'])
+        delivered = list(itertools.islice(subscribed, 3))
+
+    assert delivered == [sample_log(99, 0, 0), sample_log(100, 0, 0),
+                         sample_log(101, 0, 0)]
+    assert sleep.call_count == 1
+
+
+def test_subscription_delivers_events_replacing_removed_ones():
+    helper = ContractHelper(fake_web3(EVENTS))
+    removed = dict(sample_log(99, 1, 0), removed=True)
+    subscription = FakeSubscription([
+        sample_log(99, 1, 0), removed, sample_log(99, 0, 0)])
+
+    with mock.patch('util.contract.LogSubscription',
+                    return_value=subscription):
+        subscribed = helper.iter_subscribed_events(['NewListing(uint256)'])
+        delivered = list(itertools.islice(subscribed, 3))
+
+    assert delivered == [sample_log(99, 1, 0), removed, sample_log(99, 0, 0)]
@@ -0,0 +1,31 @@
+import time
+
+import pytest
+
+from config import settings
+from logic.service_utils import DeadlineExceededError
+from util import deadline
+
+
+def test_no_deadline():
+    assert deadline.remaining() is None
+    assert deadline.timeout() == settings.REQUEST_TIMEOUT
+    deadline.check()
+
+
+def test_nested_scope_keeps_earlier_deadline():
+    with deadline.scope(1):
+        with deadline.scope(60):
+            assert deadline.remaining() <= 1
+        with deadline.scope(0.5):
+            assert deadline.timeout() <= 0.5
+        assert 0.5 < deadline.remaining() <= 1
+    assert deadline.remaining() is None
+
+
+def test_expired_deadline():
+    with deadline.scope(0.01):
+        time.sleep(0.02)
+        with pytest.raises(DeadlineExceededError) as deadline_err:
+            deadline.timeout()
+    assert deadline_err.value.status_code == 504
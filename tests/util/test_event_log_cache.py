@@ -0,0 +1,16 @@
+from tests.helpers.eth_utils import sample_log
+from util.event_log_cache import EventLogCache
+
+TOPICS = [['0x01']]
+
+
+def test_adjacent_ranges_are_merged(tmpdir):
+    cache = EventLogCache(str(tmpdir.join('logs.db')))
+    cache.store(TOPICS, 0, 9, [sample_log(3, 0, 0)])
+    cache.store(TOPICS, 20, 29, [])
+    cache.store(TOPICS, 10, 14, [sample_log(10, 1, 2), sample_log(10, 0, 5)])
+
+    assert cache.covered(TOPICS, 5, 40) == [(5, 14), (20, 29)]
+    assert cache.covered([['0x02']], 0, 40) == []
+    assert list(cache.logs(TOPICS, 0, 14)) == [
+        sample_log(3, 0, 0), sample_log(10, 0, 5), sample_log(10, 1, 2)]
@@ -0,0 +1,67 @@
+import threading
+import time
+
+import pytest
+
+from util.singleflight import SingleFlight, coalesce
+
+
+def test_concurrent_calls_share_one_execution():
+    flight = SingleFlight()
+    started = threading.Event()
+    release = threading.Event()
+    calls = []
+    results = []
+
+    def slow(value):
+        calls.append(value)
+        started.set()
+        release.wait()
+        return value * 2
+
+    def run():
+        results.append(flight.do('key', slow, 21))
+
+    leader = threading.Thread(target=run)
+    leader.start()
+    started.wait()
+    followers = [threading.Thread(target=run) for _ in range(3)]
+    for follower in followers:
+        follower.start()
+    # Give the followers time to join the in-flight call
+    time.sleep(0.1)
+    release.set()
+    for thread in [leader] + followers:
+        thread.join()
+
+    assert calls == [21]
+    assert results == [42, 42, 42, 42]
+    assert flight.in_flight() == 0
+
+
+def test_errors_are_shared_and_not_cached():
+    flight = SingleFlight()
+
+    @coalesce(flight=flight)
+    def fail():
+        raise ValueError('boom')
+
+    with pytest.raises(ValueError):
+        fail()
+    with pytest.raises(ValueError):
+        fail()
+    assert flight.in_flight() == 0
+
+
+def test_different_arguments_are_not_coalesced():
+    flight = SingleFlight()
+    calls = []
+
+    @coalesce(flight=flight)
+    def record(value):
+        calls.append(value)
+        return value
+
+    assert record(1) == 1
+    assert record(2) == 2
+    assert calls == [1, 2]
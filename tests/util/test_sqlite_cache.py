@@ -0,0 +1,37 @@
+from util.sqlite_cache import SQLiteCache
+
+
+class FakeTimer():
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_entries_expire(tmpdir):
+    timer = FakeTimer()
+    cache = SQLiteCache(str(tmpdir.join('cache.db')), 10, 5, timer=timer)
+    cache.set('a', b'1')
+    cache.set('b', b'2', ttl=20)
+
+    timer.now += 10
+
+    assert cache.get('a') is None
+    assert cache.get('b') == b'2'
+    assert cache.pop('b') == b'2'
+    assert cache.get('b', b'missing') == b'missing'
+
+
+def test_entries_are_shared_and_bounded(tmpdir):
+    path = str(tmpdir.join('cache.db'))
+    writer = SQLiteCache(path, 10, 60)
+    reader = SQLiteCache(path, 10, 60)
+
+    for i in range(100):
+        writer.set(str(i), b'x', ttl=i + 1)
+
+    assert reader.get('99') == b'x'
+    # Evicted every few sets, the entries closest to expiring first
+    assert len(reader) < 100
+    assert reader.get('0') is None
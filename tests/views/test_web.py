@@ -1,9 +1,11 @@
 from views import web_views  # noqa
+import json
 import mock
 import responses
 
 from flask import session
 
+from database.models import Attestation
 from tests.helpers.rest_utils import post_json, json_of_response
 from tests.helpers.eth_utils import sample_eth_address, str_eth
 
@@ -130,3 +132,97 @@ def test_twitter_verify(mock_requests, client):
     assert resp.status_code == 200
     assert len(resp_json['signature']) == 132
     assert resp_json['data'] == 'twitter verified'
+
+
+def test_verify_phone_idempotency_key(client):
+    args = {
+        'country_calling_code': '1',
+        'phone': '12341234',
+        'code': '123456',
+        'identity': str_eth(sample_eth_address)
+    }
+    headers = {'Idempotency-Key': 'e0f2b5b4-7c07-4a2f-9c1c-3b1d9b3f0f41'}
+
+    with responses.RequestsMock() as rsps:
+        rsps.add(
+            responses.GET,
+            'https://api.authy.com/protected/json/phones/verification/check',
+            json={
+                'message': 'Verification code is correct.',
+                'success': True
+            }
+        )
+        first = client.post('/api/attestations/phone/verify',
+                            data=json.dumps(args),
+                            content_type='application/json',
+                            headers=headers)
+
+    # The retry is answered from the stored response, without another call
+    # to the provider (RequestsMock would reject an unregistered request)
+    with responses.RequestsMock():
+        retry = client.post('/api/attestations/phone/verify',
+                            data=json.dumps(args),
+                            content_type='application/json',
+                            headers=headers)
+
+    assert first.status_code == 200
+    assert retry.status_code == 200
+    assert json_of_response(retry) == json_of_response(first)
+    assert len(Attestation.query.all()) == 1
+
+    args['code'] = '654321'
+    reused = client.post('/api/attestations/phone/verify',
+                         data=json.dumps(args),
+                         content_type='application/json',
+                         headers=headers)
+    assert reused.status_code == 422
+
+
+def test_database_stats(client):
+    with mock.patch('config.settings.INTERNAL_API_TOKEN', 'token'):
+        rejected = client.get('/api/internal/database-stats')
+        response = client.get('/api/internal/database-stats',
+                              headers={'X-Internal-API-Token': 'token'})
+
+    assert rejected.status_code == 400
+    assert response.status_code == 200
+    stats = json_of_response(response)
+    assert stats['pool']['checkouts'] >= 0
+    assert stats['replica_pool'] is None
+    assert 'requests' in stats
+
+
+def test_export_attestations_invalid_format(client):
+    with mock.patch('config.settings.INTERNAL_API_TOKEN', 'token'):
+        response = client.get('/api/internal/attestations/export?format=xml',
+                              headers={'X-Internal-API-Token': 'token'})
+
+    assert response.status_code == 400
+    assert 'format' in json_of_response(response)['errors']
+
+
+def test_export_attestations_csv(client):
+    with mock.patch('config.settings.INTERNAL_API_TOKEN', 'token'):
+        response = client.get('/api/internal/attestations/export?format=csv',
+                              headers={'X-Internal-API-Token': 'token'})
+
+    assert response.status_code == 200
+    assert response.content_type == 'text/csv'
+    assert response.data.decode('utf8').startswith(
+        'id,method,eth_address,value,signature,created_at,updated_at\r\n')
+
+
+def test_has_attestations(client):
+    response = client.get('/api/attestations/identity/{}/exists'.format(
+        str_eth(sample_eth_address)))
+
+    assert response.status_code == 200
+    assert json_of_response(response) == {'exists': False}
+
+
+def test_attestation_summary(client):
+    response = client.get('/api/attestations/identity/{}/summary'.format(
+        str_eth(sample_eth_address)))
+
+    assert response.status_code == 200
+    assert json_of_response(response) == {'methods': [], 'attestations': []}
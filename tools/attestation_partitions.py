@@ -0,0 +1,45 @@
+#! /usr/bin/env python3
+
+import argparse
+import logging
+
+from logic.attestation_maintenance_service import (
+    AttestationMaintenanceService
+)
+from tools import db_utils
+from util import patches
+assert patches
+
+
+if __name__ == '__main__':
+    db_utils.request_context().push()
+    parser = argparse.ArgumentParser(
+        description="Maintains the monthly partitions of the attestation "
+        "table. Run daily, e.g. with Heroku Scheduler.")
+    subparsers = parser.add_subparsers(dest='command')
+    subparsers.required = True
+
+    create = subparsers.add_parser(
+        'create', help="create partitions for the coming months")
+    create.add_argument('--months-ahead', type=int, default=3,
+                        help="number of months after the current one to "
+                        "create partitions for")
+
+    archive = subparsers.add_parser(
+        'archive', help="detach old partitions, write them to gzipped CSV "
+        "files and drop them")
+    archive.add_argument('--keep-months', type=int, default=12,
+                         help="number of full months before the current "
+                         "one to keep in the database")
+    archive.add_argument('--directory', default='.',
+                         help="directory to write the archives to")
+
+    args = parser.parse_args()
+    if args.command == 'create':
+        created = AttestationMaintenanceService.create_partitions(
+            args.months_ahead)
+        logging.info("created partitions %s", ', '.join(created) or 'none')
+    else:
+        archived = AttestationMaintenanceService.archive_partitions(
+            args.keep_months, args.directory)
+        logging.info("archived %d partitions", len(archived))
@@ -5,7 +5,9 @@ from util import patches
 
 assert patches
 
-app_config.init_prod_app(app)
+# DB_STATEMENT_TIMEOUT bounds request queries. Maintenance statements, such
+# as archiving a month of attestations, take far longer.
+app_config.init_prod_app(app, SQLALCHEMY_STATEMENT_TIMEOUT=0)
 
 
 def request_context():
@@ -0,0 +1,30 @@
+#! /usr/bin/env python3
+
+import argparse
+import logging
+
+from logic.attestation_maintenance_service import (
+    AttestationMaintenanceService
+)
+from tools import db_utils
+from util import patches
+assert patches
+
+
+if __name__ == '__main__':
+    db_utils.request_context().push()
+    parser = argparse.ArgumentParser(
+        description="Merges attestations of the same fact into one row. "
+        "Migration 7d4c1b9e2f85 does so before adding the unique index; "
+        "run this where the index is missing, such as on partitioned "
+        "tables.")
+    parser.add_argument('--batch-size', type=int, default=10000,
+                        help="number of ids examined per transaction")
+    args = parser.parse_args()
+    deleted = AttestationMaintenanceService.deduplicate(args.batch_size)
+    logging.info("deleted %d duplicate attestations", deleted)
+    if AttestationMaintenanceService.has_duplicates():
+        # Without the unique index, requests can store duplicates while
+        # the tool runs
+        logging.warning("duplicates were stored during the run, run the "
+                        "tool again")
@@ -0,0 +1,35 @@
+#! /usr/bin/env python3
+
+import argparse
+import datetime
+import sys
+
+from logic.attestation_export_service import AttestationExportService
+from logic.attestation_export_service import FORMATS
+from logic.attestation_service import CLAIM_TYPES
+from tools import db_utils
+from util import patches
+assert patches
+
+
+def parse_datetime(value):
+    return datetime.datetime.strptime(value, '%Y-%m-%d')
+
+
+if __name__ == '__main__':
+    db_utils.request_context().push()
+    parser = argparse.ArgumentParser(
+        description="Writes attestations to stdout as NDJSON or CSV, "
+        "streaming them from the database in batches.")
+    parser.add_argument('--format', dest='export_format', choices=FORMATS,
+                        default='ndjson')
+    parser.add_argument('--method', choices=sorted(CLAIM_TYPES))
+    parser.add_argument('--since', type=parse_datetime,
+                        help="earliest creation date (YYYY-MM-DD) to include")
+    parser.add_argument('--until', type=parse_datetime,
+                        help="creation date (YYYY-MM-DD) to stop before")
+    parser.add_argument('--batch-size', type=int, default=1000,
+                        help="rows fetched from the database at a time")
+    args = parser.parse_args()
+    for chunk in AttestationExportService.export(**vars(args)):
+        sys.stdout.write(chunk)
@@ -0,0 +1,21 @@
+#! /usr/bin/env python3
+
+import argparse
+import logging
+
+from logic.idempotency_service import IdempotencyService
+from tools import db_utils
+from util import patches
+assert patches
+
+
+if __name__ == '__main__':
+    db_utils.request_context().push()
+    parser = argparse.ArgumentParser(
+        description="Deletes stored responses for expired Idempotency-Key "
+        "headers.")
+    parser.add_argument('--batch-size', type=int, default=1000,
+                        help="maximum number of keys deleted per transaction")
+    args = parser.parse_args()
+    deleted = IdempotencyService.purge_expired(args.batch_size)
+    logging.info("deleted %d expired idempotency keys", deleted)
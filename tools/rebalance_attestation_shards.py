@@ -0,0 +1,35 @@
+#! /usr/bin/env python3
+
+import argparse
+import logging
+
+from database.sharding import shard_names
+from logic.attestation_shard_service import AttestationShardService
+from tools import db_utils
+from util import patches
+assert patches
+
+
+def log_counts():
+    for name, count in sorted(AttestationShardService.count().items()):
+        logging.info("%s stores %d attestations", name, count)
+
+
+if __name__ == '__main__':
+    db_utils.request_context().push()
+    parser = argparse.ArgumentParser(
+        description="Moves attestations to the shard their identity hashes "
+        "to, after a database was appended to ATTESTATION_SHARD_URLS. Run "
+        "once every server uses the new list.")
+    parser.add_argument('--batch-size', type=int, default=1000,
+                        help="number of rows read from a shard at a time")
+    parser.add_argument('--count', action='store_true',
+                        help="only log the number of attestations per shard")
+    args = parser.parse_args()
+    if not shard_names():
+        parser.error("ATTESTATION_SHARD_URLS is not set")
+    log_counts()
+    if not args.count:
+        moved = AttestationShardService.rebalance(args.batch_size)
+        logging.info("moved %d attestations", sum(moved.values()))
+        log_counts()
@@ -0,0 +1,30 @@
+#! /usr/bin/env python3
+
+import argparse
+import logging
+
+from logic.attestation_rollup_service import AttestationRollupService
+from tools import db_utils
+from util import patches
+assert patches
+
+
+if __name__ == '__main__':
+    db_utils.request_context().push()
+    parser = argparse.ArgumentParser(
+        description="Adds new attestations to the rollups served by "
+        "/api/internal/attestation-stats. Run every few minutes.")
+    parser.add_argument('--batch-size', type=int, default=10000,
+                        help="number of ids added per transaction")
+    parser.add_argument('--lag', type=int, default=60,
+                        help="seconds to wait before counting an "
+                        "attestation, longer than any insert transaction")
+    parser.add_argument('--rebuild', action='store_true',
+                        help="recompute the rollups from scratch, after "
+                        "attestations were deleted or archived")
+    args = parser.parse_args()
+    if args.rebuild:
+        last_id = AttestationRollupService.rebuild(args.batch_size, args.lag)
+    else:
+        last_id = AttestationRollupService.refresh(args.batch_size, args.lag)
+    logging.info("rollups include attestations up to id %d", last_id)
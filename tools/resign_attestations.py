@@ -0,0 +1,29 @@
+#! /usr/bin/env python3
+
+import argparse
+import logging
+
+from config import settings
+from logic.attestation_resign_service import AttestationResignService
+from tools import db_utils
+from util import patches
+assert patches
+
+
+if __name__ == '__main__':
+    db_utils.request_context().push()
+    parser = argparse.ArgumentParser(
+        description="Signs every attestation again with "
+        "ATTESTATION_SIGNING_KEY, after the key was rotated. An interrupted "
+        "run continues where it stopped.")
+    parser.add_argument('--workers', type=int,
+                        help="signing processes, one per CPU by default")
+    parser.add_argument('--batch-size', type=int, default=1000,
+                        help="attestations signed and written per "
+                        "transaction")
+    args = parser.parse_args()
+    if not settings.ATTESTATION_SIGNING_KEY:
+        parser.error("ATTESTATION_SIGNING_KEY is not set")
+    signed = AttestationResignService.resign(
+        settings.ATTESTATION_SIGNING_KEY, args.workers, args.batch_size)
+    logging.info("signed %d attestations", signed)
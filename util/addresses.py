@@ -0,0 +1,15 @@
+def canonical_address(eth_address):
+    """
+    Returns eth_address as 0x followed by 40 lowercase hex digits, however
+    it was given: checksummed or not, with or without the 0x prefix. Use it
+    to key anything by identity.
+    """
+    if eth_address[:2] in ('0x', '0X'):
+        eth_address = eth_address[2:]
+    return '0x' + eth_address.lower()
+
+
+def address_bytes(eth_address):
+    """Returns the 20 bytes of eth_address, given as for
+    canonical_address."""
+    return bytes.fromhex(canonical_address(eth_address)[2:])
@@ -0,0 +1,82 @@
+import threading
+import time
+
+PRIORITY_HIGH = 'high'
+PRIORITY_LOW = 'low'
+
+
+def queue_time(request_start, now=None):
+    """
+    Returns the seconds a request waited before reaching the app, based on an
+    X-Request-Start header set by the router or proxy in front of it, or 0
+    if the header is missing or malformed.
+
+    Both the plain millisecond form (Heroku) and the 't=' prefixed form in
+    seconds, milliseconds or microseconds (nginx, HAProxy) are accepted.
+    """
+    if not request_start:
+        return 0.0
+    try:
+        start = float(request_start.strip().lstrip('t='))
+    except ValueError:
+        return 0.0
+    # Normalize to seconds, epoch seconds are around 1e9
+    while start > 1e11:
+        start /= 1000.0
+    now = time.time() if now is None else now
+    return max(0.0, now - start)
+
+
+class AdmissionController():
+    """
+    Tracks in-flight requests per priority class and decides whether a new
+    request should be served or shed.
+
+    A request is shed when it already spent longer than its class' queue
+    budget waiting to be served, or when its class is at its in-flight limit.
+    Shedding is immediate, so a rejected request never holds a worker
+    thread. Giving the expensive class a limit below the worker thread count
+    keeps threads free for the cheap class during spikes.
+    """
+
+    def __init__(self, max_in_flight, queue_budget):
+        """
+        Args:
+            max_in_flight(dict): Priority class to maximum concurrent
+                requests, 0 for no limit.
+            queue_budget(dict): Priority class to maximum seconds a request
+                may have been queued for.
+        """
+        self.max_in_flight = max_in_flight
+        self.queue_budget = queue_budget
+        self._lock = threading.Lock()
+        self._in_flight = dict.fromkeys(max_in_flight, 0)
+        self._shed = dict.fromkeys(max_in_flight, 0)
+
+    def try_acquire(self, priority, queued_for=0.0):
+        """
+        Returns True and counts the request as in flight if it is admitted.
+        Every admitted request must be followed by a call to release.
+        """
+        limit = self.max_in_flight[priority]
+        with self._lock:
+            if queued_for > self.queue_budget[priority] or \
+                    (limit and self._in_flight[priority] >= limit):
+                self._shed[priority] += 1
+                return False
+            self._in_flight[priority] += 1
+            return True
+
+    def release(self, priority):
+        with self._lock:
+            self._in_flight[priority] -= 1
+
+    def stats(self):
+        with self._lock:
+            return {
+                priority: {
+                    'in_flight': self._in_flight[priority],
+                    'max_in_flight': self.max_in_flight[priority],
+                    'shed': self._shed[priority]
+                } for priority in self._in_flight
+            }
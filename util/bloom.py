@@ -0,0 +1,81 @@
+import fcntl
+import hashlib
+import math
+import mmap
+import os
+import threading
+from contextlib import contextmanager
+
+
+class BloomFilter():
+    """
+    Set of byte strings that answers "definitely not present" or "maybe
+    present", in a fixed size bit array sized for capacity keys at the given
+    false positive rate. Keys can only be added, never removed.
+
+    With a path, the bits are kept in that file and mapped with mmap, so
+    every process that opens the same file with the same capacity and error
+    rate shares one filter. Use a tmpfs such as /dev/shm to keep it off disk.
+    """
+
+    def __init__(self, capacity, error_rate, path=None):
+        self.capacity = capacity
+        self.size = max(8, int(math.ceil(
+            -capacity * math.log(error_rate) / math.log(2) ** 2)))
+        self.hashes = max(1, int(round(self.size / capacity * math.log(2))))
+        self._lock = threading.Lock()
+        self._file = None
+        nbytes = (self.size + 7) // 8
+        if path is None:
+            self._bits = bytearray(nbytes)
+            return
+
+        self._file = os.fdopen(os.open(path, os.O_RDWR | os.O_CREAT, 0o600),
+                               'r+b')
+        with self._locked():
+            length = os.fstat(self._file.fileno()).st_size
+            if length == 0:
+                os.ftruncate(self._file.fileno(), nbytes)
+        if length not in (0, nbytes):
+            self._file.close()
+            raise ValueError("{} holds a filter of another size".format(path))
+        self._bits = mmap.mmap(self._file.fileno(), nbytes)
+
+    @contextmanager
+    def _locked(self):
+        # Setting a bit rewrites its whole byte, so writers take turns to
+        # not lose each other's bits. Readers do not lock.
+        with self._lock:
+            if self._file is None:
+                yield
+                return
+            fcntl.lockf(self._file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.lockf(self._file, fcntl.LOCK_UN)
+
+    def _positions(self, key):
+        digest = hashlib.blake2b(key, digest_size=16).digest()
+        first = int.from_bytes(digest[:8], 'little')
+        step = int.from_bytes(digest[8:], 'little') | 1
+        return [(first + i * step) % self.size for i in range(self.hashes)]
+
+    def add(self, key):
+        self.update((key,))
+
+    def update(self, keys):
+        positions = [self._positions(key) for key in keys]
+        with self._locked():
+            for key_positions in positions:
+                for position in key_positions:
+                    self._bits[position >> 3] |= 1 << (position & 7)
+
+    def __contains__(self, key):
+        return all(self._bits[position >> 3] & (1 << (position & 7))
+                   for position in self._positions(key))
+
+    def close(self):
+        if self._file is not None:
+            self._bits.close()
+            self._file.close()
@@ -1,16 +1,45 @@
+import asyncio
+import collections
+import concurrent.futures
 import logging
 import json
+import sqlite3
+import time
+
+import websockets
+from requests.exceptions import Timeout as RequestTimeout
 from web3 import Web3, HTTPProvider, WebsocketProvider
 from web3.contract import Contract
 from web3.middleware import geth_poa_middleware
+from web3.middleware.pythonic import log_entry_formatter
 
 from config import settings
 from enum import Enum
+from util.event_log_cache import EventLogCache
+
+# JSON-RPC error code of nodes that refuse to return more logs than a limit
+LIMIT_EXCEEDED = -32005
+
+# How nodes describe an eth_getLogs range that returns too many logs
+TOO_MANY_RESULTS = (
+    'more than',
+    'too many',
+    'limit exceeded',
+    'response size',
+    'timeout',
+    'timed out'
+)
+
+# Longest wait before connecting again after a subscription failed
+MAX_RECONNECT_DELAY = 60
 
 
 class ContractHelper:
 
-    def __init__(self, web3=None):
+    def __init__(self, web3=None, cache=None):
+        self.cache = cache
+        if cache is None and settings.EVENT_CACHE_FILE:
+            self.cache = EventLogCache(settings.EVENT_CACHE_FILE)
         if web3:
             self.web3 = web3
         elif settings.RPC_PROTOCOL == 'https':
@@ -24,11 +53,12 @@ class ContractHelper:
             self.web3.middleware_stack.inject(geth_poa_middleware, layer=0)
 
     def fetch_events(self, event_names, callback,
-                     log_index, transaction_index,
-                     block_from=0, block_to='latest'):
+                     log_index=None, transaction_index=None,
+                     block_from=0, block_to='latest', workers=None):
         """
-        Makes an RPC call to the Ethereum network to fetch events by name.
-        Calls the callback function for each event fetched, if any.
+        Makes RPC calls to the Ethereum network to fetch events by name.
+        Calls the callback function for each event fetched, if any, in
+        order. See iter_events for the arguments.
 
         Args:
             event_names(list[str]): List of event names.
@@ -36,38 +66,231 @@ class ContractHelper:
         """
         logging.info("Fetching events from block %s to block %s" %
                      (block_from, block_to))
+        num_events_processed = 0
+        for event in self.iter_events(event_names, block_from, block_to,
+                                      log_index, transaction_index,
+                                      workers=workers):
+            callback(event)
+            num_events_processed += 1
+        logging.info("Processed %d events", num_events_processed)
 
-        event_name_hashes = []
-        for name in event_names:
-            event_name_hashes.append(self.web3.sha3(text=name).hex())
-        self.event_filter = self.web3.eth.filter({
-            "topics": [event_name_hashes],
-            "fromBlock": block_from,
-            "toBlock": block_to
-        })
+    def iter_events(self, event_names, block_from=0, block_to='latest',
+                    log_index=None, transaction_index=None,
+                    chunk_size=None, workers=None):
+        """
+        Yields the logs of the named events between two blocks, inclusive,
+        in (blockNumber, transactionIndex, logIndex) order.
 
-        num_events_fetched = len(self.event_filter.get_all_entries())
-        logging.info("Fetched %d events" % num_events_fetched)
+        The range is requested with eth_getLogs in chunks of at most
+        chunk_size blocks, EVENT_CHUNK_SIZE by default. A chunk the node
+        refuses for returning too many logs, or that times out, is halved
+        and retried, and the chunk size grows back after each chunk that
+        succeeds.
 
-        process_events = False
-        num_events_processed = 0
-        for event in self.event_filter.get_all_entries():
-            if block_from == event['blockNumber']:
-                if transaction_index == event['transactionIndex']\
-                        and log_index == event['logIndex']:
-                    # switch on the process_events flag and continue since
-                    # we last read uptil this point
-                    process_events = True
-                    continue
-            elif block_from < event['blockNumber']:
-                # case to process the first event ever
-                process_events = True
-
-            if process_events:
+        With more than one worker, EVENT_FETCH_WORKERS by default, chunks
+        are fetched concurrently by a pool of threads, which needs a thread
+        safe provider such as HTTPProvider. Up to two chunks per worker are
+        fetched ahead of the one being yielded, which bounds memory use.
+        Otherwise only one chunk of logs is held at a time.
+
+        With an EventLogCache, set by EVENT_CACHE_FILE, the logs of blocks
+        with EVENT_CONFIRMATIONS confirmations are stored once fetched, and
+        read from the cache instead of the node afterwards.
+
+        To resume after the last event processed, pass its block as
+        block_from with its log_index and transaction_index: events of that
+        block up to and including it are skipped.
+
+        Args:
+            event_names(list[str]): List of event names.
+            block_from(int): First block
+            block_to(int or 'latest'): Last block, resolved once when called
+            log_index(int): logIndex of the last event processed
+            transaction_index(int): transactionIndex of the last event
+                processed
+            chunk_size(int): Largest number of blocks per request
+            workers(int): Number of concurrent requests
+        """
+        topics = [[self.web3.sha3(text=name).hex() for name in event_names]]
+        if block_to == 'latest':
+            block_to = self.web3.eth.blockNumber
+        chunk_size = chunk_size or settings.EVENT_CHUNK_SIZE
+        workers = workers or settings.EVENT_FETCH_WORKERS
+        resume_after = None
+        if log_index is not None and transaction_index is not None:
+            resume_after = (transaction_index, log_index)
+
+        if self.cache is None:
+            events = self._fetch(topics, block_from, block_to, chunk_size,
+                                 workers)
+        else:
+            events = self._fetch_cached(topics, block_from, block_to,
+                                        chunk_size, workers)
+        for event in events:
+            if resume_after is not None and \
+                    event['blockNumber'] == block_from and \
+                    (event['transactionIndex'],
+                     event['logIndex']) <= resume_after:
+                continue
+            yield event
+
+    def _fetch(self, topics, block_from, block_to, chunk_size, workers,
+               final=None):
+        if workers > 1:
+            return self._fetch_parallel(topics, block_from, block_to,
+                                        chunk_size, workers, final)
+        return self._fetch_range(topics, block_from, block_to, chunk_size,
+                                 final)
+
+    def _fetch_cached(self, topics, block_from, block_to, chunk_size,
+                      workers):
+        final = self.web3.eth.blockNumber - settings.EVENT_CONFIRMATIONS
+        start = block_from
+        cached = self.cache.covered(topics, block_from, block_to)
+        for cached_from, cached_to in cached + [(block_to + 1, None)]:
+            # Blocks missing from the cache are fetched in a final part,
+            # which is stored, and a part that could still be reorged
+            for gap_from, gap_to in ((start, min(cached_from - 1, final)),
+                                     (max(start, final + 1), cached_from - 1)):
+                if gap_from <= gap_to:
+                    yield from self._fetch(topics, gap_from, gap_to,
+                                           chunk_size, workers, final)
+            if cached_to is not None:
+                yield from self.cache.logs(topics, cached_from, cached_to)
+                start = cached_to + 1
+
+    def _store(self, topics, block_from, block_to, events):
+        try:
+            self.cache.store(topics, block_from, block_to, events)
+        except sqlite3.Error:
+            logging.exception("failed to cache the logs of blocks %d to %d",
+                              block_from, block_to)
+
+    def _fetch_range(self, topics, block_from, block_to, max_chunk_size,
+                     final=None):
+        chunk_size = max_chunk_size
+        start = block_from
+        while start <= block_to:
+            end = min(start + chunk_size - 1, block_to)
+            try:
+                events = self.web3.eth.getLogs({
+                    "topics": topics,
+                    "fromBlock": start,
+                    "toBlock": end
+                })
+            except (ValueError, RequestTimeout) as exc:
+                if chunk_size == 1 or not _is_range_too_large(exc):
+                    raise
+                chunk_size = max(1, chunk_size // 2)
+                logging.info("Retrying blocks %d to %d in chunks of %d",
+                             start, end, chunk_size)
+                continue
+
+            events = sorted(events, key=_event_order)
+            if final is not None and end <= final:
+                self._store(topics, start, end, events)
+            yield from events
+            start = end + 1
+            chunk_size = min(chunk_size * 2, max_chunk_size)
+
+    def _fetch_chunk(self, topics, block_from, block_to, chunk_size, final):
+        return list(self._fetch_range(topics, block_from, block_to,
+                                      chunk_size, final))
+
+    def _fetch_parallel(self, topics, block_from, block_to, chunk_size,
+                        workers, final=None):
+        # Chunks are submitted and yielded in block order, so the merged
+        # stream stays ordered even though they complete in any order
+        pending = collections.deque()
+        with concurrent.futures.ThreadPoolExecutor(workers) as pool:
+            for start in range(block_from, block_to + 1, chunk_size):
+                pending.append(pool.submit(
+                    self._fetch_chunk, topics, start,
+                    min(start + chunk_size - 1, block_to), chunk_size,
+                    final))
+                if len(pending) >= 2 * workers:
+                    yield from pending.popleft().result()
+            while pending:
+                yield from pending.popleft().result()
+
+    def subscribe_events(self, event_names, callback, block_from=None,
+                         log_index=None, transaction_index=None,
+                         on_removed=None, uri=None):
+        """
+        Calls callback for each new event as soon as its block is mined,
+        forever. Only returns if callback raises.
+
+        Logs are pushed by the node through eth_subscribe over a websocket
+        connection to uri, RPC_SERVER by default, which needs a node with
+        websocket support such as RPC_PROTOCOL 'wss'. When the connection
+        fails, it is opened again after a delay, and the events mined
+        meanwhile are fetched with iter_events before the pushed ones, so
+        none are missed. With block_from, and the log_index and
+        transaction_index of the last event processed, the events since
+        then are fetched the same way first.
+
+        Logs the node removes because of a reorg are passed to on_removed,
+        or skipped if it is not set, and the events that replace them are
+        delivered as they are pushed.
+
+        Args:
+            event_names(list[str]): List of event names.
+            callback(function(event)): Callback function
+            on_removed(function(event)): Callback for removed logs
+        """
+        for event in self.iter_subscribed_events(
+                event_names, block_from, log_index, transaction_index, uri):
+            if event.get('removed'):
+                if on_removed is not None:
+                    on_removed(event)
+            else:
                 callback(event)
-                num_events_processed += 1
 
-        logging.info("Processed %d events", num_events_processed)
+    def iter_subscribed_events(self, event_names, block_from=None,
+                               log_index=None, transaction_index=None,
+                               uri=None):
+        """Yields the events of subscribe_events, removed logs included."""
+        topics = [[self.web3.sha3(text=name).hex() for name in event_names]]
+        uri = uri or settings.RPC_SERVER
+        # Order of the last event delivered. Nothing before it is delivered
+        # again, except after a reorg.
+        if block_from is None:
+            position = (self.web3.eth.blockNumber + 1, -1, -1)
+        elif log_index is None or transaction_index is None:
+            position = (block_from, -1, -1)
+        else:
+            position = (block_from, transaction_index, log_index)
+
+        delay = 1
+        while True:
+            subscription = None
+            try:
+                # Subscribed before fetching the gap, so that no event is
+                # mined in between
+                subscription = LogSubscription(uri, topics)
+                gap = self.iter_events(event_names, position[0], 'latest',
+                                       position[2], position[1])
+                for event in gap:
+                    position = _event_order(event)
+                    yield event
+                delay = 1
+                while True:
+                    event = subscription.next()
+                    order = _event_order(event)
+                    if event.get('removed'):
+                        position = min(position, (order[0], -1, -1))
+                        yield event
+                    elif order > position:
+                        position = order
+                        yield event
+            except Exception:
+                logging.exception("event subscription failed, reconnecting "
+                                  "in %d seconds", delay)
+            finally:
+                if subscription is not None:
+                    subscription.close()
+            time.sleep(delay)
+            delay = min(delay * 2, MAX_RECONNECT_DELAY)
 
     def get_instance(self, contract_name, address):
         abi = self.get_contract_abi(contract_name)
@@ -109,6 +332,85 @@ class ContractHelper:
         return int(str_eth_address, 16)
 
 
+class LogSubscription():
+    """
+    eth_subscribe to the logs with the given topics, on a websocket
+    connection of its own: WebsocketProvider matches every message it
+    receives to a request, so it cannot receive notifications.
+    """
+
+    def __init__(self, uri, topics, timeout=None):
+        self.timeout = timeout or settings.EVENT_SUBSCRIPTION_TIMEOUT
+        self._loop = asyncio.new_event_loop()
+        self._ws = None
+        try:
+            self.id = self._run(self._subscribe(uri, topics))
+        except BaseException:
+            self.close()
+            raise
+
+    def _run(self, coroutine):
+        return self._loop.run_until_complete(coroutine)
+
+    async def _subscribe(self, uri, topics):
+        # Connected from a coroutine so that the connection uses this loop
+        self._ws = await websockets.connect(uri)
+        await self._ws.send(json.dumps({
+            'jsonrpc': '2.0',
+            'id': 1,
+            'method': 'eth_subscribe',
+            'params': ['logs', {'topics': topics}]
+        }))
+        response = json.loads(await asyncio.wait_for(self._ws.recv(),
+                                                     self.timeout))
+        if 'error' in response:
+            raise ValueError(response['error'])
+        return response['result']
+
+    async def _next(self):
+        while True:
+            try:
+                message = await asyncio.wait_for(self._ws.recv(),
+                                                 self.timeout)
+            except asyncio.TimeoutError:
+                # Nothing was logged for a while, make sure the connection
+                # is still up
+                await asyncio.wait_for(await self._ws.ping(), self.timeout)
+                continue
+            notification = json.loads(message)
+            params = notification.get('params', {})
+            if params.get('subscription') == self.id:
+                return log_entry_formatter(params['result'])
+
+    def next(self):
+        """Returns the next log pushed by the node."""
+        return self._run(self._next())
+
+    def close(self):
+        try:
+            if self._ws is not None:
+                self._run(self._ws.close())
+        finally:
+            self._loop.close()
+
+
+def _event_order(event):
+    return (event['blockNumber'], event['transactionIndex'],
+            event['logIndex'])
+
+
+def _is_range_too_large(exc):
+    if isinstance(exc, RequestTimeout):
+        return True
+    # JSON-RPC errors are raised as ValueError(error object)
+    error = exc.args[0] if exc.args else None
+    if not isinstance(error, dict):
+        return False
+    message = str(error.get('message', '')).lower()
+    return error.get('code') == LIMIT_EXCEEDED or \
+        any(phrase in message for phrase in TOO_MANY_RESULTS)
+
+
 def get_contract_internal_name(contract):
     # create a 40 byte placeholder used in linked contracts
     contract_slice = contract[:36]
@@ -0,0 +1,65 @@
+import threading
+import time
+from contextlib import contextmanager
+
+from config import settings
+from logic.service_utils import DeadlineExceededError
+
+_local = threading.local()
+
+
+@contextmanager
+def scope(seconds):
+    """
+    Runs the enclosed block with a deadline `seconds` from now. A deadline
+    that is already in effect and expires earlier is kept.
+    """
+    previous = getattr(_local, 'expires', None)
+    expires = time.monotonic() + seconds
+    if previous is not None:
+        expires = min(expires, previous)
+    _local.expires = expires
+    try:
+        yield
+    finally:
+        _local.expires = previous
+
+
+def remaining():
+    """
+    Returns the seconds left before the current deadline, or None if no
+    deadline is in effect.
+    """
+    expires = getattr(_local, 'expires', None)
+    if expires is None:
+        return None
+    return expires - time.monotonic()
+
+
+def exceeded():
+    return DeadlineExceededError(
+        'The request took too long. Please try again shortly.')
+
+
+def check():
+    """
+    Raises:
+        DeadlineExceededError: The current deadline has passed.
+    """
+    left = remaining()
+    if left is not None and left <= 0:
+        raise exceeded()
+
+
+def timeout():
+    """
+    Returns the timeout in seconds for a blocking call such as an outbound
+    HTTP request, which is the time left before the current deadline or
+    REQUEST_TIMEOUT outside of one.
+
+    Raises:
+        DeadlineExceededError: The current deadline has passed.
+    """
+    check()
+    left = remaining()
+    return settings.REQUEST_TIMEOUT if left is None else left
@@ -0,0 +1,104 @@
+import json
+import os
+import pickle
+import sqlite3
+import threading
+
+_SCHEMA = (
+    'CREATE TABLE IF NOT EXISTS log_range ('
+    'topics TEXT NOT NULL, block_from INTEGER NOT NULL, '
+    'block_to INTEGER NOT NULL, '
+    'PRIMARY KEY (topics, block_from)) WITHOUT ROWID',
+    'CREATE TABLE IF NOT EXISTS log ('
+    'topics TEXT NOT NULL, block_number INTEGER NOT NULL, '
+    'transaction_index INTEGER NOT NULL, log_index INTEGER NOT NULL, '
+    'value BLOB NOT NULL, '
+    'PRIMARY KEY (topics, block_number, transaction_index, log_index)) '
+    'WITHOUT ROWID'
+)
+
+# Ranges stored next to or over another are merged into one
+_TOUCHING = 'topics = ? AND block_to >= ? - 1 AND block_from <= ? + 1'
+
+
+def _key(topics):
+    return json.dumps(topics)
+
+
+class EventLogCache():
+    """
+    Raw eth_getLogs results kept in an SQLite database, by topics and block
+    range, so that scanning the same blocks again does not query the node.
+    Every process that opens the same file shares the logs.
+
+    Only store ranges of blocks that can no longer be reorged: the cache
+    never checks them against the chain.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+
+    def _connection(self):
+        # One connection per thread, opened again after a fork
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=10,
+                                   isolation_level=None)
+            conn.execute('PRAGMA journal_mode = WAL')
+            for statement in _SCHEMA:
+                conn.execute(statement)
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def covered(self, topics, block_from, block_to):
+        """
+        Returns:
+            list[(int, int)]: The ranges of blocks between block_from and
+            block_to, inclusive, whose logs are cached, in order.
+        """
+        rows = self._connection().execute(
+            'SELECT block_from, block_to FROM log_range '
+            'WHERE topics = ? AND block_to >= ? AND block_from <= ? '
+            'ORDER BY block_from', (_key(topics), block_from, block_to))
+        return [(max(start, block_from), min(end, block_to))
+                for start, end in rows]
+
+    def logs(self, topics, block_from, block_to):
+        """Yields the cached logs between two blocks, inclusive, in
+        (blockNumber, transactionIndex, logIndex) order."""
+        rows = self._connection().execute(
+            'SELECT value FROM log '
+            'WHERE topics = ? AND block_number >= ? AND block_number <= ? '
+            'ORDER BY block_number, transaction_index, log_index',
+            (_key(topics), block_from, block_to))
+        for value, in rows:
+            yield pickle.loads(value)
+
+    def store(self, topics, block_from, block_to, logs):
+        """Caches all the logs between two blocks, inclusive."""
+        key = _key(topics)
+        conn = self._connection()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            conn.executemany(
+                'INSERT OR IGNORE INTO log (topics, block_number, '
+                'transaction_index, log_index, value) VALUES (?, ?, ?, ?, ?)',
+                [(key, log['blockNumber'], log['transactionIndex'],
+                  log['logIndex'], pickle.dumps(log)) for log in logs])
+            start, end = conn.execute(
+                'SELECT min(block_from), max(block_to) FROM log_range '
+                'WHERE ' + _TOUCHING, (key, block_from, block_to)).fetchone()
+            conn.execute('DELETE FROM log_range WHERE ' + _TOUCHING,
+                         (key, block_from, block_to))
+            if start is not None:
+                block_from = min(block_from, start)
+                block_to = max(block_to, end)
+            conn.execute(
+                'INSERT INTO log_range (topics, block_from, block_to) '
+                'VALUES (?, ?, ?)', (key, block_from, block_to))
+            conn.execute('COMMIT')
+        except BaseException:
+            conn.execute('ROLLBACK')
+            raise
@@ -0,0 +1,35 @@
+import hashlib
+import time
+
+from util.ttl_cache import TTLCache
+
+
+class FailureCounter():
+    """
+    Counts recent failures per key within a fixed window that starts at the
+    first failure. Keys are stored as 16 byte digests, so memory use does not
+    depend on the size of the identities being tracked.
+    """
+
+    def __init__(self, threshold, window, maxsize=100000,
+                 timer=time.monotonic):
+        self.threshold = threshold
+        self._failures = TTLCache(maxsize, window, timer=timer)
+
+    @staticmethod
+    def _key(parts):
+        return hashlib.blake2b(
+            '\0'.join(str(part) for part in parts).encode('utf-8'),
+            digest_size=16).digest()
+
+    def is_blocked(self, *parts):
+        return self._failures.get(self._key(parts), 0) >= self.threshold
+
+    def record_failure(self, *parts):
+        return self._failures.increment(self._key(parts))
+
+    def reset(self, *parts):
+        self._failures.pop(self._key(parts))
+
+    def clear(self):
+        self._failures.clear()
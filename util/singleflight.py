@@ -0,0 +1,79 @@
+import functools
+import threading
+
+
+class _Call():
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight():
+    """
+    Coalesces concurrent calls that share a key into a single execution.
+
+    The first caller for a key runs the function; callers arriving with the
+    same key while it is in flight block until it finishes and receive the
+    same result, or the same exception. Nothing is cached once the call
+    completes, so a later call with the same key runs again.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._calls = {}
+
+    def do(self, key, fn, *args, **kwargs):
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = fn(*args, **kwargs)
+        except BaseException as exc:
+            call.error = exc
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+        return call.result
+
+    def in_flight(self):
+        with self._lock:
+            return len(self._calls)
+
+
+verify_flight = SingleFlight()
+
+
+def coalesce(scope=None, flight=verify_flight):
+    """
+    Decorator sharing one in-flight execution between concurrent identical
+    calls. The key is the function name plus its arguments, so calls that
+    differ in any argument (or pass the same value positionally in one call
+    and by keyword in another) are not coalesced.
+
+    Args:
+        scope(function): Optional callable whose return value is added to
+            the key, for handlers whose outcome depends on state other than
+            their arguments (e.g. the caller's session).
+        flight(SingleFlight): Registry of in-flight calls.
+    """
+    def decorator(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            key = (fn.__qualname__, args, tuple(sorted(kwargs.items())))
+            if scope is not None:
+                key += (scope(),)
+            return flight.do(key, fn, *args, **kwargs)
+        return wrapper
+    return decorator
@@ -0,0 +1,82 @@
+import os
+import sqlite3
+import threading
+import time
+
+_SCHEMA = (
+    'CREATE TABLE IF NOT EXISTS cache ('
+    'key TEXT PRIMARY KEY, value BLOB NOT NULL, expires REAL NOT NULL)',
+    'CREATE INDEX IF NOT EXISTS cache_expires ON cache (expires)'
+)
+
+# Sets between two evictions by the same process
+_EVICT_EVERY = 64
+
+
+class SQLiteCache():
+    """
+    Mapping of str keys to bytes values with a bounded size and a per entry
+    time to live, kept in an SQLite database. Every process that opens the
+    same file, e.g. on /dev/shm, shares the entries.
+
+    Has the get, set and pop methods of TTLCache. When full, the entries
+    closest to expiring are evicted, a few sets late.
+    """
+
+    def __init__(self, path, maxsize, ttl, timer=time.time):
+        self.path = path
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._timer = timer
+        self._local = threading.local()
+
+    def _connection(self):
+        # One connection per thread, opened again after a fork
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=1,
+                                   isolation_level=None)
+            conn.execute('PRAGMA journal_mode = WAL')
+            conn.execute('PRAGMA synchronous = OFF')
+            for statement in _SCHEMA:
+                conn.execute(statement)
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+            self._local.sets = 0
+        return conn
+
+    def get(self, key, default=None):
+        row = self._connection().execute(
+            'SELECT value FROM cache WHERE key = ? AND expires > ?',
+            (key, self._timer())).fetchone()
+        return default if row is None else row[0]
+
+    def set(self, key, value, ttl=None):
+        conn = self._connection()
+        expires = self._timer() + (self.ttl if ttl is None else ttl)
+        conn.execute(
+            'INSERT OR REPLACE INTO cache (key, value, expires) '
+            'VALUES (?, ?, ?)', (key, value, expires))
+        self._local.sets += 1
+        if self._local.sets % _EVICT_EVERY == 0:
+            self._evict(conn)
+
+    def _evict(self, conn):
+        conn.execute('DELETE FROM cache WHERE expires <= ?', (self._timer(),))
+        conn.execute(
+            'DELETE FROM cache WHERE key IN ('
+            'SELECT key FROM cache ORDER BY expires DESC LIMIT -1 OFFSET ?)',
+            (self.maxsize,))
+
+    def pop(self, key, default=None):
+        value = self.get(key, default)
+        self._connection().execute('DELETE FROM cache WHERE key = ?', (key,))
+        return value
+
+    def clear(self):
+        self._connection().execute('DELETE FROM cache')
+
+    def __len__(self):
+        return self._connection().execute(
+            'SELECT count(*) FROM cache WHERE expires > ?',
+            (self._timer(),)).fetchone()[0]
@@ -0,0 +1,70 @@
+import threading
+import time
+from collections import OrderedDict
+
+
+class TTLCache():
+    """
+    Thread safe mapping with a bounded size and a per entry time to live.
+
+    When full, the least recently used entry is evicted. Expired entries are
+    dropped lazily when they are read or evicted.
+    """
+
+    def __init__(self, maxsize, ttl, timer=time.monotonic):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._timer = timer
+        self._lock = threading.Lock()
+        self._data = OrderedDict()
+
+    def get(self, key, default=None):
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return default
+            value, expires = item
+            if expires <= self._timer():
+                del self._data[key]
+                return default
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl=None):
+        expires = self._timer() + (self.ttl if ttl is None else ttl)
+        with self._lock:
+            self._data[key] = (value, expires)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def increment(self, key, amount=1):
+        """
+        Adds amount to the value for key, keeping its original expiry. A
+        missing or expired key starts from zero with a fresh time to live.
+        """
+        now = self._timer()
+        with self._lock:
+            item = self._data.get(key)
+            if item is None or item[1] <= now:
+                item = (0, now + self.ttl)
+            value = item[0] + amount
+            self._data[key] = (value, item[1])
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+            return value
+
+    def pop(self, key, default=None):
+        with self._lock:
+            item = self._data.pop(key, None)
+        if item is None or item[1] <= self._timer():
+            return default
+        return item[0]
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)